@@ -0,0 +1,86 @@
+import os
+from typing import List, TextIO
+
+from rdflib import Graph, URIRef
+
+import tasty.constants as tc
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'files', 'data')
+
+# the NREL example data graphs, each of which conforms to the NREL shapes
+NREL_DATA_FILES = [
+    'haystack_nrel_ahu_type1_data.ttl',
+    'haystack_nrel_ahu_type2_data.ttl',
+    'haystack_nrel_ahu_type3_data.ttl',
+    'haystack_nrel_natural_gas_meter_data.ttl',
+    'haystack_nrel_vav_cooling_only_data.ttl',
+    'haystack_nrel_vav_elec_reheat.ttl',
+    'haystack_nrel_vav_hw_reheat.ttl',
+]
+SKYSPARK_DATA_FILES = ['sample_skyspark_vav.ttl']
+
+
+def replicate_graphs(data_files: List[str], num_points: int, output: TextIO, namespace: str = 'urn:sample/') -> int:
+    """
+    Write a data graph of (at least) num_points points as N-Triples, by replicating the example data graphs. In each
+    replica, every subject in the namespace is renamed by appending the replica number, i.e. urn:sample/AHU-01 becomes
+    urn:sample/AHU-01-3, so the replicas are disjoint. Points are the entities with a phIoT:equipRef.
+    Replicas are written as soon as they are built, so only the example data graphs are held in memory.
+
+    :param data_files: the names of the example data files in tests/files/data
+    :param num_points: the number of points to generate
+    :param output: the file object to write the N-Triples to
+    :param namespace: the namespace of the entities of the example data graphs
+    :return: the number of points written
+    """
+    sources = []
+    for data_file in data_files:
+        g = Graph().parse(os.path.join(DATA_DIR, data_file), format='turtle')
+        renamed = {s.n3() for s in g.subjects() if isinstance(s, URIRef) and s.startswith(namespace)}
+        triples = []
+        for line in g.serialize(format='nt').decode('utf-8').splitlines():
+            if not line:
+                continue
+            s, p, o = line[:-2].split(' ', 2)
+            triples.append((s, p, o, s in renamed, o in renamed))
+        points = len(set(g.subjects(tc.PHIOT_3_9_10.equipRef, None)))
+        sources.append((triples, points))
+
+    written = 0
+    replica = 0
+    while written < num_points:
+        triples, points = sources[replica % len(sources)]
+        suffix = f"-{replica}>"
+        for s, p, o, rename_s, rename_o in triples:
+            if rename_s:
+                s = s[:-1] + suffix
+            if rename_o:
+                o = o[:-1] + suffix
+            output.write(f"{s} {p} {o} .\n")
+        written += points
+        replica += 1
+    return written
+
+
+def generate_nrel_data_graph(num_points: int, filename: str) -> int:
+    """
+    Write a data graph of num_points points conforming to the NREL shapes, see replicate_graphs.
+
+    :param num_points: the number of points to generate
+    :param filename: the N-Triples file to write
+    :return: the number of points written
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        return replicate_graphs(NREL_DATA_FILES, num_points, f)
+
+
+def generate_skyspark_data_graph(num_points: int, filename: str) -> int:
+    """
+    Write a (cleaned) SkySpark data graph of num_points points, see replicate_graphs.
+
+    :param num_points: the number of points to generate
+    :param filename: the N-Triples file to write
+    :return: the number of points written
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        return replicate_graphs(SKYSPARK_DATA_FILES, num_points, f, namespace='urn:/_#')
@@ -0,0 +1,204 @@
+"""
+Benchmarks of the hot paths of tasty: loading ontologies, resolving entity classes, generating shapes, validating
+and processing SkySpark data graphs. Data graphs are generated at several sizes (in points) from the NREL and SkySpark
+example data, see benchmarks.data. Each stage is timed (best of a number of repeats) and its peak memory measured
+with tracemalloc, in a separate run as tracing slows down execution.
+
+Results can be saved as a baseline, and compared with a baseline to flag regressions:
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import tasty.constants as tc
+import tasty.graphs as tg
+import tasty.templates as tt
+from tasty.auto_target import auto_target_input_file
+from tasty.shapes_generator import ShapesGenerator
+from tasty.skyspark.process_graphs import SkysparkGraphProcessor
+from tasty.validate import validate_from_csv
+
+from benchmarks.data import generate_nrel_data_graph, generate_skyspark_data_graph
+
+SIZES = [1000, 10000, 100000]
+SOURCE_SHAPES_DIR = os.path.join(os.path.dirname(tc.__file__), 'source_shapes', 'haystack')
+
+
+def setup_load_ontology(size: int, workdir: str) -> Callable:
+    return lambda: tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+
+
+def setup_hget_entity_classes(size: int, workdir: str) -> Callable:
+    ontology = tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+    candidates = tt.get_namespaced_terms(ontology, 'discharge-air-temp-sensor-point')
+    return lambda: tt.hget_entity_classes(ontology, candidates)
+
+
+def setup_generate_shapes(size: int, workdir: str) -> Callable:
+    sg = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10)
+    sg.generated_shapes_dir = workdir
+    return sg.main_generate_all_and_merge
+
+
+def setup_validate_from_csv(engine: str) -> Callable:
+    def setup(size: int, workdir: str) -> Callable:
+        data_file = os.path.join(workdir, f"nrel_{size}.nt")
+        input_file = os.path.join(workdir, f"nrel_{size}.csv")
+        if not os.path.isfile(input_file):
+            generate_nrel_data_graph(size, data_file)
+            shape_files = [os.path.join(SOURCE_SHAPES_DIR, f) for f in ['core.json', 'nrel.json']]
+            auto_target_input_file(shape_files, data_file, input_file)
+        return lambda: validate_from_csv(data_file, input_file, engine)
+    return setup
+
+
+def setup_get_data_graph(size: int, workdir: str) -> Callable:
+    data_file = os.path.join(workdir, f"skyspark_{size}.nt")
+    if not os.path.isfile(data_file):
+        generate_skyspark_data_graph(size, data_file)
+    processor = SkysparkGraphProcessor('urn:/_#', tc.HAYSTACK, tc.V3_9_10)
+    return lambda: processor.get_data_graph(data_file)
+
+
+# {name: (setup, sizes, repeat)}, where setup(size, workdir) prepares a stage and returns the callable to measure
+STAGES = {
+    'load_ontology': (setup_load_ontology, [None], 3),
+    'hget_entity_classes': (setup_hget_entity_classes, [None], 3),
+    'generate_shapes': (setup_generate_shapes, [None], 1),
+    'validate_from_csv[native]': (setup_validate_from_csv('native'), SIZES, 1),
+    'validate_from_csv[pyshacl]': (setup_validate_from_csv('pyshacl'), SIZES[:1], 1),
+    'get_data_graph': (setup_get_data_graph, SIZES, 1),
+}
+
+
+def measure(func: Callable, repeat: int = 1, memory: bool = True) -> Dict[str, float]:
+    """
+    :param func: the function to measure
+    :param repeat: the number of timed runs, the best time is reported
+    :param memory: whether to measure the peak memory, in an additional run
+    :return: {'time': seconds, 'peak_memory': bytes (if measured)}
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    result = {'time': min(times)}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run(stages: List[str], max_size: int = None, memory: bool = True, workdir: str = None) -> Dict[str, dict]:
+    """
+    Run the stages at each of their sizes (up to max_size).
+
+    :param stages: the names of the stages to run, see STAGES
+    :param max_size: the largest data graph size to run stages at
+    :param memory: whether to measure the peak memory
+    :param workdir: the directory to write generated data and outputs in, a temporary directory if not provided
+    :return: {'stage' or 'stage@size': measurements}
+    """
+    results = {}
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        cwd = os.getcwd()
+        # validate_from_csv writes its outputs to the working directory
+        os.chdir(workdir)
+        stack.callback(os.chdir, cwd)
+        for name in stages:
+            setup, sizes, repeat = STAGES[name]
+            for size in sizes:
+                if size is not None and max_size is not None and size > max_size:
+                    continue
+                key = name if size is None else f"{name}@{size}"
+                with contextlib.redirect_stdout(io.StringIO()):
+                    func = setup(size, workdir)
+                    results[key] = measure(func, repeat, memory)
+                print(format_result(key, results[key]))
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], time_threshold: float = 0.25,
+            memory_threshold: float = 0.1) -> List[str]:
+    """
+    :param results: the results of a run
+    :param baseline: the results of a previous run
+    :param time_threshold: the relative increase in time considered a regression
+    :param memory_threshold: the relative increase in peak memory considered a regression
+    :return: a description of each regression
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric, threshold in [('time', time_threshold), ('peak_memory', memory_threshold)]:
+            if metric in result and metric in base and result[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {base[metric]:.4g} -> {result[metric]:.4g} "
+                                   f"(+{100 * (result[metric] / base[metric] - 1):.0f}%)")
+    return regressions
+
+
+def format_result(key: str, result: dict) -> str:
+    line = f"{key:<40} {result['time']:>10.3f} s"
+    if 'peak_memory' in result:
+        line += f" {result['peak_memory'] / 2 ** 20:>10.1f} MiB"
+    return line
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Run the tasty benchmarks')
+    parser.add_argument('-s', '--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Stages to run')
+    parser.add_argument('-m', '--max-size', type=int, default=None,
+                        help='Largest data graph size (in points) to run stages at')
+    parser.add_argument('--no-memory', action='store_true', help='Skip measuring peak memory')
+    parser.add_argument('--save', type=str, default=None, help='JSON file to save the results to, as a baseline')
+    parser.add_argument('--compare', type=str, default=None, help='JSON file of a baseline to compare the results to')
+    parser.add_argument('--time-threshold', type=float, default=0.25,
+                        help='Relative increase in time considered a regression')
+    parser.add_argument('--memory-threshold', type=float, default=0.1,
+                        help='Relative increase in peak memory considered a regression')
+    parser.add_argument('-w', '--workdir', type=str, default=None,
+                        help='Directory for generated data, reused between runs if provided')
+    args = parser.parse_args(argv)
+
+    results = run(args.stages, args.max_size, not args.no_memory, args.workdir and os.path.abspath(args.workdir))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+        print(f"Results saved at: {args.save}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions compared to: {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
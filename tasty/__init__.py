@@ -1,6 +1,11 @@
+import logging
+
 try:
     import importlib.metadata as importlib_metadata
 except ModuleNotFoundError:
     import importlib_metadata
 
 __version__ = importlib_metadata.version(__name__)
+
+# tasty logs to the 'tasty' logger hierarchy and is quiet unless the application configures logging (see console)
+logging.getLogger(__name__).addHandler(logging.NullHandler())
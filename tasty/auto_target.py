@@ -0,0 +1,197 @@
+import csv
+import logging
+import os
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from rdflib import Graph, Namespace, RDF, RDFS, URIRef
+from rdflib.util import guess_format
+
+import tasty.constants as tc
+import tasty.exceptions as te
+import tasty.graphs as tg
+from tasty.generate_input_file import EntityCollector, get_shape_types, iter_shapes
+from tasty.profiling import span
+
+logger = logging.getLogger(__name__)
+
+
+class ShapeSignatureIndex:
+    """
+    An index of the simple (non composite) source shapes by their signature: a bit vector over a shared vocabulary,
+    with a bit set for each tag and each type the shape requires. An entity's signature has a bit set for each of its
+    ph:hasTag tags and for each of its rdf:types and their superclasses. A shape then matches an entity if its
+    signature is a subset of the entity's signature, and matches it exactly if the entity also has no other tags,
+    as the generated shapes require (see ShapesGenerator.add_all_tags).
+
+    Entities are grouped by signature first, as the points of a site typically share a small number of tag sets,
+    and all distinct signatures are matched against all shapes in one vectorized pass.
+    """
+
+    def __init__(self, columns: List[str], signatures: List[Tuple[Set[URIRef], Set[URIRef]]], has_tag: URIRef,
+                 closure: tg.OntologyClosure):
+        """
+        :param columns: the input file column of each shape, i.e. 'phShapes:damper-cmd-shape'
+        :param signatures: the (tags, types) each shape requires
+        :param has_tag: the predicate relating entities to their tags, i.e. ph:hasTag
+        :param closure: the closure of the ontology, to resolve the superclasses of entity types
+        """
+        self.columns = columns
+        self.has_tag = has_tag
+        self.closure = closure
+        self.tag_ids: Dict[URIRef, int] = {}
+        self.type_ids: Dict[URIRef, int] = {}
+        for tags, _ in signatures:
+            for tag in tags:
+                self.tag_ids.setdefault(tag, len(self.tag_ids))
+        for _, types in signatures:
+            for t in types:
+                self.type_ids.setdefault(t, len(self.tag_ids) + len(self.type_ids))
+
+        size = len(self.tag_ids) + len(self.type_ids)
+        self.masks = np.zeros((len(signatures), size), dtype=bool)
+        for i, (tags, types) in enumerate(signatures):
+            self.masks[i, [self.tag_ids[tag] for tag in tags]] = True
+            self.masks[i, [self.type_ids[t] for t in types]] = True
+        self.tag_counts = np.array([len(tags) for tags, _ in signatures])
+
+        # strict_subsets[i, j]: the signature of shape i is a strict subset of the signature of shape j
+        masks = self.masks.astype(np.int32)
+        self.strict_subsets = (masks @ (1 - masks).T == 0) & (masks.sum(axis=1)[:, None] < masks.sum(axis=1)[None, :])
+
+    @classmethod
+    def from_shape_files(cls, shape_files: List[str], schema: str = tc.HAYSTACK,
+                         version: str = tc.V3_9_10) -> 'ShapeSignatureIndex':
+        """
+        Build the index from the simple shapes of JSON source shape files. Tags and types are namespaced the same way
+        as the ShapesGenerator does; shapes with a tag or type that is not part of the ontology are skipped.
+
+        :param shape_files: paths to JSON source_shapes files
+        :param schema: the schema of the shapes, only Haystack is supported
+        :param version: the version of the schema
+        :return: the index
+        """
+        if schema != tc.HAYSTACK:
+            raise te.TastyError(f"Auto-targeting is only supported for {tc.HAYSTACK} shapes")
+        ontology = tg.load_ontology(schema, version)
+        subjects = set(ontology.subjects())
+        columns = []
+        signatures = []
+        for shape in iter_shapes(shape_files, composite=False):
+            if 'shape-mixins' in shape or 'predicates' in shape:
+                continue
+            tags = set(tg.get_namespaced_term(ontology, tag, subjects) for tag in shape.get('tags', []))
+            tags.update(tc.PH_CUSTOM[tag] for tag in shape.get('tags-custom', []))
+            types = set(tg.get_namespaced_term(ontology, t, subjects) for t in shape.get('types', []))
+            if False in tags or False in types or not (tags or types):
+                continue
+            columns.append(f"{shape['prefix']}:{shape['name']}")
+            signatures.append((tags, types))
+        has_tag = Namespace(f"https://project-haystack.org/def/ph/{version}#").hasTag
+        return cls(columns, signatures, has_tag, tg.load_closure(schema, version))
+
+    def entity_signatures(self, data_graph: Graph) -> Dict[Tuple[frozenset, int], List[URIRef]]:
+        """
+        :param data_graph: the data graph
+        :return: {(signature as a set of vocabulary positions, number of tags): entities}, for each typed entity
+        """
+        entity_tags: Dict[URIRef, List[URIRef]] = {}
+        for s, o in data_graph.subject_objects(self.has_tag):
+            entity_tags.setdefault(s, []).append(o)
+        entity_types: Dict[URIRef, Set[URIRef]] = {}
+        for s, o in data_graph.subject_objects(RDF.type):
+            entity_types.setdefault(s, set()).update(self.closure.get_superclasses(o))
+
+        signatures: Dict[Tuple[frozenset, int], List[URIRef]] = {}
+        for entity, types in entity_types.items():
+            tags = set(entity_tags.get(entity, ()))
+            ids = [self.tag_ids[tag] for tag in tags if tag in self.tag_ids]
+            ids.extend(self.type_ids[t] for t in types if t in self.type_ids)
+            signatures.setdefault((frozenset(ids), len(tags)), []).append(entity)
+        return signatures
+
+    def match(self, data_graph: Graph, exact_only: bool = True) -> Dict[URIRef, List[str]]:
+        """
+        Propose the best candidate shapes for each entity of a data graph: the most specific shapes matching it, i.e.
+        those whose signature is not a strict subset of the signature of another matching shape.
+
+        :param data_graph: the data graph
+        :param exact_only: whether to only propose shapes matching the tags of an entity exactly. Otherwise, shapes
+            only requiring a subset of the tags of an entity are proposed as well
+        :return: {entity: the columns of the proposed shapes}, for entities with at least one proposal
+        """
+        groups = self.entity_signatures(data_graph)
+        if not groups or not self.columns:
+            return {}
+        keys = list(groups)
+        signatures = np.zeros((len(keys), self.masks.shape[1]), dtype=np.int32)
+        for row, (ids, _) in enumerate(keys):
+            signatures[row, list(ids)] = 1
+        tag_counts = np.array([count for _, count in keys])
+
+        # matches[u, i]: all bits of shape i are set in signature u
+        matches = (1 - signatures) @ self.masks.T.astype(np.int32) == 0
+        if exact_only:
+            matches &= tag_counts[:, None] == self.tag_counts[None, :]
+        dominated = matches.astype(np.int32) @ self.strict_subsets.T.astype(np.int32) > 0
+        proposals = matches & ~dominated
+
+        matched = {}
+        for row, col in zip(*np.nonzero(proposals)):
+            for entity in groups[keys[row]]:
+                matched.setdefault(entity, []).append(self.columns[col])
+        return matched
+
+
+def auto_target_input_file(shape_files: List[str], data_graph: str, output_file: str, composite: bool = False,
+                           filter_types: bool = False, exact_only: bool = True, schema: str = tc.HAYSTACK,
+                           version: str = tc.V3_9_10) -> Dict[URIRef, List[str]]:
+    """
+    Generate an input file as generate_input_file does, with the cells of the shapes proposed for each entity by a
+    ShapeSignatureIndex already marked with an 'X'.
+
+    :param shape_files: paths to JSON source_shapes files
+    :param data_graph: path to the data graph
+    :param output_file: path to output file to write
+    :param composite: whether to only add columns for the more complex shapes. No cells are marked if so, as only
+        simple shapes are proposed
+    :param filter_types: whether to only add entities with a type (or subtype) targeted by the shapes
+    :param exact_only: see ShapeSignatureIndex.match
+    :param schema: the schema of the shapes and data graph, also used to resolve subtypes when filtering
+    :param version: the version of the schema
+    :return: {entity: the columns of the proposed shapes}, for the entities written to the input file
+    """
+    if data_graph is None or not os.path.isfile(data_graph):
+        raise te.TastyError(f"Auto-targeting requires a data graph, unable to find data file: {data_graph}")
+    with span('build_signature_index'):
+        index = ShapeSignatureIndex.from_shape_files(shape_files, schema, version)
+    with span('load_data_graph', file=os.path.basename(data_graph)) as s:
+        graph = Graph().parse(data_graph, format=guess_format(data_graph))
+        s.set(triples=len(graph))
+    with span('match_shapes') as s:
+        matched = index.match(graph, exact_only)
+        s.set(entities=len(matched))
+
+    entities = dict.fromkeys(graph.subjects(RDF.type))
+    if filter_types:
+        collector = EntityCollector(get_shape_types(shape_files, composite), tg.load_ontology(schema, version))
+        collector.add_triples(graph.triples((None, RDF.type, None)))
+        entities = {entity: None for entity, matches in collector.entities.items() if matches}
+        matched = {entity: columns for entity, columns in matched.items() if entity in entities}
+
+    headers = ['entity-id', 'entity-name']
+    headers.extend(shape['prefix'] + ':' + shape['name'] for shape in iter_shapes(shape_files, composite))
+    positions = {column: i for i, column in enumerate(headers)}
+    with span('write_input_file'), open(output_file, 'w+', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(headers)
+        for entity in entities:
+            row = [str(entity), str(graph.value(entity, RDFS.label, default=''))] + [''] * (len(headers) - 2)
+            for column in matched.get(entity, ()):
+                if column in positions:
+                    row[positions[column]] = 'X'
+            writer.writerow(row)
+
+    num_marks = sum(len(columns) for columns in matched.values())
+    logger.info("Proposed %d shapes for %d entities, written to %s", num_marks, len(matched), output_file)
+    return matched
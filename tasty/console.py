@@ -1,16 +1,19 @@
 import argparse
+import logging
 import os
 import sys
 
-from tasty.shapes_generator import ShapesGenerator
-from tasty.generate_input_file import generate_input_file
-from tasty.validate import validate_from_csv
+# only the standard library is imported here: the modules of each command (and rdflib, pyshacl, pandas, ... with
+# them) are imported when the command runs, so that parsing the arguments and printing help stays fast
+from tasty.profiling import Profiler, span
 
 current_dir = os.path.dirname(__file__)
 source_shapes_dir = os.path.join(current_dir, 'source_shapes')
 generated_dir = os.path.join(current_dir, 'generated_shapes')
 tasty_root = os.path.join(current_dir, '..')
 
+logger = logging.getLogger(__name__)
+
 
 def generate_shapes(args):
     """
@@ -20,9 +23,11 @@ def generate_shapes(args):
     :param args:
     :return:
     """
-    sg = ShapesGenerator(args.schema, args.version)
+    from tasty.shapes_generator import ShapesGenerator
+
+    sg = ShapesGenerator(args.schema, args.version, args.intern_constraints, args.compile_tag_sets)
     if len(sg.source_shapes_by_file) == 0:
-        print(f"No source shapes found for {args.schema}")
+        logger.warning("No source shapes found for %s", args.schema)
     else:
         sg.main_generate_all_and_merge()
 
@@ -35,23 +40,55 @@ def generate_input(args):
     :param args:
     :return:
     """
-    load_dir = os.path.join(source_shapes_dir, args.schema)
+    load_dir = os.path.join(source_shapes_dir, args.schema.lower())
     potential_shapes = [os.path.join(load_dir, x) for x in os.listdir(load_dir) if x.endswith('.json')]
     input_files = None
     if args.library == 'all':
         input_files = [os.path.basename(shape) for shape in potential_shapes]
-        generate_input_file(potential_shapes, args.data_graph, args.output, args.composite_only)
+        write_input_file(args, potential_shapes)
     else:
         for potential in potential_shapes:
             if args.library.lower() == os.path.splitext(os.path.basename(potential))[0]:
                 input_files = [potential]
                 break
         if input_files:
-            generate_input_file(input_files, args.data_graph, args.output, args.composite_only)
+            write_input_file(args, input_files)
         else:
-            print(f"No shapes file found to load")
+            logger.error("No shapes file found to load")
             sys.exit(1)
-    print(f"Generated input from {[os.path.basename(f) for f in input_files]}")
+    logger.info("Generated input from %s", [os.path.basename(f) for f in input_files])
+
+
+def write_input_file(args, shape_files):
+    """
+    Write the input file for the shape files, with proposed shapes already marked if requested.
+    :param args:
+    :param shape_files: paths to the JSON source shapes files
+    :return:
+    """
+    if args.auto_target:
+        from tasty.auto_target import auto_target_input_file
+
+        auto_target_input_file(shape_files, args.data_graph, args.output, args.composite_only, args.filter_types,
+                               schema=args.schema)
+    else:
+        from tasty.generate_input_file import generate_input_file
+
+        generate_input_file(shape_files, args.data_graph, args.output, args.composite_only,
+                            args.filter_types, args.schema)
+
+
+def generate_site(args):
+    """
+    Generate a synthetic site as N-Triples, with the points of the NREL equipment shapes.
+    :param args:
+    :return:
+    """
+    from tasty.synthetic import generate_site as generate_synthetic_site
+
+    generate_synthetic_site(args.output, missing_tag_rate=args.missing_tag_rate, extra_tag_rate=args.extra_tag_rate,
+                            seed=args.seed, namespace=args.namespace, num_ahus=args.ahus, num_vavs=args.vavs,
+                            num_meters=args.meters, points_per_equip=args.points_per_equip)
 
 
 def validate(args):
@@ -61,7 +98,83 @@ def validate(args):
     :param args:
     :return:
     """
-    validate_from_csv(args.data_graph, args.input_file)
+    from tasty.validate import validate_from_csv
+
+    validate_from_csv(args.data_graph, args.input_file, args.engine)
+
+
+def serve(args):
+    """
+    Serve validation requests over HTTP (or a Unix socket), with the shapes and the ontology loaded once.
+    :param args:
+    :return:
+    """
+    from tasty.server import serve as serve_validations
+
+    serve_validations(args.host, args.port, args.socket, args.workers, args.max_queue, engine=args.engine,
+                      max_body_size=args.max_body_size)
+
+
+def add_profile_arguments(parser):
+    """
+    Add the arguments to profile a command to its parser.
+    :param parser:
+    :return:
+    """
+    parser.add_argument(
+        '-p',
+        '--profile',
+        type=bool,
+        default=False,
+        const=True,
+        help='Whether to print the time, CPU time, peak RSS and triple counts of each stage of the command',
+        nargs='?'
+    )
+    parser.add_argument(
+        '--profile-output',
+        type=str,
+        default=None,
+        help='JSON file to export the profile to'
+    )
+    parser.add_argument(
+        '--profile-format',
+        type=str,
+        choices=['json', 'chrome'],
+        default='json',
+        help='Format of the exported profile: the span tree, or Chrome trace events (chrome://tracing, Perfetto)',
+        nargs='?'
+    )
+
+
+def run_profiled(args):
+    """
+    Run a command while recording its stages, then print the span tree and export it if requested.
+    :param args:
+    :return:
+    """
+    with Profiler() as profiler:
+        with span(args.func.__name__.replace('_', '-')):
+            args.func(args)
+    print(profiler.format_tree())
+    if args.profile_output:
+        profiler.export(args.profile_output, args.profile_format)
+        logger.info("Profile saved at: %s", args.profile_output)
+
+
+def configure_logging(args):
+    """
+    Log the messages of tasty to the console: the summary of each stage by default, nothing but warnings and errors
+    if quiet, and a line per item (entity, shape, ...) if verbose.
+    :param args:
+    :return:
+    """
+    level = logging.INFO
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    logging.getLogger('tasty').setLevel(level)
 
 
 def main():
@@ -69,6 +182,19 @@ def main():
     # Construct Parsers
     parser = argparse.ArgumentParser(
         description='Tool for generating SHACL files and validating RDF data against SHACL shapes')
+    # flags rather than optional values, which would consume the name of the command
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        action='store_true',
+        help='Whether to log a line per entity, shape, etc. processed'
+    )
+    parser.add_argument(
+        '-q',
+        '--quiet',
+        action='store_true',
+        help='Whether to only log warnings and errors'
+    )
     subparsers = parser.add_subparsers()
 
     # Generate shapes command
@@ -94,6 +220,26 @@ def main():
         nargs='?'
     )
 
+    parser_generate_shapes.add_argument(
+        '-i',
+        '--intern-constraints',
+        type=bool,
+        default=False,
+        const=True,
+        help='Whether to generate one named constraint shape per tag and type, shared by all shapes requiring it',
+        nargs='?'
+    )
+    parser_generate_shapes.add_argument(
+        '-t',
+        '--compile-tag-sets',
+        type=bool,
+        default=False,
+        const=True,
+        help='Whether to require the tags of each shape with a single SPARQL constraint instead of one per tag',
+        nargs='?'
+    )
+
+    add_profile_arguments(parser_generate_shapes)
     parser_generate_shapes.set_defaults(func=generate_shapes)
 
     # Generate input file command
@@ -141,8 +287,70 @@ def main():
         help='Whether to only add "shapes of shapes" into output header file',
         nargs='?'
     )
+    parser_generate_input.add_argument(
+        '-f',
+        '--filter-types',
+        type=bool,
+        default=False,
+        const=True,
+        help='Whether to only add entities with a type targeted by the shapes in the library',
+        nargs='?'
+    )
+    parser_generate_input.add_argument(
+        '-a',
+        '--auto-target',
+        type=bool,
+        default=False,
+        const=True,
+        help='Whether to mark the shapes matching the tags and types of each entity in the data graph',
+        nargs='?'
+    )
+    add_profile_arguments(parser_generate_input)
     parser_generate_input.set_defaults(func=generate_input)
 
+    # Generate synthetic site command
+    parser_generate_site = subparsers.add_parser('generate-site',
+                                                 description='Command for generating a synthetic site as N-Triples, for scale testing')
+    parser_generate_site.add_argument(
+        '-o',
+        '--output',
+        type=str,
+        default='site.nt',
+        help='Name of the N-Triples file to write',
+        nargs='?'
+    )
+    parser_generate_site.add_argument(
+        '-n',
+        '--namespace',
+        type=str,
+        default='urn:sample/',
+        help='Namespace of the generated entities',
+        nargs='?'
+    )
+    parser_generate_site.add_argument('--ahus', type=int, default=1, help='Number of AHUs')
+    parser_generate_site.add_argument('--vavs', type=int, default=10, help='Number of VAVs')
+    parser_generate_site.add_argument('--meters', type=int, default=1, help='Number of meters')
+    parser_generate_site.add_argument(
+        '--points-per-equip',
+        type=int,
+        default=None,
+        help='Maximum number of points of each equipment, all points of its shape by default'
+    )
+    parser_generate_site.add_argument(
+        '--missing-tag-rate',
+        type=float,
+        default=0.0,
+        help='Probability for a point to miss one of its tags'
+    )
+    parser_generate_site.add_argument(
+        '--extra-tag-rate',
+        type=float,
+        default=0.0,
+        help='Probability for a point to have one extra tag'
+    )
+    parser_generate_site.add_argument('--seed', type=int, default=None, help='Seed of the random generator')
+    parser_generate_site.set_defaults(func=generate_site)
+
     # Generate input file command
     parser_validate = subparsers.add_parser('validate',
                                             description='Command for validating a data graph against shapes marked in the csv')
@@ -161,10 +369,59 @@ def main():
         default='input-file.csv',
         nargs='?'
     )
+    parser_validate.add_argument(
+        '-e',
+        '--engine',
+        type=str,
+        choices=['pyshacl', 'native'],
+        help='Validation engine to use. The native engine only supports the shapes generated by tasty, but is much faster',
+        default='pyshacl',
+        nargs='?'
+    )
+    add_profile_arguments(parser_validate)
     parser_validate.set_defaults(func=validate)
 
+    # Serve validations command
+    parser_serve = subparsers.add_parser('serve',
+                                         description='Command for serving validations over HTTP, keeping the shapes and the ontology in memory')
+    parser_serve.add_argument('--host', type=str, default='127.0.0.1', help='Host to listen on')
+    parser_serve.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser_serve.add_argument(
+        '--socket',
+        type=str,
+        default=None,
+        help='Path of a Unix socket to listen on instead of the host and port'
+    )
+    parser_serve.add_argument('--workers', type=int, default=4, help='Number of validations run concurrently')
+    parser_serve.add_argument(
+        '--max-queue',
+        type=int,
+        default=64,
+        help='Number of requests waiting for a worker before new requests are rejected'
+    )
+    parser_serve.add_argument(
+        '--max-body-size',
+        type=int,
+        default=16 * 2 ** 20,
+        help='Maximum size of a request body in bytes, larger requests are rejected'
+    )
+    parser_serve.add_argument(
+        '-e',
+        '--engine',
+        type=str,
+        choices=['pyshacl', 'native'],
+        help='Validation engine of the requests not naming one',
+        default='native',
+        nargs='?'
+    )
+    parser_serve.set_defaults(func=serve)
+
     # command with no sub-commands should just print help
     parser.set_defaults(func=lambda _: parser.print_help())
 
     args = parser.parse_args()
-    args.func(args)
+    configure_logging(args)
+    if getattr(args, 'profile', False):
+        run_profiled(args)
+    else:
+        args.func(args)
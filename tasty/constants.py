@@ -1,7 +1,13 @@
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Optional
 
 from rdflib import Namespace
 
+import tasty.exceptions as te
+
 POINT_GROUP = 'point-group-template'
 ENTITY_TYPE = 'entity-template'
 SYSTEM_TYPE = 'system-template'
@@ -59,13 +65,8 @@ PH_CUSTOM = Namespace("https://project-haystack.org/def/custom#")
 
 BRICK_CUSTOM = Namespace("https://brickschema.org/custom#")
 
-PH_DEFAULT = None
-PHICT_DEFAULT = None
-PHSCIENCE_DEFAULT = None
-PHIOT_DEFAULT = None
-BRICK_DEFAULT = None
-TAG_DEFAULT = None
-BSH_DEFAULT = None
+# Annotations added to generated shapes by tasty, i.e. the tags of a compiled tag set constraint
+TASTY = Namespace("urn:tasty#")
 
 SUPPORTED_SCHEMAS = {
     BRICK: [V1_1, V1_2, V1_2_1],
@@ -80,28 +81,119 @@ namespace_map = {
 }
 
 
-def set_default_versions(haystack_version=V3_9_10, brick_version=V1_1):
-    global PH_DEFAULT, PHICT_DEFAULT, PHSCIENCE_DEFAULT, PHIOT_DEFAULT, BRICK_DEFAULT, TAG_DEFAULT, BSH_DEFAULT
-    assert haystack_version in SUPPORTED_SCHEMAS[HAYSTACK], f"{haystack_version} must be one of {SUPPORTED_SCHEMAS[HAYSTACK]}"
-    assert brick_version in SUPPORTED_SCHEMAS[BRICK], f"{brick_version} must be one of {SUPPORTED_SCHEMAS[BRICK]}"
-
-    PH_DEFAULT = Namespace(f"https://project-haystack.org/def/ph/{haystack_version}#")
-    PHICT_DEFAULT = Namespace(f"https://project-haystack.org/def/phIct/{haystack_version}#")
-    PHSCIENCE_DEFAULT = Namespace(f"https://project-haystack.org/def/phScience/{haystack_version}#")
-    PHIOT_DEFAULT = Namespace(f"https://project-haystack.org/def/phIoT/{haystack_version}#")
+class NamespaceContext(NamedTuple):
+    """
+    The versioned namespaces of a Haystack version and a Brick version. A context is immutable, so it can be shared
+    by threads, and generations or validations of different versions can run side by side, each with its own context.
+    """
+    haystack_version: str
+    brick_version: str
+    ph: Namespace
+    phict: Namespace
+    phscience: Namespace
+    phiot: Namespace
+    brick: Namespace
+    tag: Namespace
+    bsh: Namespace
+
+
+@lru_cache(maxsize=None)
+def create_namespace_context(haystack_version: str = V3_9_10, brick_version: str = V1_1) -> NamespaceContext:
+    """
+    :param haystack_version: the Haystack version, one of SUPPORTED_SCHEMAS[HAYSTACK]
+    :param brick_version: the Brick version, one of SUPPORTED_SCHEMAS[BRICK]
+    :return: the namespaces of the versions
+    """
+    if haystack_version not in SUPPORTED_SCHEMAS[HAYSTACK]:
+        raise te.TastyError(f"{haystack_version} must be one of {SUPPORTED_SCHEMAS[HAYSTACK]}")
+    if brick_version not in SUPPORTED_SCHEMAS[BRICK]:
+        raise te.TastyError(f"{brick_version} must be one of {SUPPORTED_SCHEMAS[BRICK]}")
 
     if brick_version == V1_1:
-        BRICK_DEFAULT = BRICK_1_1
-        TAG_DEFAULT = TAG_1_1
-        BSH_DEFAULT = BSH_1_1
+        brick, tag, bsh = BRICK_1_1, TAG_1_1, BSH_1_1
     elif brick_version == V1_2:
-        BRICK_DEFAULT = BRICK_1_2
-        TAG_DEFAULT = TAG_1_2
-        BSH_DEFAULT = BSH_1_2
+        brick, tag, bsh = BRICK_1_2, TAG_1_2, BSH_1_2
     else:
-        BRICK_DEFAULT = Namespace("https://brickschema.org/schema/Brick#")
-        TAG_DEFAULT = Namespace("https://brickschema.org/schema/BrickTag#")
-        BSH_DEFAULT = Namespace("https://brickschema.org/schema/BrickShape#")
+        brick, tag, bsh = BRICK_1_2_1, TAG_1_2_1, BSH_1_2_1
+    return NamespaceContext(
+        haystack_version,
+        brick_version,
+        Namespace(f"https://project-haystack.org/def/ph/{haystack_version}#"),
+        Namespace(f"https://project-haystack.org/def/phIct/{haystack_version}#"),
+        Namespace(f"https://project-haystack.org/def/phScience/{haystack_version}#"),
+        Namespace(f"https://project-haystack.org/def/phIoT/{haystack_version}#"),
+        brick,
+        tag,
+        bsh,
+    )
+
+
+# the context used outside of any namespace_context scope, see set_default_versions
+_default_context = create_namespace_context()
+_scoped_context: ContextVar[Optional[NamespaceContext]] = ContextVar('tasty_namespace_context', default=None)
+
+
+def get_namespace_context(schema: str = None, version: str = None) -> NamespaceContext:
+    """
+    :param schema: with version, the schema whose version replaces the one of the current context
+    :param version: the version of the schema
+    :return: the context of the current namespace_context scope, or the default context outside of any scope
+    """
+    context = _scoped_context.get()
+    if context is None:
+        context = _default_context
+    if schema == HAYSTACK:
+        return create_namespace_context(version, context.brick_version)
+    if schema == BRICK:
+        return create_namespace_context(context.haystack_version, version)
+    if schema is not None:
+        raise te.TastyError(f"Schema must be one of: {SUPPORTED_SCHEMAS.keys()}")
+    return context
+
+
+@contextmanager
+def namespace_context(haystack_version: str = None, brick_version: str = None) -> Iterator[NamespaceContext]:
+    """
+    Scope the versions of the namespaces to the current thread (or asyncio task) for the duration of a block:
+        with tc.namespace_context(haystack_version=tc.V3_9_9) as context:
+            has_tag = context.ph.hasTag
+
+    :param haystack_version: the Haystack version, the one of the current context if None
+    :param brick_version: the Brick version, the one of the current context if None
+    :return: the context of the block
+    """
+    current = get_namespace_context()
+    context = create_namespace_context(haystack_version or current.haystack_version,
+                                       brick_version or current.brick_version)
+    token = _scoped_context.set(context)
+    try:
+        yield context
+    finally:
+        _scoped_context.reset(token)
+
+
+def set_default_versions(haystack_version=V3_9_10, brick_version=V1_1):
+    """
+    Set the versions of the default context, used by every thread outside of a namespace_context scope. Prefer
+    namespace_context, or passing the version explicitly, when different versions are used in one process.
+    """
+    global _default_context
+    _default_context = create_namespace_context(haystack_version, brick_version)
+
+
+# the namespaces of the current context, as module attributes, i.e. tc.PH_DEFAULT.hasTag
+_DEFAULT_ATTRIBUTES = {
+    'PH_DEFAULT': 'ph',
+    'PHICT_DEFAULT': 'phict',
+    'PHSCIENCE_DEFAULT': 'phscience',
+    'PHIOT_DEFAULT': 'phiot',
+    'BRICK_DEFAULT': 'brick',
+    'TAG_DEFAULT': 'tag',
+    'BSH_DEFAULT': 'bsh',
+}
 
 
-set_default_versions()
+def __getattr__(name):
+    if name in _DEFAULT_ATTRIBUTES:
+        return getattr(get_namespace_context(), _DEFAULT_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -9,6 +9,8 @@ import tasty.graphs as tg
 import tasty.constants as tc
 from tasty.shapes_generator import ShapesGenerator
 
+logger = logging.getLogger(__name__)
+
 
 class RefType:
     def __init__(self, type_uri: URIRef, type_docs: Literal):
@@ -83,12 +85,14 @@ class CompositeShape:
                     for point in composite_shape.optional_shapes:
                         point.apply(equip_id, namespace, entity, ref)
         else:
-            print('No mixins found for this composite shape')
+            logger.warning("No mixins found for composite shape: %s", self.name)
 
 
 class ShapesWrapper:
     def __init__(self, schema, version):
         self.sg = ShapesGenerator(schema, version)
+        # resolving terms against a set of the ontology subjects is much faster than querying the ontology
+        self.subjects = set(self.sg.ontology.subjects())
 
     def bind(self):
         for file, file_data in self.sg.source_shapes_by_file.items():
@@ -101,7 +105,7 @@ class ShapesWrapper:
                 if simple_shapes <= keys and len(shape.get('types')) == 1:
                     data = {
                         'name': shape['name'],
-                        'type': tg.get_namespaced_term(self.sg.ontology, shape['types'][0])
+                        'type': tg.get_namespaced_term(self.sg.ontology, shape['types'][0], self.subjects)
                     }
                     if shape.get('tags'):
                         data['tags'] = shape.get('tags')
@@ -123,24 +127,23 @@ class ShapesWrapper:
 
     def evaluate_shape(self, shape):
         data = {'name': shape['name']}
-        if 'shape-mixins' in shape.keys() and 'predicates' not in shape.keys():
-            # Composite shape with only mixins
-            try:
-                data['type'] = tg.get_namespaced_term(self.sg.ontology, shape['types'][0])
-            except BaseException:
-                # TODO: add functionality to infer type from mixins
-                data['type'] = tg.get_namespaced_term(self.sg.ontology, 'point')
+        if 'shape-mixins' in shape.keys():
             data['shape-mixins'] = self.add_shapes(shape['shape-mixins'])
-        else:
+        if 'predicates' in shape.keys():
             # Composite shape with Required and Optional
             for category in shape['predicates'].keys():
                 data['shapes'] = shape['predicates'][category][0]['shapes']
                 try:
                     data['type'] = tg.get_namespaced_term(self.sg.ontology,
-                                                          shape['predicates'][category][0]['types'][0])
+                                                          shape['predicates'][category][0]['types'][0], self.subjects)
                 except BaseException:
-                    data['type'] = tg.get_namespaced_term(self.sg.ontology, 'point')
+                    data['type'] = tg.get_namespaced_term(self.sg.ontology, 'point', self.subjects)
                 data[category] = self.add_shapes(data['shapes'])
+        if shape.get('types'):
+            data['type'] = tg.get_namespaced_term(self.sg.ontology, shape['types'][0], self.subjects)
+        elif 'type' not in data:
+            # TODO: add functionality to infer type from mixins
+            data['type'] = tg.get_namespaced_term(self.sg.ontology, 'point', self.subjects)
         return data
 
     def add_shapes(self, shapes):
@@ -202,7 +205,7 @@ class EntityType:
         elif new_id and self._id is None:
             self._id = new_id
         else:
-            print(f"id already set, can't override.")
+            logger.warning("id already set, can't override.")
         return self._id
 
     def set_namespace(self, ns: Union[str, Namespace]) -> bool:
@@ -243,7 +246,7 @@ class EntityType:
             if ns_term:
                 self.tags.add(ns_term)
             else:
-                logging.warning(f"{t} not found. adding under custom namespace as: {self._custom_namespace[t]}")
+                logger.debug("%s not found. adding under custom namespace as: %s", t, self._custom_namespace[t])
                 self.tags_custom.add(self._custom_namespace[t])
 
     def add_relationship(self, predicate: RefType, obj: 'EntityType'):
@@ -258,7 +261,7 @@ class EntityType:
             obj.bind_to_graph(self.graph)
             #print(f"Bound {obj.node} to graph")
         else:
-            print(f"Atleast one of the nodes {self.node}, {obj.node} must be bound to a graph")
+            logger.warning("Atleast one of the nodes %s, %s must be bound to a graph", self.node, obj.node)
             return False
         self.relationships.add((predicate, obj))
 
@@ -274,10 +277,11 @@ class EntityType:
             if obj not in touched_nodes:
                 obj.sync(touched_nodes)
         if self.schema == tc.HAYSTACK:
+            has_tag = tc.get_namespace_context(self.schema, self.version).ph.hasTag
             for tag in self.tags:
-                self.graph.add((self.node, tc.PH_DEFAULT.hasTag, tag))
+                self.graph.add((self.node, has_tag, tag))
             for tag in self.tags_custom:
-                self.graph.add((self.node, tc.PH_DEFAULT.hasTag, tag))
+                self.graph.add((self.node, has_tag, tag))
 
 
 class EntityDefs:
@@ -1,64 +1,179 @@
+import csv
+import logging
 import os
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
-from rdflib import Graph
+from rdflib import Graph, RDF, RDFS, URIRef
+from rdflib.plugins.parsers.ntriples import NTriplesParser
 from rdflib.util import guess_format
 
 import json
 
+import tasty.constants as tc
+import tasty.graphs as tg
+from tasty.profiling import span
 
-def generate_input_file(shape_files: List, data_graph: str, output_file: str, composite: bool = True):
+logger = logging.getLogger(__name__)
+
+
+class _TripleSink:
+    """Sink for the NTriplesParser, passing each parsed triple to a callback"""
+
+    def __init__(self, callback):
+        self.triple = callback
+
+
+class EntityCollector:
+    """
+    Collect the entities (subjects with an rdf:type) and their labels from a stream of triples, keeping
+    only a single entry per entity. If 'types' is given, only entities with at least one rdf:type
+    that is one of the types, or a subclass of one of the types in the ontology, are kept.
+    """
+
+    def __init__(self, types: Set[str] = None, ontology: Graph = None):
+        """
+        :param types: the local names of the types to keep entities for, i.e. {'point', 'equip'}
+        :param ontology: the ontology to resolve subclasses with
+        """
+        self.types = types
+        self.ontology = ontology
+        self.entities: Dict[URIRef, bool] = {}
+        self.labels: Dict[URIRef, str] = {}
+        self._type_matches: Dict[URIRef, bool] = {}
+
+    def type_matches(self, rdf_type: URIRef) -> bool:
+        """
+        :param rdf_type: the type of an entity
+        :return: whether the type or one of its superclasses is one of self.types
+        """
+        matches = self._type_matches.get(rdf_type)
+        if matches is None:
+            classes = [rdf_type]
+            if self.ontology is not None:
+                classes = self.ontology.transitive_objects(rdf_type, RDFS.subClassOf)
+            matches = any(tg.get_local_name(c) in self.types for c in classes)
+            self._type_matches[rdf_type] = matches
+        return matches
+
+    def add(self, s, p, o) -> None:
+        if p == RDF.type:
+            matches = self.types is None or self.type_matches(o)
+            self.entities[s] = self.entities.get(s, False) or matches
+        elif p == RDFS.label and s not in self.labels:
+            self.labels[s] = str(o)
+
+    def add_triples(self, triples: Iterable[Tuple]) -> None:
+        for s, p, o in triples:
+            self.add(s, p, o)
+
+    def rows(self) -> Iterator[Tuple[str, str]]:
+        """
+        :return: an (entity id, entity name) tuple for each kept entity, in the order they were first seen
+        """
+        for entity, matches in self.entities.items():
+            if matches:
+                yield str(entity), self.labels.get(entity, '')
+
+
+def collect_entities(data_graph: str, types: Set[str] = None, ontology: Graph = None,
+                     batch_size: int = 1000) -> EntityCollector:
+    """
+    Collect the entities of a data graph file in a single streaming pass. N-Triples files are parsed line by line,
+    Turtle files batch_size statements at a time (see tg.iter_turtle_graphs). Other formats are parsed fully.
+
+    :param data_graph: path to the data graph
+    :param types: see EntityCollector
+    :param ontology: see EntityCollector
+    :param batch_size: the number of Turtle statements to parse at a time
+    :return: the EntityCollector
+    """
+    collector = EntityCollector(types, ontology)
+    fmt = guess_format(data_graph)
+    if fmt == 'nt':
+        with open(data_graph, 'rb') as f:
+            NTriplesParser(_TripleSink(collector.add)).parse(f)
+    elif fmt == 'turtle':
+        with open(data_graph, 'r', encoding='utf-8') as f:
+            for batch in tg.iter_turtle_graphs(f, batch_size):
+                collector.add_triples(batch)
+    else:
+        collector.add_triples(Graph().parse(data_graph, format=fmt))
+    return collector
+
+
+def get_shape_types(shape_files: List, composite: bool = True) -> Set[str]:
+    """
+    Get the local names of the types targeted by the shapes in the shape files. Shapes without 'types' are
+    composite (equipment) shapes, which target 'equip'.
+
+    :param shape_files: paths to JSON source_shapes files
+    :param composite: whether to only consider more complex shapes
+    :return: the local names of the types
+    """
+    types = set()
+    for shape in iter_shapes(shape_files, composite):
+        types.update(shape.get('types', ['equip']))
+    return types
+
+
+def iter_shapes(shape_files: List, composite: bool = True) -> Iterator[dict]:
+    """
+    Yield the shapes from the shape files, with their 'prefix' added.
+
+    :param shape_files: paths to JSON source_shapes files
+    :param composite: whether to only consider more complex shapes
+    """
+    for shape_file in shape_files:
+        with open(shape_file, 'r') as f:
+            data = json.loads(f.read())
+
+        prefix = data['prefix']
+        for shape in data['shapes']:
+            if not composite or 'shape-mixins' in shape or 'predicates' in shape:
+                yield dict(shape, prefix=prefix)
+
+
+def generate_input_file(shape_files: List, data_graph: str, output_file: str, composite: bool = True,
+                        filter_types: bool = False, schema: str = tc.HAYSTACK, version: str = tc.V3_9_10):
     """
     Generate a csv file for users to input data. The shape name column headers are added based on
-    the shape files provided. entity ids and names are populated from the data file provided.
+    the shape files provided. entity ids and names are populated from the data file provided, with
+    one row per entity.
         | entity-id | entity-name | shape-name-1 | ...
         | ...id1... | ..a name..  |              | ..
     :param shape_files: paths to JSON source_shapes files to use to populate the csv headers
     :param data_graph: name of data graph to read in to populate entity-id and entity-name columns
     :param output_file: path to output file to write
     :param composite: whether to only consider more complex shapes
+    :param filter_types: whether to only add entities with a type (or subtype) targeted by the shapes
+    :param schema: the schema of the data graph, used to resolve subtypes when filtering
+    :param version: the version of the schema
     :return:
     """
     headers = ['entity-id', 'entity-name']
+    headers.extend(shape['prefix'] + ':' + shape['name'] for shape in iter_shapes(shape_files, composite))
 
-    for shape_file in shape_files:
-        with open(shape_file, 'r') as f:
-            data = json.loads(f.read())
-
-        prefix = data['prefix']
-        for shape in data['shapes']:
-            if composite:
-                if 'shape-mixins' in shape or 'predicates' in shape:
-                    headers.append(prefix + ':' + shape['name'])
-            else:
-                headers.append(prefix + ':' + shape['name'])
-
-    valid_file = True
+    collector = None
     if data_graph is not None and os.path.isfile(data_graph):
-        g = Graph()
-        g.parse(data_graph, format=guess_format(data_graph))
-        q = """SELECT ?s ?label WHERE {
-            ?s a ?o .
-            OPTIONAL { ?s rdfs:label ?label }
-        }
-        """
-        query_response = g.query(q)
+        types = None
+        ontology = None
+        if filter_types:
+            types = get_shape_types(shape_files, composite)
+            ontology = tg.load_ontology(schema, version)
+        with span('collect_entities', file=os.path.basename(data_graph)) as s:
+            collector = collect_entities(data_graph, types, ontology)
+            s.set(entities=len(collector.entities))
     elif data_graph is None:
-        print(f"No input data file provided. Proceeding fine.")
-        valid_file = False
+        logger.info("No input data file provided. Proceeding fine.")
     elif not os.path.isfile(data_graph):
-        print(f"Unable to find data file: {data_graph}. Proceeding fine.")
-        valid_file = False
+        logger.warning("Unable to find data file: %s. Proceeding fine.", data_graph)
 
     if not output_file:
         output_file = 'input-file.csv'
-    with open(output_file, 'w+') as f:
-        output = ','.join(headers) + '\n'
-        f.write(output)
-        if valid_file:
-            to_write = []
-            for each in query_response:
-                line = str(each[0]) + "," + str(each[1]) + ',' * (len(headers) - 2) + '\n'
-                to_write.append(line)
-
-            f.writelines(to_write)
+    with span('write_input_file'), open(output_file, 'w+', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(headers)
+        if collector is not None:
+            empty = [''] * (len(headers) - 2)
+            for entity_id, entity_name in collector.rows():
+                writer.writerow([entity_id, entity_name] + empty)
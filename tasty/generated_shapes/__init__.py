@@ -1,18 +1,19 @@
 import os
 
 from rdflib import Graph
-from rdflib.util import guess_format
 
 generated_dir = os.path.dirname(__file__)
 
 
-def load_all_shapes_and_merge():
+def load_all_shapes_and_merge() -> Graph:
     """
-    Load all ttl files in this directory into a single graph and return
+    Load all ttl files in this directory into a single graph and return. The '<schema>_all.ttl' files
+    are skipped, as they only merge the other files. Each file is only parsed once per process, and the
+    graphs are combined into a view without copying them (see tasty.shapes_loader.ShapesOverlay).
     :return:
     """
-    g = Graph()
-    files = [os.path.join(generated_dir, f) for f in os.listdir(generated_dir) if f.endswith('.ttl')]
-    for file in files:
-        g.parse(file, format=guess_format(file))
-    return g
+    from tasty.shapes_loader import ShapesOverlay, load_frozen_shapes_file
+
+    files = sorted(os.path.join(generated_dir, f) for f in os.listdir(generated_dir)
+                   if f.endswith('.ttl') and not f.endswith('_all.ttl'))
+    return ShapesOverlay([load_frozen_shapes_file(file) for file in files])
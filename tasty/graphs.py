@@ -1,11 +1,19 @@
+import io
 import json
 import os
-from typing import List, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Set, TextIO, Tuple, Union
 import uuid
 
 from rdflib import Graph, Namespace, OWL, RDF, RDFS, SKOS, SH, URIRef
+from rdflib.plugins.parsers.notation3 import RDFSink, SinkParser
 
 import tasty.constants as tc
+from tasty.profiling import span
+
+# {((schema, version), ...): Graph} of the ontologies combined by load_combined_ontology
+_combined_ontologies = {}
+# {(schema, version): OntologyClosure} of the closures computed by load_closure
+_closures = {}
 
 
 def get_versioned_graph(schema: str, version: str) -> Graph:
@@ -31,18 +39,307 @@ def load_ontology(schema: str, version: str) -> Graph:
     :param version: [str] A valid version from SUPPORTED_SCHEMAS
     :return:
     """
-    g = get_versioned_graph(schema, version)
-    schema_path = os.path.join(tc.SCHEMAS_DIR, schema.lower())
-    if schema == tc.HAYSTACK:
-        schema_path = os.path.join(schema_path, f"defs_{version.replace('.', '_')}.ttl")
-    elif schema == tc.BRICK:
-        schema_path = os.path.join(schema_path, f"Brick_{version.replace('.', '_')}.ttl")
-    with open(schema_path, 'r') as f:
-        data = f.read()
-    g.parse(data=data, format='ttl')
+    with span('load_ontology', schema=schema, version=version) as s:
+        g = get_versioned_graph(schema, version)
+        schema_path = os.path.join(tc.SCHEMAS_DIR, schema.lower())
+        if schema == tc.HAYSTACK:
+            schema_path = os.path.join(schema_path, f"defs_{version.replace('.', '_')}.ttl")
+        elif schema == tc.BRICK:
+            schema_path = os.path.join(schema_path, f"Brick_{version.replace('.', '_')}.ttl")
+        with open(schema_path, 'r') as f:
+            data = f.read()
+        g.parse(data=data, format='ttl')
+        s.set(triples=len(g))
     return g
 
 
+def load_combined_ontology(schemas_and_versions: Iterable[Tuple[str, str]]) -> Graph:
+    """
+    Load the ontologies of several schemas (i.e. Haystack and Brick) into a single graph, to validate data graphs
+    using more than one schema in a single pass. The combined graph is built once per process for each combination
+    of schemas and versions and shared, so it must not be modified.
+
+    :param schemas_and_versions: [Iterable[Tuple[str, str]]] (schema, version) pairs, i.e. [('Haystack', '3.9.10')]
+    :return: [Graph]
+    """
+    key = tuple(sorted(set(schemas_and_versions)))
+    if key not in _combined_ontologies:
+        combined = Graph()
+        bind_prefixes(combined)
+        for schema, version in key:
+            is_valid_schema_and_version(schema, version)
+            bind_versioned_prefixes(combined, schema, version)
+            ontology = load_ontology(schema, version)
+            combined.addN((s, p, o, combined) for s, p, o in ontology)
+        _combined_ontologies[key] = combined
+    return _combined_ontologies[key]
+
+
+class OntologyClosure:
+    """
+    The entailments of an ontology that matter for validating against the generated shapes, computed once
+    for the named classes (blank node restrictions are ignored):
+        - the superclasses of each class (the transitive rdfs:subClassOf closure, including the class itself)
+        - the tags implied by each class, see load_closure
+    Applying them to a data graph with expand makes the types and tags implied by the ontology explicit,
+    so the data graph can be validated without mixing the ontology into it (ont_graph).
+    """
+
+    def __init__(self, superclasses: Dict[URIRef, Set[URIRef]], tags: Dict[URIRef, Set[URIRef]],
+                 tag_predicate: URIRef = None):
+        """
+        :param superclasses: {class: the class and its superclasses}
+        :param tags: {class: the tags implied by the class}
+        :param tag_predicate: the predicate tags are added to data graph entities with, i.e. ph:hasTag
+        """
+        self.superclasses = superclasses
+        self.tags = tags
+        self.tag_predicate = tag_predicate
+
+    @classmethod
+    def from_ontology(cls, ontology: Graph,
+                      get_class_tags: Callable[[URIRef, Set[URIRef]], Set[URIRef]] = None,
+                      tag_predicate: URIRef = None) -> 'OntologyClosure':
+        """
+        :param ontology: the ontology
+        :param get_class_tags: a function of a class and its superclasses returning the tags implied by the class
+        :param tag_predicate: the predicate relating an entity to its tags in a data graph, i.e. ph:hasTag
+        :return: the closure
+        """
+        parents: Dict[URIRef, Set[URIRef]] = {}
+        for s, o in ontology.subject_objects(RDFS.subClassOf):
+            if isinstance(s, URIRef) and isinstance(o, URIRef):
+                parents.setdefault(s, set()).add(o)
+        superclasses: Dict[URIRef, Set[URIRef]] = {}
+
+        def resolve(c, visiting):
+            if c in superclasses:
+                return superclasses[c]
+            result = {c}
+            visiting.add(c)
+            for parent in parents.get(c, ()):
+                if parent not in visiting:
+                    result |= resolve(parent, visiting)
+            visiting.discard(c)
+            superclasses[c] = result
+            return result
+
+        for c in parents:
+            resolve(c, set())
+        tags = {}
+        if get_class_tags is not None:
+            for c, supers in superclasses.items():
+                class_tags = get_class_tags(c, supers)
+                if class_tags:
+                    tags[c] = class_tags
+        return cls(superclasses, tags, tag_predicate)
+
+    def get_superclasses(self, c: URIRef) -> Set[URIRef]:
+        """
+        :param c: a class
+        :return: the class and all of its (transitive) superclasses
+        """
+        return self.superclasses.get(c, {c})
+
+    def get_tags(self, c: URIRef) -> Set[URIRef]:
+        """
+        :param c: a class
+        :return: the tags implied by the class
+        """
+        return self.tags.get(c, set())
+
+    def expand(self, data_graph: Graph, types: bool = True, tags: bool = False) -> int:
+        """
+        Add the entailed triples to the data graph, in place:
+            - an rdf:type triple for each superclass of each rdf:type of an entity (types)
+            - a tag triple for each tag implied by the most specific rdf:types of an entity (tags)
+        Tags are not added by default, as they are what the generated shapes check for: adding the tags implied
+        by a type would hide missing tags on entities that are typed.
+
+        :param data_graph: the data graph to expand
+        :param types: whether to add the superclasses
+        :param tags: whether to add the tags
+        :return: the number of triples added
+        """
+        with span('inference', types=types, tags=tags) as inference_span:
+            entity_types: Dict[URIRef, Set[URIRef]] = {}
+            for s, o in data_graph.subject_objects(RDF.type):
+                entity_types.setdefault(s, set()).add(o)
+            entailed = set()
+            for s, classes in entity_types.items():
+                if types:
+                    for c in classes:
+                        entailed.update((s, RDF.type, sup) for sup in self.get_superclasses(c))
+                if tags and self.tag_predicate is not None:
+                    # only the most specific types, as superclasses such as phIoT:air-output do not imply their tags
+                    for c in classes:
+                        if not any(c != other and c in self.get_superclasses(other) for other in classes):
+                            entailed.update((s, self.tag_predicate, tag) for tag in self.get_tags(c))
+            entailed = [t for t in entailed if t not in data_graph]
+            data_graph.addN((s, p, o, data_graph) for s, p, o in entailed)
+            inference_span.set(triples=len(data_graph), entailed=len(entailed))
+        return len(entailed)
+
+
+def load_closure(schema: str, version: str) -> OntologyClosure:
+    """
+    Compute the OntologyClosure of a schema and version, once per process. The tags implied by a class are:
+        - Haystack: the tags of the hyphenated components of its name, and the entity type it is a kind of,
+          i.e. phIoT:ahu implies phIoT:ahu and phIoT:equip
+        - Brick: the brick:hasAssociatedTag tags of the class and its superclasses
+    :param schema: [str] A valid key from SUPPORTED_SCHEMAS
+    :param version: [str] A valid version from SUPPORTED_SCHEMAS
+    :return: [OntologyClosure]
+    """
+    key = (schema, version)
+    if key not in _closures:
+        is_valid_schema_and_version(schema, version)
+        ontology = load_ontology(schema, version)
+        if schema == tc.HAYSTACK:
+            ph = Namespace(f"https://project-haystack.org/def/ph/{version}#")
+            entity_types = set(ontology.subjects(RDFS.subClassOf, ph.entity))
+            subjects = set(ontology.subjects())
+            terms = {}
+
+            def get_class_tags(c, supers):
+                names = get_local_name(c).split('-')
+                for name in names:
+                    if name not in terms:
+                        terms[name] = get_namespaced_term(ontology, name, subjects)
+                if not all(terms[name] for name in names):
+                    return set()
+                return {terms[name] for name in names} | (supers & entity_types)
+
+            tag_predicate = ph.hasTag
+        else:
+            brick = Namespace(dict(ontology.namespaces())['brick'])
+            associated_tags = {}
+            for s, o in ontology.subject_objects(brick.hasAssociatedTag):
+                associated_tags.setdefault(s, set()).add(o)
+
+            def get_class_tags(c, supers):
+                return set().union(*(associated_tags.get(sup, set()) for sup in supers))
+
+            tag_predicate = brick.hasTag
+        with span('build_closure', schema=schema, version=version):
+            _closures[key] = OntologyClosure.from_ontology(ontology, get_class_tags, tag_predicate)
+    return _closures[key]
+
+
+def iter_turtle_batches(lines: Iterable[str], batch_size: int = 1000) -> Iterator[str]:
+    """
+    Split a stream of Turtle lines into Turtle documents of at most batch_size statements each. Each document is
+    prefixed with all @prefix / @base directives seen so far. Assumes statements end with a '.' at the end of a line,
+    outside of multi-line string literals.
+
+    A blank node label (i.e. _:N1, written by rdflib for blank nodes referenced more than once) may be used by
+    statements of different documents, so parsing each document on its own would create a new blank node per
+    document. Parse the documents with iter_turtle_graphs or parse_turtle_stream instead, which share the labels.
+
+    :param lines: [Iterable[str]] lines of a Turtle document, i.e. an open file
+    :param batch_size: [int] maximum number of statements per document
+    :return: [Iterator[str]]
+    """
+    directives = []
+    statement = []
+    batch = []
+    in_long_string = False
+    for line in lines:
+        stripped = line.strip()
+        if not statement and not in_long_string:
+            if stripped.startswith(('@prefix', '@base')) or stripped.lower().startswith(('prefix ', 'base ')):
+                directives.append(line if line.endswith('\n') else line + '\n')
+                continue
+            if not stripped or stripped.startswith('#'):
+                continue
+        statement.append(line)
+        if (line.count('"""') + line.count("'''")) % 2 == 1:
+            in_long_string = not in_long_string
+        if not in_long_string and stripped.endswith('.'):
+            batch.append(''.join(statement))
+            statement = []
+            if len(batch) >= batch_size:
+                yield ''.join(directives) + '\n'.join(batch) + '\n'
+                batch = []
+    if statement:
+        batch.append(''.join(statement))
+    if batch:
+        yield ''.join(directives) + '\n'.join(batch) + '\n'
+
+
+class _TurtleSink(RDFSink):
+    """Sink for the SinkParser, also binding the prefixes of the document in the graph of the sink"""
+
+    def bind(self, pfx, uri):
+        self.graph.bind(pfx, uri.decode('utf-8'))
+
+    def setDefaultNamespace(self, uri):
+        self.graph.bind('', uri.decode('utf-8'))
+
+
+def _start_turtle_parser(graph: Graph) -> Tuple[RDFSink, SinkParser]:
+    """
+    Start the parser rdflib uses for Turtle, adding the triples to the graph of the sink. A single parser is fed
+    all the batches of a stream, so the blank node labels and prefixes of a batch carry over to the next ones.
+    """
+    sink = _TurtleSink(graph)
+    # the base of graph.parse(data=...), as TurtleParser.parse sets it
+    parser = SinkParser(sink, baseURI=graph.absolutize(''), turtle=True)
+    parser.startDoc()
+    return sink, parser
+
+
+def iter_turtle_graphs(lines: Iterable[str], batch_size: int = 1000) -> Iterator[Graph]:
+    """
+    Parse a stream of Turtle lines in batches (see iter_turtle_batches), yielding a new graph per batch. Blank node
+    labels refer to the same blank node in all the graphs.
+
+    :param lines: [Iterable[str]] lines of a Turtle document, i.e. an open file
+    :param batch_size: [int] maximum number of statements per batch
+    :return: [Iterator[Graph]]
+    """
+    sink, parser = _start_turtle_parser(Graph())
+    for document in iter_turtle_batches(lines, batch_size):
+        sink.graph = Graph()
+        parser.feed(document)
+        yield sink.graph
+    parser.endDoc()
+
+
+def parse_turtle_stream(lines: Iterable[str], graph: Graph, batch_size: int = 1000) -> Graph:
+    """
+    Parse a stream of Turtle lines into the graph in batches, see iter_turtle_batches. Blank node labels refer to
+    the same blank node in all the batches.
+
+    :param lines: [Iterable[str]] lines of a Turtle document, i.e. an open file
+    :param graph: [rdflib.Graph] the graph to add the triples to
+    :param batch_size: [int] maximum number of statements per batch
+    :return: [rdflib.Graph] the graph
+    """
+    _, parser = _start_turtle_parser(graph)
+    for document in iter_turtle_batches(lines, batch_size):
+        parser.feed(document)
+    parser.endDoc()
+    return graph
+
+
+def turtle_stream_to_ntriples(lines: Iterable[str], output: TextIO, batch_size: int = 1000) -> int:
+    """
+    Convert a stream of Turtle lines to N-Triples in batches, see iter_turtle_batches. Only a single batch
+    is held in memory at any time.
+
+    :param lines: [Iterable[str]] lines of a Turtle document, i.e. an open file
+    :param output: [TextIO] a file object to write the N-Triples to
+    :param batch_size: [int] maximum number of statements per batch
+    :return: [int] the number of triples written
+    """
+    count = 0
+    for g in iter_turtle_graphs(lines, batch_size):
+        output.write(g.serialize(format='nt').decode('utf-8'))
+        count += len(g)
+    return count
+
+
 def bind_versioned_prefixes(graph: Graph, schema: str, version: str) -> None:
     """
 
@@ -108,18 +405,21 @@ def is_valid_schema_and_version(schema: str, version: str) -> bool:
     return False
 
 
-def get_namespaces_given_term(ontology: Graph, term: str) -> List[Namespace]:
+def get_namespaces_given_term(ontology: Graph, term: str, subjects: Set[URIRef] = None) -> List[Namespace]:
     """
     Return a list of Namespaces where this term exists in the provided Graph.
     The hope is for the len to be 1, i.e. there is just one Namespace where this
     term exists
     :param ontology: [Graph] an ontology (Brick or Haystack) pre
     :param term: [str] a term to search for in the Namespace
+    :param subjects: [Set[URIRef]] the set of subjects of the ontology. Computed if not provided,
+        pass it in when looking up many terms in the same ontology.
     :return: [list[Namespace]]
     """
     graph_namespaces = list(ontology.namespaces())
     ns_objects = [Namespace(x[1]) for x in graph_namespaces]
-    subjects = set(ontology.subjects())
+    if subjects is None:
+        subjects = set(ontology.subjects())
     matched_namespaces = []
     for gn in ns_objects:
         if gn[term] in subjects:
@@ -142,14 +442,15 @@ def has_one_namespace(ns):
         return False
 
 
-def get_namespaced_term(ontology: Graph, term: str) -> Union[URIRef, bool]:
+def get_namespaced_term(ontology: Graph, term: str, subjects: Set[URIRef] = None) -> Union[URIRef, bool]:
     """
     Return a fully namespaced term if it exists exclusively in the ontology, else return False
     :param ontology:
     :param term:
+    :param subjects: see get_namespaces_given_term
     :return:
     """
-    potential_namespaces = get_namespaces_given_term(ontology, term)
+    potential_namespaces = get_namespaces_given_term(ontology, term, subjects)
     if has_one_namespace(potential_namespaces):
         ns = potential_namespaces[0]
         return ns[term]
@@ -158,86 +459,81 @@ def get_namespaced_term(ontology: Graph, term: str) -> Union[URIRef, bool]:
 
 def graph_to_hayson_string(graph: Graph) -> str:
     """
-    Return the Haystack JSON (Hayson) encoding of an RDF graph.
+    Return the Haystack JSON (Hayson) encoding of an RDF graph, see write_hayson.
     :param graph: [rdflib.Graph]
     :return: [str]
     """
-    hayson_dict = {
-        "meta": {"ver": "3.0"},
-        "cols": [],
-        "rows": []
-    }
-    json_ld_str = json.loads(graph.serialize(format='json-ld').decode('utf-8'))
-    for row in json_ld_str:
-        json_ld_dict = {"id": str(uuid.uuid4())}
-        for key, val in row.items():
-            uri_fragment_list = key.split("#")
-            if key == "@id":
-                dis = val
-                json_ld_dict.update({"dis": dis})
-            elif key == "@type":
-                tags = val[0].split('#')[1]
-                multitag = tags.split("-")
-                [json_ld_dict.update({tag: ":m"}) for tag in multitag]
-            elif uri_fragment_list[1] == "hasTag":
-                for tag1 in val:
-                    for k, v in tag1.items():
-                        if k == "@id":
-                            t = v.split("#")[1]
-                            json_ld_dict.update({t: ":m"})
-            elif uri_fragment_list[1] == "equipRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"equipRef": v})
-            elif uri_fragment_list[1] == "condenserWaterRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"condenserWaterRef": v})
-            elif uri_fragment_list[1] == "hotWaterRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"hotWaterRef": v})
-            elif uri_fragment_list[1] == "airRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"airRef": v})
-            elif uri_fragment_list[1] == "siteRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"siteRef": v})
-            elif uri_fragment_list[1] == "spaceRef":
-                for ref in val:
-                    for k, v in ref.items():
-                        if k == "@id":
-                            t = v.split("/")[1]
-                            json_ld_dict.update({"spaceRef": v})
-
-            hayson_dict["rows"].append(json_ld_dict)
+    output = io.StringIO()
+    write_hayson(graph, output)
+    return output.getvalue()
+
+
+def write_hayson(graph: Graph, output: TextIO) -> int:
+    """
+    Write the Haystack JSON (Hayson) encoding of an RDF graph to a file object. Each subject of the graph
+    becomes one row, which is written as soon as it is built, so only a single row is held in memory, along
+    with the set of subjects already written (see iter_hayson_rows). Since the columns are only known once
+    all rows are written, 'cols' is written after 'rows'.
+    A row consists of:
+        - id: a random uuid
+        - dis: the subject
+        - a marker for each tag (ph:hasTag) and for each hyphenated component of each rdf:type
+        - the object of each *Ref predicate, i.e. equipRef, siteRef, ...
+    :param graph: [rdflib.Graph]
+    :param output: [TextIO] a file object to write the Hayson to
+    :return: [int] the number of rows written
+    """
+    cols = {}
+    count = 0
+    output.write('{"meta": {"ver": "3.0"}, "rows": [')
+    for row in iter_hayson_rows(graph):
+        if count > 0:
+            output.write(', ')
+        output.write(json.dumps(row))
+        cols.update(dict.fromkeys(row))
+        count += 1
+    output.write('], "cols": ')
+    output.write(json.dumps([{"name": col} for col in cols]))
+    output.write('}')
+    return count
 
+
+def iter_hayson_rows(graph: Graph) -> Iterator[dict]:
+    """
+    Yield one Hayson row (see write_hayson) per subject of the graph. The triples of a subject are not
+    necessarily adjacent in graph.subjects(), so the subjects already yielded are kept in a set, which grows
+    with the number of subjects (but not with the number of triples) of the graph.
+    :param graph: [rdflib.Graph]
+    :return: [Iterator[dict]]
+    """
     seen = set()
-    hayson_rows_list = []
-    cols = set()
-    hayson_cols_list = []
-    for d in hayson_dict["rows"]:
-        t = tuple(d.items())
-        if t not in seen:
-            seen.add(t)
-            hayson_rows_list.append(d)
-            for tag in t:
-                cols.add(tag[0])
-
-    [hayson_cols_list.append({"name": tag}) for tag in cols]
-
-    hayson_dict["cols"] = hayson_cols_list
-    hayson_dict["rows"] = hayson_rows_list
-    return json.dumps(hayson_dict)
+    for subject in graph.subjects():
+        if subject in seen:
+            continue
+        seen.add(subject)
+        row = {
+            "id": str(uuid.uuid4()),
+            "dis": str(subject) if isinstance(subject, URIRef) else subject.n3()
+        }
+        for predicate, obj in graph.predicate_objects(subject):
+            if predicate == RDF.type:
+                for tag in get_local_name(obj).split('-'):
+                    row[tag] = ":m"
+                continue
+            name = get_local_name(predicate)
+            if name == "hasTag":
+                row[get_local_name(obj)] = ":m"
+            elif name.endswith("Ref"):
+                row[name] = str(obj)
+        yield row
+
+
+def get_local_name(uri: URIRef) -> str:
+    """
+    Return the part of a URI after the last '#', or after the last '/' if it has no '#'.
+    :param uri: [URIRef]
+    :return: [str]
+    """
+    if '#' in uri:
+        return uri[uri.rfind('#') + 1:]
+    return uri[uri.rfind('/') + 1:]
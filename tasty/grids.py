@@ -0,0 +1,487 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple, Union
+
+from rdflib import BNode, Graph, Literal, Namespace, RDF, RDFS, URIRef
+
+import tasty.constants as tc
+import tasty.exceptions as te
+import tasty.graphs as tg
+from tasty.skyspark import point_mapper as pm
+
+
+class Marker:
+    """The Haystack marker value"""
+
+    def __repr__(self):
+        return 'M'
+
+
+MARKER = Marker()
+
+
+class Ref:
+    """A Haystack ref value, with an optional display name"""
+
+    def __init__(self, val: str, dis: str = None):
+        self.val = val
+        self.dis = dis
+
+    def __eq__(self, other):
+        return isinstance(other, Ref) and other.val == self.val and other.dis == self.dis
+
+    def __hash__(self):
+        return hash(self.val)
+
+    def __repr__(self):
+        return f"@{self.val}" + (f" \"{self.dis}\"" if self.dis else '')
+
+
+class GridImporter:
+    """
+    Imports Haystack grids (Zinc or Hayson) into an rdflib data graph, without going through a Turtle export.
+    Grids are parsed row by row (see iter_zinc_rows and iter_hayson_file_rows) and the triples of each batch of
+    rows are added to the graph in bulk, so the parser only ever holds a single batch.
+
+    For each row, with the 'id' ref as the subject (in 'input_namespace_uri'):
+        - each marker tag is added as a ph:hasTag, namespaced according to the ontology (or phCustom)
+        - each *Ref tag is added as a relationship to the referenced entity, i.e. phIoT:equipRef
+        - 'dis' (or else the display name of the id) is added as an rdfs:label, other scalar tags defined in the ontology as literals
+        - points are typed with their first-class point type (see SkysparkGraphProcessor.add_first_class_point_types),
+          other entities with the most specific equip / site / space types matching their markers
+    """
+
+    entity_root_types = ('equip', 'site', 'space')
+
+    def __init__(self, input_namespace_uri: str, schema: str = tc.HAYSTACK, version: str = tc.V3_9_10,
+                 ontology: Graph = None):
+        """
+        :param input_namespace_uri: the namespace for the ids of the grid rows, i.e. 'urn:/_#'
+        :param schema: only Haystack is supported
+        :param version: a Haystack version
+        :param ontology: an already loaded ontology graph for the schema and version, loaded if not provided
+        """
+        if schema != tc.HAYSTACK:
+            raise te.TastyError(f"Grids can only be imported for {tc.HAYSTACK}, not {schema}")
+        self.namespace = Namespace(input_namespace_uri)
+        self.schema = schema
+        self.version = version
+        self.ontology = ontology if ontology is not None else tg.load_ontology(schema, version)
+        self.ph = Namespace(f"https://project-haystack.org/def/ph/{version}#")
+        self.phiot = Namespace(f"https://project-haystack.org/def/phIoT/{version}#")
+        self.point_type_index = pm.get_point_type_index(version, self.ontology)
+        self.entity_type_indexes = [pm.PointTypeIndex.from_ontology(self.ontology, self.phiot, root_type)
+                                    for root_type in self.entity_root_types]
+        self._subjects = set(self.ontology.subjects())
+        self._terms: Dict[str, Union[URIRef, bool]] = {}
+
+    def get_term(self, name: str) -> Union[URIRef, bool]:
+        """
+        Return the namespaced term for a tag name, see tg.get_namespaced_term. Lookups are memoized.
+
+        :param name: the tag name, i.e. 'air'
+        :return: the namespaced term, or False if it is not (exclusively) in the ontology
+        """
+        term = self._terms.get(name)
+        if term is None:
+            term = tg.get_namespaced_term(self.ontology, name, self._subjects)
+            self._terms[name] = term
+        return term
+
+    def get_id(self, ref: Union[Ref, str]) -> URIRef:
+        val = ref.val if isinstance(ref, Ref) else str(ref)
+        if _uri.match(val):
+            # already a full URI, i.e. as written by tg.write_hayson
+            return URIRef(val)
+        return self.namespace[val]
+
+    def row_to_triples(self, row: dict) -> List[Tuple]:
+        """
+        Convert a single grid row to triples.
+
+        :param row: a dict of {tag name: value}, as yielded by iter_zinc_rows / iter_hayson_file_rows
+        :return: a list of triples
+        """
+        ref = row.get('id')
+        subject = self.get_id(ref) if ref is not None else BNode()
+        triples = []
+        if isinstance(ref, Ref) and ref.dis and 'dis' not in row:
+            triples.append((subject, RDFS.label, Literal(ref.dis)))
+        markers = []
+        for name, val in row.items():
+            if name == 'id' or val is None:
+                continue
+            if val is MARKER:
+                markers.append(name)
+                tag = self.get_term(name) or tc.PH_CUSTOM[name]
+                triples.append((subject, self.ph.hasTag, tag))
+            elif name.endswith('Ref') and isinstance(val, (Ref, str)):
+                predicate = self.get_term(name) or tc.PH_CUSTOM[name]
+                triples.append((subject, predicate, self.get_id(val)))
+            elif name == 'dis':
+                triples.append((subject, RDFS.label, Literal(val)))
+            elif isinstance(val, (str, int, float, bool)):
+                predicate = self.get_term(name)
+                if predicate:
+                    triples.append((subject, predicate, Literal(val)))
+
+        if 'point' in markers:
+            types = [self.point_type_index.classify(markers)]
+        else:
+            types = [t for index in self.entity_type_indexes if index.root_type in markers
+                     for t in index.maximal_matches(markers)]
+        for t in types:
+            triples.append((subject, RDF.type, self.phiot[t]))
+        return triples
+
+    def import_rows(self, rows: Iterable[dict], graph: Graph = None, batch_size: int = 1000) -> Graph:
+        """
+        Add the triples for each row to the graph, batch_size rows at a time.
+
+        :param rows: the grid rows
+        :param graph: the graph to add to. A new graph from tg.get_versioned_graph is created if not provided
+        :param batch_size: the number of rows to convert before adding them to the graph
+        :return: the graph
+        """
+        if graph is None:
+            graph = tg.get_versioned_graph(self.schema, self.version)
+        batch = []
+        for i, row in enumerate(rows, 1):
+            batch.extend(self.row_to_triples(row))
+            if i % batch_size == 0:
+                graph.addN((s, p, o, graph) for s, p, o in batch)
+                batch = []
+        graph.addN((s, p, o, graph) for s, p, o in batch)
+        return graph
+
+    def import_zinc(self, lines: Iterable[str], graph: Graph = None) -> Graph:
+        """
+        :param lines: the lines of a Zinc grid, i.e. an open file
+        :param graph: see import_rows
+        :return: the graph
+        """
+        return self.import_rows(iter_zinc_rows(lines), graph)
+
+    def import_hayson(self, fp: TextIO, graph: Graph = None) -> Graph:
+        """
+        :param fp: an open Hayson (Haystack JSON) file
+        :param graph: see import_rows
+        :return: the graph
+        """
+        return self.import_rows(iter_hayson_file_rows(fp), graph)
+
+    def import_file(self, filename: str, graph: Graph = None) -> Graph:
+        """
+        Import a '.zinc' or '.json' grid file.
+
+        :param filename: the filepath/filename of the grid
+        :param graph: see import_rows
+        :return: the graph
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        with open(filename, 'r', encoding='utf-8') as f:
+            if ext == '.zinc':
+                return self.import_zinc(f, graph)
+            elif ext in ('.json', '.hayson'):
+                return self.import_hayson(f, graph)
+        raise te.TastyError(f"Unable to import {filename}, grids must be '.zinc' or '.json' files")
+
+
+# -- Zinc
+
+_uri = re.compile(r'^(https?|urn):')
+_zinc_escapes = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '$': '$', '`': '`'}
+_zinc_number = re.compile(r'^-?\d[\d_]*(\.\d+)?([eE][+-]?\d+)?')
+_zinc_ref_chars = re.compile(r'[A-Za-z0-9_:\-.~]*')
+_zinc_id = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+def iter_zinc_rows(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse a Zinc grid line by line, yielding each row as a dict of {column name: value}, omitting nulls.
+    Markers are returned as MARKER, refs as Ref, numbers as floats (without units), booleans as bools and
+    all other scalars (strings, dates, times, uris, ...) as strings. Nested grids are not supported.
+
+    :param lines: the lines of the Zinc grid, i.e. an open file
+    :return: [Iterator[dict]]
+    """
+    lines = iter(lines)
+    header = next(lines, '').strip()
+    if not header.startswith('ver:'):
+        raise te.TastyError(f"Zinc grid must start with a version line, got: {header[:50]}")
+    cols = [name for name, meta in _parse_zinc_cols(next(lines, '').rstrip('\r\n'))]
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        values = _parse_zinc_values(line)
+        yield {name: val for name, val in zip(cols, values) if val is not None}
+
+
+def _parse_zinc_cols(line: str) -> List[Tuple[str, dict]]:
+    cols = []
+    i = 0
+    while i < len(line):
+        i = _skip_spaces(line, i)
+        match = _zinc_id.match(line, i)
+        if not match:
+            raise te.TastyError(f"Invalid Zinc column at {i}: {line}")
+        name = match.group()
+        meta, i = _parse_zinc_tags(line, match.end(), ',')
+        cols.append((name, meta))
+        i = _skip_spaces(line, i)
+        if i < len(line) and line[i] == ',':
+            i += 1
+    return cols
+
+
+def _parse_zinc_values(line: str) -> list:
+    values = []
+    i = 0
+    while True:
+        val, i = _parse_zinc_value(line, i)
+        values.append(val)
+        i = _skip_spaces(line, i)
+        if i >= len(line):
+            return values
+        if line[i] != ',':
+            raise te.TastyError(f"Expected ',' at {i}: {line}")
+        i += 1
+
+
+def _skip_spaces(line: str, i: int) -> int:
+    while i < len(line) and line[i] in ' \t':
+        i += 1
+    return i
+
+
+def _parse_zinc_string(line: str, i: int, quote: str = '"') -> Tuple[str, int]:
+    chars = []
+    i += 1
+    while i < len(line):
+        c = line[i]
+        if c == quote:
+            return ''.join(chars), i + 1
+        if c == '\\':
+            nxt = line[i + 1]
+            if nxt == 'u':
+                chars.append(chr(int(line[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            chars.append(_zinc_escapes.get(nxt, nxt))
+            i += 2
+            continue
+        chars.append(c)
+        i += 1
+    raise te.TastyError(f"Unterminated string: {line}")
+
+
+def _parse_zinc_tags(line: str, i: int, end_chars: str) -> Tuple[dict, int]:
+    """Parse space separated 'name' / 'name:val' tags until one of end_chars (or the end of the line)"""
+    tags = {}
+    while True:
+        i = _skip_spaces(line, i)
+        if i >= len(line) or line[i] in end_chars:
+            return tags, i
+        match = _zinc_id.match(line, i)
+        if not match:
+            raise te.TastyError(f"Invalid Zinc tag at {i}: {line}")
+        i = match.end()
+        if i < len(line) and line[i] == ':':
+            tags[match.group()], i = _parse_zinc_value(line, i + 1)
+        else:
+            tags[match.group()] = MARKER
+
+
+def _parse_zinc_value(line: str, i: int):
+    i = _skip_spaces(line, i)
+    if i >= len(line) or line[i] in ',]}':
+        return None, i
+    c = line[i]
+    if c == '"':
+        return _parse_zinc_string(line, i)
+    if c == '`':
+        return _parse_zinc_string(line, i, '`')
+    if c == '@':
+        match = _zinc_ref_chars.match(line, i + 1)
+        j = match.end()
+        k = _skip_spaces(line, j)
+        if k < len(line) and line[k] == '"':
+            dis, k = _parse_zinc_string(line, k)
+            return Ref(match.group(), dis), k
+        return Ref(match.group()), j
+    if c == '[':
+        values = []
+        i += 1
+        while True:
+            i = _skip_spaces(line, i)
+            if line[i] == ']':
+                return values, i + 1
+            val, i = _parse_zinc_value(line, i)
+            values.append(val)
+            i = _skip_spaces(line, i)
+            if line[i] == ',':
+                i += 1
+    if c == '{':
+        tags, i = _parse_zinc_tags(line, i + 1, '}')
+        return tags, i + 1
+    if line.startswith('<<', i):
+        raise te.TastyError("Nested grids are not supported")
+
+    # scalar token: read until the next separator, keeping parenthesized parts (coords, xstrs) intact
+    j = i
+    depth = 0
+    while j < len(line):
+        ch = line[j]
+        if ch == '"':
+            j = _parse_zinc_string(line, j)[1]
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif depth == 0 and ch in ',]}':
+            break
+        j += 1
+    token = line[i:j].strip()
+    return _parse_zinc_scalar(token), j
+
+
+def _parse_zinc_scalar(token: str):
+    if token == 'M':
+        return MARKER
+    if token in ('N', 'R'):
+        return None
+    if token == 'T':
+        return True
+    if token == 'F':
+        return False
+    if token in ('INF', '-INF', 'NaN'):
+        return float(token.replace('INF', 'inf').replace('NaN', 'nan'))
+    match = _zinc_number.match(token)
+    # dates (2021-01-01) and times (10:00:00) also start with digits
+    if match and (match.end() == len(token) or token[match.end()] not in '-:'):
+        return float(match.group().replace('_', ''))
+    return token
+
+
+# -- Hayson
+
+def iter_hayson_file_rows(fp: TextIO, chunk_size: int = 65536) -> Iterator[dict]:
+    """
+    Parse the rows of a Hayson (Haystack JSON) grid from a file object incrementally, yielding each row as a dict
+    of {column name: value} as soon as it has been read (see iter_zinc_rows for the value types). Only the current
+    row (and the grid meta / cols) are held in memory. Supports both the Haystack 3 ("m:", "r:id dis", "n:1 unit")
+    and Haystack 4 ({"_kind": "marker"}) encodings, as well as the ":m" markers written by tg.write_hayson.
+
+    :param fp: an open Hayson file
+    :param chunk_size: number of characters to read at a time
+    :return: [Iterator[dict]]
+    """
+    reader = _JsonStreamReader(fp, chunk_size)
+    reader.expect('{')
+    while True:
+        if reader.peek() == '}':
+            return
+        key = reader.decode()
+        reader.expect(':')
+        if key == 'rows':
+            reader.expect('[')
+            while reader.peek() != ']':
+                values = {}
+                for name, val in reader.decode().items():
+                    value = _decode_hayson_value(val)
+                    if value is not None:
+                        values[name] = value
+                yield values
+                if reader.peek() == ',':
+                    reader.expect(',')
+            reader.expect(']')
+        else:
+            reader.decode()
+        if reader.peek() == ',':
+            reader.expect(',')
+
+
+def _decode_hayson_value(val):
+    if isinstance(val, dict):
+        kind = val.get('_kind')
+        if kind == 'marker':
+            return MARKER
+        if kind == 'ref':
+            return Ref(val.get('val'), val.get('dis'))
+        if kind == 'number':
+            return float(val.get('val'))
+        if kind in ('remove', 'na'):
+            return None
+        return val.get('val', val) if kind else val
+    if isinstance(val, str):
+        if val in ('m:', ':m'):
+            return MARKER
+        if val.startswith('r:'):
+            ref, _, dis = val[2:].partition(' ')
+            return Ref(ref, dis or None)
+        if val.startswith('n:'):
+            number = val[2:].split(' ')[0]
+            try:
+                return float(number)
+            except ValueError:
+                return number
+        if val in ('-:', 'z:'):
+            return None
+        if len(val) > 1 and val[1] == ':' and val[0] in 'sudthcbx':
+            return val[2:]
+    return val
+
+
+class _JsonStreamReader:
+    """Reads consecutive JSON values and punctuation from a file object, refilling a small buffer as needed"""
+
+    def __init__(self, fp: TextIO, chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise te.TastyError("Unexpected end of Hayson file")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise te.TastyError(f"Expected '{char}' in Hayson file, got '{self.buffer[self.pos]}'")
+        self.pos += 1
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may be incomplete
+                if end < len(self.buffer) or self.eof or not isinstance(val, (int, float)):
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                self.eof = True
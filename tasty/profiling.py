@@ -0,0 +1,275 @@
+"""
+Lightweight instrumentation of the stages of tasty (loading ontologies, resolving shapes, building graphs,
+inference, SHACL evaluation, serialization). Stages are wrapped in spans:
+
+    with span('load_ontology', schema=schema) as s:
+        g = ...
+        s.set(triples=len(g))
+
+Spans are only recorded while a Profiler is active (see Profiler.start or the --profile flag of the CLI), otherwise
+span() does nearly nothing. A recorded span tree can be printed, or exported as JSON or in the Chrome trace event
+format (chrome://tracing, Perfetto).
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is not reported
+    resource = None
+
+# the active Profiler, if any
+_profiler: Optional['Profiler'] = None
+
+
+def get_peak_rss() -> Optional[int]:
+    """
+    :return: the peak resident set size of the process so far in bytes, or None if it cannot be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span:
+    """A timed stage, with its nested stages as children"""
+
+    def __init__(self, name: str, attributes: Dict = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.children: List['Span'] = []
+        self.start = None
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_rss = None
+        self._cpu_start = None
+
+    def set(self, **attributes) -> None:
+        """
+        Set attributes of the span, i.e. span.set(triples=len(g)). 'triples' is shown in the span tree.
+        """
+        self.attributes.update(attributes)
+
+    def open(self) -> None:
+        self.start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def close(self) -> None:
+        self.wall_time = time.perf_counter() - self.start
+        self.cpu_time = time.process_time() - self._cpu_start
+        self.peak_rss = get_peak_rss()
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'peak_rss': self.peak_rss,
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+class _NullSpan:
+    """The span yielded while not profiling"""
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class Profiler:
+    """Record the spans opened while it is active, as a tree per thread"""
+
+    def __init__(self):
+        self.roots: List[Span] = []
+        self.origin = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self) -> 'Profiler':
+        global _profiler
+        self.origin = time.perf_counter()
+        _profiler = self
+        return self
+
+    def stop(self) -> None:
+        global _profiler
+        if _profiler is self:
+            _profiler = None
+
+    def __enter__(self) -> 'Profiler':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        s = Span(name, attributes)
+        s.attributes.setdefault('thread', threading.current_thread().name)
+        stack = self._stack()
+        if stack:
+            stack[-1].children.append(s)
+        else:
+            with self._lock:
+                self.roots.append(s)
+        stack.append(s)
+        s.open()
+        try:
+            yield s
+        finally:
+            s.close()
+            stack.pop()
+
+    def format_tree(self) -> str:
+        """
+        :return: the span tree, with the wall time, CPU time, peak RSS and triple count of each span
+        """
+        lines = [f"{'span':<60} {'wall (s)':>10} {'cpu (s)':>10} {'peak rss (MiB)':>15} {'triples':>10}"]
+
+        def add(s: Span, depth: int):
+            rss = '' if s.peak_rss is None else f"{s.peak_rss / 2 ** 20:.1f}"
+            triples = s.attributes.get('triples', '')
+            lines.append(f"{'  ' * depth + s.name:<60} {s.wall_time:>10.3f} {s.cpu_time:>10.3f} {rss:>15} "
+                         f"{triples:>10}")
+            for child in s.children:
+                add(child, depth + 1)
+
+        for root in self.roots:
+            add(root, 0)
+        return '\n'.join(lines)
+
+    def to_json(self) -> List[Dict]:
+        return [root.to_dict() for root in self.roots]
+
+    def to_chrome_trace(self) -> Dict:
+        """
+        :return: the spans as complete ('X') events of the Chrome trace event format, timestamps in microseconds
+        """
+        events = []
+        thread_ids = {}
+
+        def add(s: Span):
+            thread = s.attributes.get('thread')
+            tid = thread_ids.setdefault(thread, len(thread_ids))
+            args = {k: v for k, v in s.attributes.items() if k != 'thread'}
+            args['cpu_time'] = s.cpu_time
+            if s.peak_rss is not None:
+                args['peak_rss'] = s.peak_rss
+            events.append({
+                'name': s.name,
+                'ph': 'X',
+                'ts': (s.start - self.origin) * 1e6,
+                'dur': s.wall_time * 1e6,
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': args,
+            })
+            for child in s.children:
+                add(child)
+
+        for root in self.roots:
+            add(root)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, filename: str, format: str = 'json') -> None:
+        """
+        :param filename: the file to write
+        :param format: 'json' for the span tree, 'chrome' for the Chrome trace event format
+        """
+        data = self.to_chrome_trace() if format == 'chrome' else self.to_json()
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+
+
+class Progress:
+    """
+    Report the progress of a loop as counts and rates, instead of a line per item. A message is logged at most
+    every interval seconds, and once when done:
+        progress = Progress(logger, 'Validated focus nodes', total=len(nodes))
+        for node in nodes:
+            ...
+            progress.update()
+        progress.done()
+    """
+
+    def __init__(self, logger: logging.Logger, description: str, total: int = None, interval: float = 5.0,
+                 level: int = logging.INFO):
+        """
+        :param logger: the logger to report to
+        :param description: what is counted, i.e. 'Processed shapes'
+        :param total: the number of items expected, if known
+        :param interval: the minimum number of seconds between two reports
+        :param level: the level to report at
+        """
+        self.logger = logger
+        self.description = description
+        self.total = total
+        self.interval = interval
+        self.level = level
+        self.count = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+        self._enabled = logger.isEnabledFor(level)
+
+    def update(self, n: int = 1) -> None:
+        self.count += n
+        if self._enabled:
+            now = time.perf_counter()
+            if now - self._last_report >= self.interval:
+                self._last_report = now
+                self._report(now)
+
+    def done(self) -> None:
+        if self._enabled:
+            self._report(time.perf_counter())
+
+    def _report(self, now: float) -> None:
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        if self.total is None:
+            self.logger.log(self.level, '%s: %d in %.1fs (%.0f/s)', self.description, self.count, elapsed, rate)
+        else:
+            self.logger.log(self.level, '%s: %d/%d in %.1fs (%.0f/s)', self.description, self.count, self.total,
+                            elapsed, rate)
+
+
+def span(name: str, **attributes):
+    """
+    Open a span in the active Profiler, or a no-op span if not profiling.
+
+    :param name: the name of the stage
+    :param attributes: attributes of the span, i.e. the schema or file being processed
+    :return: a context manager yielding the span
+    """
+    if _profiler is None:
+        return _null_context
+    return _profiler.span(name, **attributes)
+
+
+class _NullContext:
+    def __enter__(self) -> _NullSpan:
+        return _null_span
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_null_context = _NullContext()
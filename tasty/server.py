@@ -0,0 +1,293 @@
+"""
+A long-running validation service, keeping the shapes, the ontology closure and the validation engines warm in
+memory, so that validating a single equipment does not pay for loading them. Requests are JSON:
+
+    POST /validate
+    {
+        "data": "<the data graph>",
+        "format": "turtle",
+        "targets": [{"entity": "urn:sample/VAV-01", "shape": "nrel:NREL-VAV-SD-HW-Reheat-Shape"}],
+        "engine": "native"
+    }
+
+and the response is the structured report (see ValidationReport.to_dict) with 'conforms' and the time taken.
+GET /health returns the state of the service. Connections are accepted on their own threads, while validations run
+on a fixed pool of workers behind a bounded queue: requests beyond it are rejected with a 503. Request bodies larger
+than MAX_BODY_SIZE are rejected with a 413.
+"""
+import json
+import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Tuple
+
+from rdflib import Graph, SH, URIRef
+
+import tasty.constants as tc
+import tasty.exceptions as te
+import tasty.graphs as tg
+from tasty.shapes_loader import ShapesLoader
+from tasty.validate import get_shape_namespaces
+from tasty.validation_engines import ENGINES, NativeEngine, ValidationEngine, get_engine
+from tasty.validation_report import ValidationReport
+
+logger = logging.getLogger(__name__)
+
+# the maximum size of a request body in bytes
+MAX_BODY_SIZE = 16 * 2 ** 20
+
+
+class ValidationService:
+    """
+    Validate data graphs against the generated shapes, with everything that does not depend on the data graph
+    loaded once: the shapes graph (shared by all requests, see ShapesLoader.load_shapes_with_targets), the closure
+    of the ontology and one engine per name. Validations do not modify any of these, so the service can be used
+    from several threads.
+    """
+
+    def __init__(self, schema: str = tc.HAYSTACK, version: str = tc.V3_9_10, engine: str = NativeEngine.name):
+        """
+        :param schema: the schema of the shapes and data graphs
+        :param version: the version of the schema
+        :param engine: the name of the engine used for requests that do not name one
+        """
+        self.schema = schema
+        self.version = version
+        self.default_engine = engine
+        self.loader = ShapesLoader(schema)
+        shapes_graph = self.loader.load_frozen_shapes()
+        self.namespaces = get_shape_namespaces(shapes_graph)
+        self.closure = tg.load_closure(schema, version)
+        self.engines: Dict[str, ValidationEngine] = {name: get_engine(name) for name in ENGINES}
+        logger.info("Loaded %d shapes triples and the closure of %s %s", len(shapes_graph), schema, version)
+
+    def resolve_shape(self, shape: str) -> URIRef:
+        """
+        :param shape: a prefixed shape name, i.e. 'nrel:NREL-VAV-SD-HW-Reheat-Shape', or the URI of a shape
+        :return: the URI of the shape
+        """
+        if '://' in shape or shape.startswith('urn:'):
+            return URIRef(shape)
+        prefix, _, name = shape.partition(':')
+        if prefix not in self.namespaces or not name:
+            raise te.TastyError(f"Unable to resolve shape: {shape}")
+        return self.namespaces[prefix][name]
+
+    def validate(self, request: dict) -> dict:
+        """
+        :param request: the 'data' graph, its 'format' (turtle by default), the 'targets' as a list of
+            {'entity': ..., 'shape': ...}, and optionally the name of the 'engine'
+        :return: the report, see ValidationReport.to_dict, with 'conforms' and the 'time' taken in seconds
+        """
+        start = time.perf_counter()
+        engine_name = request.get('engine') or self.default_engine
+        if engine_name not in self.engines:
+            raise te.TastyError(f"Validation engine must be one of {list(self.engines)}, not {engine_name}")
+        if not isinstance(request.get('data'), str):
+            raise te.TastyError("The request must include the data graph as a string")
+
+        data_graph = Graph().parse(data=request['data'], format=request.get('format', 'turtle'))
+        targets = Graph()
+        for target in request.get('targets', []):
+            targets.add((self.resolve_shape(target['shape']), SH.targetNode, URIRef(target['entity'])))
+        shapes_graph = self.loader.load_shapes_with_targets(targets)
+        self.closure.expand(data_graph)
+
+        conforms, results_graph, _ = self.engines[engine_name].validate(data_graph, shapes_graph)
+        response = {'conforms': bool(conforms)}
+        response.update(ValidationReport.from_results_graph(results_graph).to_dict())
+        response['time'] = time.perf_counter() - start
+        return response
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'tasty'
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/health':
+            self.send_json(HTTPStatus.OK, self.server.health())
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/validate':
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': 'Invalid Content-Length'})
+            return
+        if length < 0 or length > self.server.max_body_size:
+            # the body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           {'error': f"The request body must be at most {self.server.max_body_size} bytes"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': f"Invalid JSON: {e}"})
+            return
+        status, response = self.server.handle_validation(request)
+        self.send_json(status, response)
+
+    def send_json(self, status: HTTPStatus, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class ValidationServerMixin:
+    """
+    Run the validations of a server on a pool of workers, with at most max_queue requests waiting for a worker
+    """
+
+    def setup_workers(self, service: ValidationService, workers: int = 4, max_queue: int = 64,
+                      max_body_size: int = MAX_BODY_SIZE) -> None:
+        """
+        :param service: the service to validate requests with
+        :param workers: the number of validations run concurrently
+        :param max_queue: the number of requests waiting for a worker, before new requests are rejected
+        :param max_body_size: the maximum size of a request body in bytes
+        """
+        self.service = service
+        self.max_body_size = max_body_size
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tasty-worker')
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.pending = 0
+        self.handled = 0
+        self._lock = threading.Lock()
+
+    def handle_validation(self, request: dict) -> Tuple[HTTPStatus, dict]:
+        if not self.slots.acquire(blocking=False):
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'The validation queue is full, retry later'}
+        with self._lock:
+            self.pending += 1
+        try:
+            return HTTPStatus.OK, self.executor.submit(self.service.validate, request).result()
+        except (te.TastyError, KeyError, TypeError, SyntaxError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            logger.exception("Validation failed")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.handled += 1
+            self.slots.release()
+
+    def health(self) -> dict:
+        return {
+            'status': 'ok',
+            'schema': self.service.schema,
+            'version': self.service.version,
+            'workers': self.workers,
+            'pending': self.pending,
+            'handled': self.handled,
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class ValidationHTTPServer(ValidationServerMixin, socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: ValidationService, workers: int = 4,
+                 max_queue: int = 64, max_body_size: int = MAX_BODY_SIZE):
+        """
+        :param address: the (host, port) to listen on, port 0 to pick a free port
+        :param service: see ValidationServerMixin.setup_workers
+        :param workers: see ValidationServerMixin.setup_workers
+        :param max_queue: see ValidationServerMixin.setup_workers
+        :param max_body_size: see ValidationServerMixin.setup_workers
+        """
+        self.setup_workers(service, workers, max_queue, max_body_size)
+        super().__init__(address, ValidationRequestHandler)
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class ValidationUnixServer(ValidationServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path: str, service: ValidationService, workers: int = 4, max_queue: int = 64,
+                     max_body_size: int = MAX_BODY_SIZE):
+            """
+            :param path: the path of the Unix socket to listen on
+            :param service: see ValidationServerMixin.setup_workers
+            :param workers: see ValidationServerMixin.setup_workers
+            :param max_queue: see ValidationServerMixin.setup_workers
+            :param max_body_size: see ValidationServerMixin.setup_workers
+            """
+            self.setup_workers(service, workers, max_queue, max_body_size)
+            super().__init__(path, ValidationRequestHandler)
+
+        def get_request(self):
+            request, _ = super().get_request()
+            # BaseHTTPRequestHandler expects a (host, port) client address
+            return request, ('unix', 0)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove the socket left at a path by a previous server, so it can be listened on again. Any other file is kept.
+
+    :param socket_path: the path of the Unix socket
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise te.TastyError(f"{socket_path} exists and is not a socket, choose another path")
+    os.remove(socket_path)
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, socket_path: str = None, workers: int = 4, max_queue: int = 64,
+          schema: str = tc.HAYSTACK, version: str = tc.V3_9_10, engine: str = NativeEngine.name,
+          max_body_size: int = MAX_BODY_SIZE) -> None:
+    """
+    Load the service and serve requests until interrupted.
+
+    :param host: the host to listen on
+    :param port: the port to listen on
+    :param socket_path: the path of a Unix socket to listen on instead of host and port
+    :param workers: see ValidationServerMixin.setup_workers
+    :param max_queue: see ValidationServerMixin.setup_workers
+    :param max_body_size: see ValidationServerMixin.setup_workers
+    :param schema: see ValidationService
+    :param version: see ValidationService
+    :param engine: see ValidationService
+    """
+    if socket_path:
+        if not hasattr(socketserver, 'UnixStreamServer'):
+            raise te.TastyError("Unix sockets are not supported on this platform")
+        remove_stale_socket(socket_path)
+    service = ValidationService(schema, version, engine)
+    if socket_path:
+        server = ValidationUnixServer(socket_path, service, workers, max_queue, max_body_size)
+        logger.info("Serving validations on %s", socket_path)
+    else:
+        server = ValidationHTTPServer((host, port), service, workers, max_queue, max_body_size)
+        logger.info("Serving validations on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
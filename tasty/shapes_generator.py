@@ -9,12 +9,22 @@ from rdflib import BNode, Namespace, Literal, Graph, URIRef, SH, RDF
 import tasty.graphs as tg
 import tasty.constants as tc
 import tasty.exceptions as te
+from tasty.profiling import Progress, span
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class ShapesGenerator:
-    def __init__(self, schema, version):
+    def __init__(self, schema, version, intern_constraints: bool = False, compile_tag_sets: bool = False):
+        """
+        :param schema: the schema of the source shapes, i.e. tc.HAYSTACK
+        :param version: the version of the schema
+        :param intern_constraints: whether to generate a single named constraint shape per tag and per type in
+            each shapes file, referenced by all shapes requiring the tag or type, instead of new blank nodes for
+            every requirement. See get_tag_property_shape and get_type_node_shape
+        :param compile_tag_sets: whether to require the tags of a shape with a single SPARQL constraint, instead of
+            a qualified value shape per tag. See add_tag_set_constraint
+        """
         self.root_dir = os.path.dirname(__file__)
         self.source_shapes_dir = os.path.join(self.root_dir, 'source_shapes')
         self.generated_shapes_dir = os.path.join(self.root_dir, 'generated_shapes')
@@ -23,18 +33,17 @@ class ShapesGenerator:
         self.current_shape_ns: Namespace = None
         self.shapes_lookup: dict = {}
         self.prefix_namespace_pairs = []
+        self.intern_constraints = intern_constraints
+        self.compile_tag_sets = compile_tag_sets
 
         # create dirs if not exist
         if not os.path.isdir(self.generated_shapes_dir):
             os.mkdir(self.generated_shapes_dir)
 
-        # initialize blank graph and ontology
-        if schema == tc.HAYSTACK:
-            tc.set_default_versions(haystack_version=version)
-        elif schema == tc.BRICK:
-            tc.set_default_versions(brick_version=version)
-        else:
+        # the namespaces of the version, rather than the defaults, so generators of other versions can run alongside
+        if schema not in (tc.HAYSTACK, tc.BRICK):
             raise te.TastyError(f"Schema must be one of: {tc.SUPPORTED_SCHEMAS.keys()}")
+        self.namespaces: tc.NamespaceContext = tc.get_namespace_context(schema, version)
 
         # Set the schema and version
         self.schema = schema
@@ -77,7 +86,7 @@ class ShapesGenerator:
                         'prefix': prefix
                     }
                 else:
-                    logging.warning(f"{shape['name']} exists in multiple namespaces")
+                    logger.warning("%s exists in multiple namespaces", shape['name'])
 
     def reset_shapes_graph(self):
         self.shapes_graph: Graph = tg.get_versioned_graph(self.schema, self.version)
@@ -91,6 +100,82 @@ class ShapesGenerator:
         self.shapes_graph.serialize(destination=os.path.join(self.generated_shapes_dir, file_name), format='turtle')
         return True
 
+    def get_interned_constraint(self, term: URIRef, kind: str) -> (URIRef, bool):
+        """
+        Get the name of the interned constraint shape of a kind for a term, in the current shapes namespace.
+        I.e. for phIoT:air and 'tag': phShapes:phIoT-air-tag
+
+        :param term: the tag or type
+        :param kind: 'tag' or 'type'
+        :return: the name of the constraint shape, and whether it is already in the shapes graph
+        """
+        prefix, _, name = self.shapes_graph.namespace_manager.compute_qname(term)
+        constraint = self.current_shape_ns[f"{prefix}-{name}-{kind}"]
+        return constraint, (constraint, RDF.type, None) in self.shapes_graph
+
+    def get_tag_property_shape(self, namespaced_tag: URIRef) -> URIRef:
+        """
+        Get (creating it if needed) the named property shape requiring a tag. Output looks like:
+            phShapes:phIoT-air-tag a sh:PropertyShape ;
+                sh:path ph:hasTag ;
+                sh:qualifiedValueShape [ sh:hasValue phIoT:air ] ;
+                sh:qualifiedMinCount 1 .
+        :param namespaced_tag: the tag, i.e. phIoT:air
+        :return: the property shape
+        """
+        prop, exists = self.get_interned_constraint(namespaced_tag, 'tag')
+        if not exists:
+            qvs_bn = BNode()
+            self.shapes_graph.add((prop, RDF.type, SH.PropertyShape))
+            self.shapes_graph.add((prop, SH.path, self.namespaces.ph.hasTag))
+            self.shapes_graph.add((prop, SH.qualifiedValueShape, qvs_bn))
+            self.shapes_graph.add((prop, SH.qualifiedMinCount, Literal(1)))
+            self.shapes_graph.add((qvs_bn, SH.hasValue, namespaced_tag))
+        return prop
+
+    def get_type_node_shape(self, namespaced_type: URIRef) -> URIRef:
+        """
+        Get (creating it if needed) the named node shape requiring a type. Output looks like:
+            phShapes:phIoT-ahu-type a sh:NodeShape ;
+                sh:class phIoT:ahu .
+        :param namespaced_type: the type, i.e. phIoT:ahu
+        :return: the node shape
+        """
+        node_shape, exists = self.get_interned_constraint(namespaced_type, 'type')
+        if not exists:
+            self.shapes_graph.add((node_shape, RDF.type, SH.NodeShape))
+            self.shapes_graph.add((node_shape, SH['class'], namespaced_type))
+        return node_shape
+
+    def add_tag_set_constraint(self, namespaced_shape: URIRef, namespaced_tags: list):
+        """
+        Require all of the tags with a single SPARQL constraint, which reports one result per missing tag, as the
+        qualified value shape of each tag would. The tags are also listed with tasty:tagSet, so the constraint can be
+        evaluated without SPARQL (see tasty.validation_engines.NativeEngine). Output looks like:
+            sh:sparql [ a sh:SPARQLConstraint ;
+                sh:message "Missing tag {?value}" ;
+                sh:select "SELECT $this ?value ?path WHERE { { BIND (phIoT:air AS ?value) } UNION ... }" ;
+                tasty:tagPath ph:hasTag ;
+                tasty:tagSet phIoT:air, phIoT:temp, ... ] ;
+        :param namespaced_shape:
+        :param namespaced_tags: the tags the shape requires
+        :return:
+        """
+        has_tag = self.namespaces.ph.hasTag
+        # SPARQL constraints must not use VALUES, so the tags are enumerated with a union
+        values = ' UNION '.join(f"{{ BIND ({tag.n3()} AS ?value) }}" for tag in namespaced_tags)
+        select = (f"SELECT $this ?value ?path WHERE {{ {values} BIND ({has_tag.n3()} AS ?path) "
+                  f"FILTER NOT EXISTS {{ $this {has_tag.n3()} ?value }} }}")
+        sparql_bn = BNode()
+        self.shapes_graph.bind('tasty', tc.TASTY)
+        self.shapes_graph.add((namespaced_shape, SH.sparql, sparql_bn))
+        self.shapes_graph.add((sparql_bn, RDF.type, SH.SPARQLConstraint))
+        self.shapes_graph.add((sparql_bn, SH.message, Literal("Missing tag {?value}")))
+        self.shapes_graph.add((sparql_bn, SH.select, Literal(select)))
+        self.shapes_graph.add((sparql_bn, tc.TASTY.tagPath, has_tag))
+        for tag in namespaced_tags:
+            self.shapes_graph.add((sparql_bn, tc.TASTY.tagSet, tag))
+
     def add_all_tags(self, shape_map: Dict, namespaced_shape: URIRef, context: str) -> int:
         """
         Considers both 'tags' and 'tags-custom' keys.
@@ -100,12 +185,19 @@ class ShapesGenerator:
         :return:
         """
         count_tags = 0
+        tag_set = []
 
         def add_tag_as_bnode(namespaced_tag):
+            if self.compile_tag_sets:
+                tag_set.append(namespaced_tag)
+                return
+            if self.intern_constraints:
+                self.shapes_graph.add((namespaced_shape, SH.property, self.get_tag_property_shape(namespaced_tag)))
+                return
             prop_bn = BNode()
             qvs_bn = BNode()
             self.shapes_graph.add((namespaced_shape, SH.property, prop_bn))
-            self.shapes_graph.add((prop_bn, SH.path, tc.PH_DEFAULT.hasTag))
+            self.shapes_graph.add((prop_bn, SH.path, self.namespaces.ph.hasTag))
             self.shapes_graph.add((prop_bn, SH.qualifiedValueShape, qvs_bn))
             self.shapes_graph.add((prop_bn, SH.qualifiedMinCount, Literal(1)))
             self.shapes_graph.add((qvs_bn, SH.hasValue, namespaced_tag))
@@ -143,11 +235,14 @@ class ShapesGenerator:
                 count_tags += 1
                 add_tag_as_bnode(tag_ns)
 
+        if tag_set:
+            self.add_tag_set_constraint(namespaced_shape, tag_set)
+
         # Here we just add a minCount equal to the total number of tags
         # as a secondary step. Helpful for debugging
         bn = BNode()
         self.shapes_graph.add((namespaced_shape, SH.property, bn))
-        self.shapes_graph.add((bn, SH.path, tc.PH_DEFAULT.hasTag))
+        self.shapes_graph.add((bn, SH.path, self.namespaces.ph.hasTag))
         self.shapes_graph.add((bn, SH.minCount, Literal(count_tags)))
         self.shapes_graph.add((bn, SH.maxCount, Literal(count_tags)))
 
@@ -183,8 +278,8 @@ class ShapesGenerator:
         if shape_info:
             ns = Namespace(shape_info['namespace'])
             if ns != self.current_shape_ns:
-                logging.warning(
-                    f"shape: {shape_name} declared in {ns}, while the current module namespace is {self.current_shape_ns}. Ensure shapes graphs are merged when performing validation")
+                logger.debug("shape: %s declared in %s, while the current module namespace is %s. Ensure shapes graphs "
+                             "are merged when performing validation", shape_name, ns, self.current_shape_ns)
             if (shape_info['prefix'], ns) not in list(self.shapes_graph.namespaces()):
                 self.shapes_graph.bind(shape_info['prefix'], ns)
             return ns[shape_name]
@@ -218,10 +313,13 @@ class ShapesGenerator:
                 prop_bn = self.stub_new_qualified_value_property(each_path, parent_namespaced_shape,
                                                                  namespaced_path_from_parent_to_children)
                 namespaced_type = tg.get_namespaced_term(self.ontology, each_type)
-                nodeshape_bn = BNode()
-                self.shapes_graph.add((prop_bn, SH.qualifiedValueShape, nodeshape_bn))
-                self.shapes_graph.add((nodeshape_bn, RDF.type, SH.NodeShape))
-                self.shapes_graph.add((nodeshape_bn, SH['class'], namespaced_type))
+                if self.intern_constraints:
+                    self.shapes_graph.add((prop_bn, SH.qualifiedValueShape, self.get_type_node_shape(namespaced_type)))
+                else:
+                    nodeshape_bn = BNode()
+                    self.shapes_graph.add((prop_bn, SH.qualifiedValueShape, nodeshape_bn))
+                    self.shapes_graph.add((nodeshape_bn, RDF.type, SH.NodeShape))
+                    self.shapes_graph.add((nodeshape_bn, SH['class'], namespaced_type))
                 if not required:
                     # For optionals, we set the severity to warning
                     self.shapes_graph.add((prop_bn, SH.severity, SH.Warning))
@@ -238,7 +336,7 @@ class ShapesGenerator:
             for each_mixin in shape['shape-mixins']:
                 ns_mixin = self.get_namespaced_shape(each_mixin)
                 if ns_mixin not in self.shapes_graph.subjects():
-                    logging.info(f"Mixin {ns_mixin} not in graph")
+                    logger.debug("Mixin %s not in graph", ns_mixin)
                 else:
                     self.shapes_graph.add((namespaced_shape, SH.node, ns_mixin))
 
@@ -357,6 +455,7 @@ class ShapesGenerator:
         have_mixins = []
 
         # now iterate through and build shapes
+        progress = Progress(logger, 'Processed shapes', total=len(source_shape_full['shapes']))
         for shape in source_shape_full['shapes']:
 
             # here we are processing top level shapes, which should
@@ -368,7 +467,8 @@ class ShapesGenerator:
             nodeshape_triple = (ns_shape, RDF.type, SH.NodeShape)
             self.shapes_graph.add(nodeshape_triple)
             self.add_tags_types_and_predicates(ns_shape, shape)
-            logging.info(f"Processed shape: {ns_shape}")
+            logger.debug("Processed shape: %s", ns_shape)
+            progress.update()
 
         # now we process things with mixins.
         # we assume mixins might contain other mixins,
@@ -384,13 +484,13 @@ class ShapesGenerator:
                 # here we are processing top level shapes, which should
                 # be declared in the current namespace, so this is correct
                 ns_shape = self.current_shape_ns[shape['name']]
-                logging.info(f"Processing mixin: {ns_shape}")
+                logger.debug("Processing mixin: %s", ns_shape)
                 mixins = shape.get("shape-mixins")
                 skip = False
                 for mixin in mixins:
                     ns_mixin = self.get_namespaced_shape(mixin)
                     if ns_mixin not in self.shapes_graph.subjects():
-                        logging.info(f"{ns_mixin} required for {ns_shape}, but not yet in graph.")
+                        logger.debug("%s required for %s, but not yet in graph.", ns_mixin, ns_shape)
                         skip = True
                         continue
                 if not skip:
@@ -402,25 +502,32 @@ class ShapesGenerator:
                     self.add_tags_types_and_predicates(ns_shape, shape)
                     self.add_all_mixins(ns_shape, shape)
                     have_mixins.pop(i)
+                    progress.update()
             running_length += 1
             if running_length > original_length:
                 te.TastyError(f"Could not resolve the following mixins: {have_mixins} after {running_length} attempts")
-                logging.error()
+                logger.error("Could not resolve the following mixins: %s after %d attempts",
+                             [shape['name'] for shape in have_mixins], running_length)
                 break
+        progress.done()
         return self.shapes_graph
 
     def main_generate_all_and_merge(self):
         shapes_graph_all = tg.get_versioned_graph(self.schema, self.version)
         for file_path, shape_template in self.source_shapes_by_file.items():
             name = os.path.splitext(os.path.basename(file_path))[0]
-            logging.info("#" * 20)
-            logging.info(f"Shapes from file: {name}")
-            self.main(shape_template)
-            self.write_shapes_graph_to_generated_shapes_dir(f"{self.schema.lower()}_{name}.ttl")
+            logger.info("Shapes from file: %s", name)
+            with span('resolve_shapes', file=name) as s:
+                self.main(shape_template)
+                s.set(triples=len(self.shapes_graph))
+            with span('serialize', file=name):
+                self.write_shapes_graph_to_generated_shapes_dir(f"{self.schema.lower()}_{name}.ttl")
             shapes_graph_all += deepcopy(self.shapes_graph)
             self.reset_shapes_graph()
         for each in self.prefix_namespace_pairs:
             shapes_graph_all.bind(each[0], each[1])
         shapes_graph_all.bind('phCustom', tc.PH_CUSTOM)
         all_output = os.path.join(self.generated_shapes_dir, f"{self.schema.lower()}_all.ttl")
-        shapes_graph_all.serialize(all_output, format='turtle')
+        with span('serialize', file=os.path.basename(all_output)) as s:
+            shapes_graph_all.serialize(all_output, format='turtle')
+            s.set(triples=len(shapes_graph_all))
@@ -1,16 +1,49 @@
+import json
 import os
 import logging
+import pickle
+from typing import Dict, Iterable, List, Tuple, Union
 
-from rdflib import Graph
+import rdflib
+from rdflib import Graph, SH
+from rdflib.graph import ReadOnlyGraphAggregate
+from rdflib.paths import Path
+from rdflib.term import URIRef
 from rdflib.util import guess_format
 
 import tasty.constants as tc
+import tasty.exceptions as te
+import tasty.graphs as tg
+from tasty.validation_engines import PyshaclEngine, ValidationEngine
+
+logger = logging.getLogger(__name__)
+
+# {(filename, mtime): Graph} of the shapes files parsed by load_frozen_shapes_file
+_frozen_shapes = {}
+
+# {(filename, mtime): [library]} of the libraries referenced by a library, see ShapesLoader.get_library_dependencies
+_library_dependencies = {}
+
+CACHE_DIR_NAME = '.cache'
+# the header of the pickled graphs, pickles written by another version of tasty or rdflib are ignored
+CACHE_FORMAT = ('tasty-shapes', 1, rdflib.__version__)
+
+# the versions used for each schema in a multi-schema bundle, unless specified
+DEFAULT_VERSIONS = {
+    tc.HAYSTACK: tc.V3_9_10,
+    tc.BRICK: tc.V1_1
+}
 
 
 class ShapesLoader:
     """
     Wrapper class to merge all SHACL shape files into a single RDF Graph.
-    Can optionally merge only files specific to a schema, i.e. Haystack or Brick.
+    Can optionally merge only files specific to a schema, i.e. Haystack or Brick. Without a schema, the shapes of
+    all schemas can be combined with load_bundle, to validate sites using both Haystack and Brick in a single pass.
+
+    The generated shapes of each library (i.e. core, nrel, oap, openstudio) can also be loaded individually with
+    load_library / load_libraries. Each file is only parsed once per process, from a binary cache if possible
+    (see load_frozen_shapes_file), and several libraries are combined into a view without copying their triples.
     """
 
     def __init__(self, schema=None):
@@ -20,14 +53,291 @@ class ShapesLoader:
         self.generated_shapes_dir = os.path.join(self.root_dir, 'generated_shapes')
         if schema:
             assert self.schema in tc.SUPPORTED_SCHEMAS.keys(), f"schema must be one of: {tc.SUPPORTED_SCHEMAS.keys()}"
-            to_find = f"{self.schema.lower()}_all.ttl"
-            assert to_find in os.listdir(
-                self.generated_shapes_dir), f"{to_find} not in {self.generated_shapes_dir}. Make sure to run 'poetry run tasty generate-shapes'"
-            self.shacl_schema_all_file = os.path.join(self.generated_shapes_dir, to_find)
-        else:
-            logging.warning("Only able to load single schema shapes at this time.")
+            self.shacl_schema_all_file = self.get_library_file('all')
+
+    def get_library_file(self, library: str) -> str:
+        """
+        :param library: the name of the library, i.e. 'nrel', or 'all' for the merged shapes of all libraries
+        :return: the path of the generated shapes file for the library
+        """
+        return os.path.join(self.generated_shapes_dir, f"{self.schema.lower()}_{library}.ttl")
+
+    def get_libraries(self) -> List[str]:
+        """
+        :return: the names of the libraries with generated shapes for the schema, i.e. ['core', 'nrel', 'oap', 'openstudio']
+        """
+        prefix = f"{self.schema.lower()}_"
+        return sorted(f[len(prefix):-len('.ttl')] for f in os.listdir(self.generated_shapes_dir)
+                      if f.startswith(prefix) and f.endswith('.ttl') and f != f"{prefix}all.ttl")
+
+    def get_library_namespaces(self) -> Dict[str, str]:
+        """
+        :return: a dict of {namespace: library} of the source shapes for the schema
+        """
+        namespaces = {}
+        source_dir = os.path.join(self.source_shapes_dir, self.schema.lower())
+        for library in self.get_libraries():
+            source_file = os.path.join(source_dir, f"{library}.json")
+            if os.path.isfile(source_file):
+                with open(source_file, 'r') as f:
+                    namespaces[json.load(f)['namespace']] = library
+        return namespaces
 
     def load_all_shapes(self) -> Graph:
+        self._check_file(self.shacl_schema_all_file)
         all_shapes = Graph()
         all_shapes.parse(self.shacl_schema_all_file, format=guess_format(self.shacl_schema_all_file))
         return all_shapes
+
+    def load_frozen_shapes(self) -> Graph:
+        """
+        Load all shapes once per process (and again only if the file changes). The returned graph is shared
+        and must not be modified, add targets with load_shapes_with_targets instead.
+
+        :return: the shared shapes graph
+        """
+        self._check_file(self.shacl_schema_all_file)
+        return load_frozen_shapes_file(self.shacl_schema_all_file)
+
+    def load_shapes_with_targets(self, targets: Graph = None) -> 'ShapesOverlay':
+        """
+        :param targets: a graph of sh:targetNode (or other) triples to add to the shapes for a single validation
+        :return: a read-only union of the shared shapes graph and the targets, see ShapesOverlay
+        """
+        return ShapesOverlay(self.load_frozen_shapes(), targets)
+
+    def load_library(self, library: str) -> Graph:
+        """
+        Load the generated shapes of a single library. As for load_frozen_shapes, the graph is shared and must
+        not be modified. Note that the shapes may reference shapes in other libraries, see load_libraries.
+
+        :param library: the name of the library, i.e. 'nrel'
+        :return: the shared shapes graph of the library
+        """
+        filename = self.get_library_file(library)
+        self._check_file(filename)
+        return load_frozen_shapes_file(filename)
+
+    def get_library_dependencies(self, library: str) -> List[str]:
+        """
+        Determine the other libraries whose shapes are referenced by the shapes of a library, i.e. nrel shapes
+        reference core shapes. This is determined once per file.
+
+        :param library: the name of the library
+        :return: the names of the referenced libraries
+        """
+        filename = self.get_library_file(library)
+        key = (os.path.abspath(filename), os.path.getmtime(filename))
+        if key not in _library_dependencies:
+            namespaces = {ns: lib for ns, lib in self.get_library_namespaces().items() if lib != library}
+            dependencies = set()
+            for o in set(self.load_library(library).objects()):
+                if isinstance(o, URIRef):
+                    for ns, lib in namespaces.items():
+                        if o.startswith(ns):
+                            dependencies.add(lib)
+            _library_dependencies[key] = sorted(dependencies)
+        return _library_dependencies[key]
+
+    def load_libraries(self, libraries: Iterable[str], targets: Graph = None) -> 'ShapesOverlay':
+        """
+        Compose the shapes of several libraries, and of the libraries they depend on, into a single view without
+        copying any triples.
+
+        :param libraries: the names of the libraries, i.e. ['nrel']
+        :param targets: see load_shapes_with_targets
+        :return: a ShapesOverlay of the library graphs and the targets
+        """
+        resolved = []
+        to_resolve = list(libraries)
+        while to_resolve:
+            library = to_resolve.pop(0)
+            if library not in resolved:
+                resolved.append(library)
+                to_resolve.extend(self.get_library_dependencies(library))
+        return ShapesOverlay([self.load_library(library) for library in resolved], targets)
+
+    def load_bundle(self, versions: Dict[str, str] = None, targets: Graph = None) -> 'ShapesBundle':
+        """
+        Combine the generated shapes and the ontologies of several schemas into a single bundle. The shapes of each
+        schema are combined without copying them (see ShapesOverlay), and the ontologies into a single shared graph
+        (see tg.load_combined_ontology). Schemas without generated shapes only contribute their ontology.
+
+        :param versions: a dict of {schema: version}. Defaults to the loader's schema, or to all schemas in
+            DEFAULT_VERSIONS if the loader has no schema
+        :param targets: see load_shapes_with_targets
+        :return: the bundle
+        """
+        if versions is None:
+            versions = {self.schema: DEFAULT_VERSIONS[self.schema]} if self.schema else dict(DEFAULT_VERSIONS)
+        shapes = []
+        for schema in versions:
+            filename = os.path.join(self.generated_shapes_dir, f"{schema.lower()}_all.ttl")
+            if os.path.isfile(filename):
+                shapes.append(load_frozen_shapes_file(filename))
+        if not shapes:
+            raise te.TastyError(f"No generated shapes found for {list(versions)} in {self.generated_shapes_dir}. "
+                                f"Make sure to run 'poetry run tasty generate-shapes'")
+        ont_graph = tg.load_combined_ontology(versions.items())
+        return ShapesBundle(ShapesOverlay(shapes, targets), ont_graph, versions)
+
+    def _check_file(self, filename: str) -> None:
+        if not os.path.isfile(filename):
+            raise te.TastyError(f"{os.path.basename(filename)} not in {self.generated_shapes_dir}. "
+                                f"Make sure to run 'poetry run tasty generate-shapes'")
+
+
+def load_frozen_shapes_file(filename: str) -> Graph:
+    """
+    Parse a shapes file into a graph that is cached and shared by all callers, see ShapesLoader.load_frozen_shapes.
+    The parsed graph is also pickled to a '.cache' directory next to the file, which is much faster to load than
+    the Turtle in later processes. The pickle is ignored if it is older than the file, if it was written by another
+    version of rdflib, or if it cannot be loaded.
+
+    :param filename: the path of the shapes file
+    :return: the shared shapes graph
+    """
+    filename = os.path.abspath(filename)
+    mtime = os.path.getmtime(filename)
+    key = (filename, mtime)
+    if key not in _frozen_shapes:
+        cache_file = os.path.join(os.path.dirname(filename), CACHE_DIR_NAME, os.path.basename(filename) + '.pickle')
+        shapes = _load_cached_graph(cache_file, mtime)
+        if shapes is None:
+            shapes = Graph()
+            shapes.parse(filename, format=guess_format(filename))
+            # bind up front, as validators bind it on every report message otherwise
+            shapes.bind('sh', SH, override=False)
+            _save_cached_graph(cache_file, mtime, shapes)
+        _frozen_shapes[key] = shapes
+    return _frozen_shapes[key]
+
+
+def _load_cached_graph(cache_file: str, mtime: float) -> Union[Graph, None]:
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            # the header is checked before unpickling the graph, which may fail with another rdflib
+            if pickle.load(f) != (CACHE_FORMAT, mtime):
+                logger.debug("Ignoring outdated shapes cache %s", cache_file)
+                return None
+            return pickle.load(f)
+    except Exception as e:
+        # a stale pickle can fail in many ways (i.e. ImportError or TypeError), the file is parsed instead
+        logger.debug("Ignoring shapes cache %s: %s: %s", cache_file, type(e).__name__, e)
+        return None
+
+
+def _save_cached_graph(cache_file: str, mtime: float, graph: Graph) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump((CACHE_FORMAT, mtime), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning("Unable to cache shapes graph at %s: %s", cache_file, e)
+
+
+class ShapesBundle:
+    """
+    The shapes and ontologies of one or more schemas (see ShapesLoader.load_bundle), to validate a data graph
+    against all of them in a single pySHACL run.
+    """
+
+    def __init__(self, shapes_graph: 'ShapesOverlay', ont_graph: Graph, versions: Dict[str, str]):
+        """
+        :param shapes_graph: the combined shapes, to which targets are added
+        :param ont_graph: the combined ontology
+        :param versions: a dict of {schema: version} of the schemas in the bundle
+        """
+        self.shapes_graph = shapes_graph
+        self.ont_graph = ont_graph
+        self.versions = versions
+
+    def validate(self, data_graph: Graph, engine: ValidationEngine = None, **kwargs) -> Tuple:
+        """
+        Validate a data graph against the shapes and ontologies of all schemas in the bundle.
+
+        :param data_graph: the data graph to validate
+        :param engine: the validation engine to use, pySHACL if not provided
+        :param kwargs: additional arguments for pyshacl.validate, only when no engine is provided. Configure the
+            engine instead, i.e. PyshaclEngine(**kwargs)
+        :return: (conforms, results_graph, results_text), as returned by pyshacl.validate
+        """
+        if engine is not None:
+            if kwargs:
+                raise te.TastyError(f"Unable to pass {', '.join(sorted(kwargs))} to pyshacl.validate with an "
+                                    f"engine, configure the engine instead")
+            return engine.validate(data_graph, self.shapes_graph, self.ont_graph)
+        return PyshaclEngine(**kwargs).validate(data_graph, self.shapes_graph, self.ont_graph)
+
+
+class ShapesOverlay(ReadOnlyGraphAggregate):
+    """
+    A view of one or more (shared) base shapes graphs together with a small overlay graph for a single validation,
+    i.e. the sh:targetNode triples. Triples added to the view are added to the overlay, and the base graphs are
+    never modified, so parsed shapes graphs can be shared by concurrent validations, each with their own overlay.
+    pySHACL accepts the overlay as the shacl_graph, and adds its system triples to the overlay rather than to the
+    base graphs. The base graphs are assumed not to share any triples.
+    """
+
+    def __init__(self, base: Union[Graph, List[Graph]], overlay: Graph = None):
+        """
+        :param base: the shared shapes graph, or a list of shared shapes graphs
+        :param overlay: the graph of triples to add for this validation. A new graph is created if not provided
+        """
+        base_graphs = [base] if isinstance(base, Graph) else list(base)
+        overlay = overlay if overlay is not None else Graph()
+        super().__init__([overlay] + base_graphs)
+        self.base_graphs = base_graphs
+        self.overlay = overlay
+        for graph in base_graphs:
+            for prefix, namespace in graph.namespaces():
+                overlay.bind(prefix, namespace, override=False)
+        overlay.bind('sh', SH, override=False)
+        self.namespace_manager = overlay.namespace_manager
+
+    def add(self, triple):
+        """Add a triple to the overlay"""
+        self.overlay.add(triple)
+        return self
+
+    def addN(self, quads):
+        """Add quads to the overlay, ignoring their context"""
+        self.overlay.addN((s, p, o, self.overlay) for s, p, o, c in quads)
+        return self
+
+    def add_target(self, shape: URIRef, target_node: URIRef) -> None:
+        """
+        Add a sh:targetNode to the overlay.
+
+        :param shape: the shape to target
+        :param target_node: the node to validate against the shape
+        """
+        self.overlay.add((shape, SH.targetNode, target_node))
+
+    def add_targets(self, targets: Iterable[Tuple[URIRef, URIRef]]) -> None:
+        """
+        :param targets: (shape, target node) tuples, see add_target
+        """
+        self.overlay.addN((shape, SH.targetNode, node, self.overlay) for shape, node in targets)
+
+    def contexts(self, triple=None):
+        return iter(self.graphs)
+
+    def triples(self, triple):
+        s, p, o = triple
+        if isinstance(p, Path):
+            for s, o in p.eval(self, s, o):
+                yield s, p, o
+            return
+        for graph in self.base_graphs:
+            yield from graph.triples(triple)
+        if len(self.overlay):
+            yield from self.overlay.triples(triple)
+
+    def __hash__(self):
+        return hash(self.identifier)
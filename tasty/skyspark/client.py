@@ -1,21 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List
+
 import requests
+from requests.adapters import HTTPAdapter
+from rdflib import Graph
+from urllib3.util.retry import Retry
+
+from tasty import graphs as tg
 
 # TODO:
-# make parameters instance variables
 # construct query method
 
+# set "Accept" header value based on specified format
+ACCEPT_TYPES = {
+    'turtle': 'text/turtle',
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'json-ld': 'application/ld+json',
+    'zinc': 'text/zinc',
+    'trio': 'text/trio'
+}
+
 
 class SkysparkClient:
     """
     This class is a wrapper for the SkySpark web API. It is defined with a URL endpoint;
     once it is instantiated it can be used to make a get request from the API and can also
     to generate the proper axon query.
+
+    All requests share a single (pooled) session, so connections are reused between requests. Requests time out
+    after 'timeout' seconds and are retried with an exponential backoff on connection errors and on 429 / 5xx
+    responses. Many equipment can be fetched at once with fetch_equipment, which combines them into paged
+    queries that are requested concurrently.
     """
 
-    def __init__(self, api_url_endpoint):
+    def __init__(self, api_url_endpoint, timeout: float = 30, max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_workers: int = 8, page_size: int = 50):
+        """
+        :param api_url_endpoint: the url of the 'read' endpoint of the api
+        :param timeout: seconds to wait for the server to respond before giving up on a request
+        :param max_retries: number of times to retry a failed request
+        :param backoff_factor: factor for the exponential backoff between retries, in seconds
+        :param max_workers: maximum number of concurrent requests (and pooled connections)
+        :param page_size: number of equipment to combine into a single query in fetch_equipment
+        """
         self.api_url_endpoint = api_url_endpoint
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        """Close the session and all pooled connections"""
+        self.session.close()
 
-    def make_get_request(self, query_string: str, format: str = 'json'):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def make_get_request(self, query_string: str, format: str = 'json', stream: bool = False):
         """
         Make a get request to a (Skyspark) api endpoint. Note that the query string must be a valid
         'axon' query.
@@ -25,33 +80,40 @@ class SkysparkClient:
         :param format: the format in which the response should be returned options are
             ['json' , 'turtle' , 'csv' , 'zinc' , 'trio' , 'json-ld'] - the default is json
         :type format: str
+        :param stream: whether to defer downloading the response body until it is iterated over
+        :type stream: bool
         :return: the get response
         :rtype: requests.Response Object
         """
+        # use json as default if no matches
+        accept_type = ACCEPT_TYPES.get(format, 'application/json')
 
-        # set "Accept" header value based on specified format
-        mapping_dict = {
-            'turtle': 'text/turtle',
-            'csv': 'text/csv',
-            'json': 'application/json',
-            'json-ld': 'application/ld+json',
-            'zinc': 'text/zinc',
-            'trio': 'text/trio'
-        }
-
-        if format in mapping_dict:
-            accept_type = mapping_dict[format]
-        else:
-            accept_type = 'application/json'  # use json as default if no matches
-
-        return requests.get(
+        return self.session.get(
             self.api_url_endpoint,
             params={'filter': query_string},
             headers={
                 'Accept': accept_type
-            }
+            },
+            timeout=self.timeout,
+            stream=stream
         )
 
+    def iter_response_lines(self, query_string: str, format: str = 'turtle') -> Iterator[str]:
+        """
+        Make a streaming get request and yield the lines of the response body as they arrive, without
+        holding the full body in memory.
+
+        :param query_string: the (axon) query string to include in the request
+        :param format: see make_get_request
+        :return: a generator of the lines, including line endings
+        """
+        with self.make_get_request(query_string, format, stream=True) as response:
+            response.raise_for_status()
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                yield line + '\n'
+
     def generate_axon_query_for_equip(self, nav_name: str):
         """
         This method generates a query for a given peice of a equipment. Given the equipment's "navName" the query string
@@ -61,3 +123,60 @@ class SkysparkClient:
         """
         query_string = "(point and equipRef->navName==\"" + nav_name + "\") or (equip and navName==\"" + nav_name + "\")"
         return query_string
+
+    def generate_axon_query_for_equips(self, nav_names: List[str]):
+        """
+        This method generates a single query for many pieces of equipment, see generate_axon_query_for_equip.
+
+        :nav_names: the navNames (from Skyspark) of the equipment for which to generate the query
+        """
+        return " or ".join(self.generate_axon_query_for_equip(nav_name) for nav_name in nav_names)
+
+    def fetch_equipment(self, nav_names: Iterable[str], format: str = 'turtle') -> Dict[tuple, str]:
+        """
+        Fetch the equipment and their points for many navNames. The navNames are split into pages of
+        'page_size', each page is fetched with a single query, and up to 'max_workers' pages are fetched
+        concurrently.
+
+        :param nav_names: the navNames (from Skyspark) of the equipment to fetch
+        :param format: see make_get_request
+        :return: a dict of {page: response body}, where each page is a tuple of navNames
+        """
+        def fetch(page):
+            response = self.make_get_request(self.generate_axon_query_for_equips(page), format)
+            response.raise_for_status()
+            return response.text
+
+        pages = self._paginate(nav_names)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(pages, executor.map(fetch, pages)))
+
+    def fetch_equipment_graph(self, nav_names: Iterable[str], graph: Graph = None,
+                              clean_lines: Callable[[Iterable[str]], Iterable[str]] = None) -> Graph:
+        """
+        Fetch the equipment and their points for many navNames as turtle (see fetch_equipment) and parse
+        the response bodies into a graph while they are streamed. Each page is parsed into its own graph
+        in the worker thread, and then merged into 'graph'.
+
+        :param nav_names: the navNames (from Skyspark) of the equipment to fetch
+        :param graph: the graph to add the triples to. A new graph is created if not provided
+        :param clean_lines: an optional function to apply to the lines of each response body before parsing,
+            i.e. SkysparkGraphProcessor.iter_clean_raw_skyspark_turtle
+        :return: the graph
+        """
+        def fetch(page):
+            lines = self.iter_response_lines(self.generate_axon_query_for_equips(page), 'turtle')
+            if clean_lines is not None:
+                lines = clean_lines(lines)
+            return tg.parse_turtle_stream(lines, Graph())
+
+        if graph is None:
+            graph = Graph()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for page_graph in executor.map(fetch, self._paginate(nav_names)):
+                graph += page_graph
+        return graph
+
+    def _paginate(self, nav_names: Iterable[str]) -> List[tuple]:
+        nav_names = list(nav_names)
+        return [tuple(nav_names[i:i + self.page_size]) for i in range(0, len(nav_names), self.page_size)]
@@ -1,19 +1,26 @@
-from rdflib import OWL, RDF, RDFS
+import json
+from typing import Dict, Iterable, List
+
+from rdflib import OWL, RDF, RDFS, Graph, Namespace
 from tasty import constants as tc
 from tasty import graphs as tg
 
+# cache of PointTypeIndex objects, keyed by haystack version
+_point_type_indexes = {}
+
 
 class PointNode:
     """
     A generic "Point Node" which represents a haystack/skyspark point type. A node is defined by
     a type (a first class entity type); a set of associated tags (typically the hyphenated components
-    of the 'type') ; a parent (except in the case of the root node where the parent is null); and set
-    of children - child nodes have tag sets which are super sets of their parent's tag set.
+    of the 'type') ; one or more parents (except in the case of the root node where the parent is null); and set
+    of children - child nodes have tag sets which are super sets of their parents' tag sets.
     """
 
     def __init__(self, type: str, parent):
         self.type = type
         self.parent = parent
+        self.parents = [parent] if parent is not None else []
         self.children = []
         self.tags = []
         self.load_tags()
@@ -27,40 +34,73 @@ class PointNode:
         """
         self.children.append(child)
 
+    def add_parent(self, parent: 'PointNode'):
+        """
+        Add an additional parent (node) to the given node, for point types that are a subtype of more than one point type.
+        The 'parent' attribute remains the first parent added.
+
+        :param parent: the parent node to add
+        :type parent: PointNode
+        """
+        if self.parent is None:
+            self.parent = parent
+        self.parents.append(parent)
+
     def load_tags(self):
         """
         Load the tags for this node based on the 'type' string passed in at instantiation. This method will split the
         'type' on hyphens and add each word as a tag to the node. The tag "point" is removed (this may be updated at
         a later time)
         """
-        self.tags = self.type.split("-")
-
-        # remove empty strings and 'point'
         # eventually we may want "point" as a tag, but it's currently not in the "source" or "generated" shapes
-        for tag in self.tags:
-            if(tag == '' or tag == 'point'):
-                self.tags.remove(tag)
+        self.tags = split_type_into_tags(self.type)
 
 
 class PointTree:
     """
-    A data structure comprising a tree of PointNodes. The tree is defined by a root PointNode,
+    A data structure comprising a hierarchy of PointNodes. The tree is defined by a root PointNode,
     of which all the other PointNodes are descendents. When traversing this data structure from
     the root downwards, the tag set of each successive PointNode is more specific than (i.e. is a
     superset of) the direct ancestors of that PointNode.
 
-    NOTE: this data structure implicitly assumes that points fall into a tree-like hierarchy and
-    that each point can only be a subtype of ONE point type. This may not be the actual case in
-    some systems and may need to be re-considered at another time. Also because of this, if 'his',
-    'cur', 'writable', or 'weather' tags are not removed first, first-class-point-types determined
-    may not be correct, as it assumes mutual exclusivity.
+    Point types which are a subtype of more than one point type are represented by a single PointNode with
+    multiple parents, so the hierarchy is a DAG rather than a strict tree. Once populated, the tree is compiled
+    into a PointTypeIndex (see 'index'), which is used for all queries.
+
+    NOTE: if 'his', 'cur', 'writable', or 'weather' tags are not removed first, the single first-class-point-type
+    determined by determine_first_class_point_type may not be correct, as it assumes mutual exclusivity. Use
+    determine_maximal_point_types to get all of the most specific point types matched instead.
     """
 
     def __init__(self, filename: str, root_type: str):
         self.root_type = root_type
         self.filename = filename
         self.root = None
-        self.generate_point_tree(filename)
+        self.nodes: Dict[str, PointNode] = {}
+        self.index: PointTypeIndex = None
+        if filename is not None:
+            self.generate_point_tree(filename)
+            self.compile()
+
+    @classmethod
+    def from_index(cls, index: 'PointTypeIndex') -> 'PointTree':
+        """
+        Create a PointTree from a compiled (i.e. previously saved and loaded) PointTypeIndex, without parsing the
+        schema definition file.
+
+        :param index: the PointTypeIndex
+        :return: the PointTree
+        """
+        tree = cls(None, index.root_type)
+        nodes = [PointNode(type_name, None) for type_name in index.types]
+        for node, parents in zip(nodes, index.parents):
+            for parent in parents:
+                node.add_parent(nodes[parent])
+                nodes[parent].add_child(node)
+        tree.root = nodes[0]
+        tree.nodes = {node.type: node for node in nodes}
+        tree.index = index
+        return tree
 
     def get_root(self) -> 'PointNode':
         return self.root
@@ -89,55 +129,302 @@ class PointTree:
         assert count == 1
 
         # now iterate over all items which are a subclass of "point" and recursively add all subnodes
+        self.nodes = {self.root.type: self.root}
         self.add_subnodes(graph, self.root, root_uri)
 
     def add_subnodes(self, graph, parentNode: 'PointNode', parentUri):
         """
         Adds all subnodes of a given parent node to the PointTree. Given an rdf graph and a parent node in that graph,
         this method adds subtypes of the root node as children to the root, and recursively does the same for each child
-        node untill all subtypes are discovered and the PointTree is fully populated.
+        node untill all subtypes are discovered and the PointTree is fully populated. Subtypes that were already added
+        via another parent are linked to the additional parent instead of being added twice.
 
         :param graph: the rdf graph describing the given ontology from which to construct the PointTree
         :param parentNode: the parent node as a PointNode, for which all subtypes should be added
         :param parentUri: the uri of the parent node in the rdf graph
         """
         for s, p, o in graph.triples((None, RDFS.subClassOf, parentUri)):
-            # print(s[s.find('#')+1:])
-            new_node = PointNode(s[s.find('#') + 1:], parentNode)
+            type_name = s[s.find('#') + 1:]
+            if type_name in self.nodes:
+                node = self.nodes[type_name]
+                node.add_parent(parentNode)
+                parentNode.add_child(node)
+                continue
+            new_node = PointNode(type_name, parentNode)
+            self.nodes[type_name] = new_node
             parentNode.add_child(new_node)
             self.add_subnodes(graph, new_node, s)
 
+    def compile(self) -> 'PointTypeIndex':
+        """
+        Compile the populated PointTree into a PointTypeIndex, stored as self.index.
+
+        :return: the PointTypeIndex
+        """
+        types = [self.root.type] + sorted(t for t in self.nodes if t != self.root.type)
+        positions = {t: i for i, t in enumerate(types)}
+        parents = [sorted(positions[p.type] for p in self.nodes[t].parents) for t in types]
+        self.index = PointTypeIndex(self.root.type, types, parents)
+        return self.index
+
+    def save(self, filename: str):
+        """
+        Save the compiled PointTree, see PointTypeIndex.save. Load it again with PointTree.load
+
+        :param filename: the filepath/filename in which to save the PointTree
+        """
+        self.index.save(filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'PointTree':
+        """
+        Load a PointTree previously saved with PointTree.save
+
+        :param filename: the filepath/filename from which to load the PointTree
+        :return: the PointTree
+        """
+        return cls.from_index(PointTypeIndex.load(filename))
+
     def determine_first_class_point_type(self, root: 'PointNode', input_tags) -> 'PointNode':
         """
         Determines the first-class-point-type based on a given set of tags starting at the given root node.
-        This method looks at the root node and then recursively at each subnode untill the set of tags stops
-        matching the point type.
+        Of all descendants of the root node whose tags are a subset of the input tags, the most specific
+        (i.e. the one with the most tags) is returned. If none match, the root is returned. See PointTypeIndex.match
+        for how this relates to descending the tree into the first matching child.
+
+        (but if the matched node is one of the immediate children of 'point', then just 'point' is returned - this is
+        idiosyncratic to the current implementation of the the PointTree and schema)
 
         :param root: the node at which to begin checking against
         :param input_tags: a list of the tags to use to identify the point type
         """
-        # iterate over children node
-        for node in root.children:
+        within = self.index.positions[root.type]
+        position = self.index.match(self.index.encode(input_tags), within)
+        return self.nodes[self.index.types[position]]
+
+    def determine_maximal_point_types(self, input_tags) -> List['PointNode']:
+        """
+        Determines all of the most specific point types matching the given set of tags, see
+        PointTypeIndex.maximal_matches
+
+        :param input_tags: a list of the tags to use to identify the point types
+        :return: the matching PointNodes
+        """
+        return [self.nodes[t] for t in self.index.maximal_matches(input_tags)]
+
+
+class PointTypeIndex:
+    """
+    A flattened, precomputed lookup of first-class point types. Each point type is encoded as a bitset (a python int)
+    over a shared tag vocabulary, where bit i is set if the i-th tag of the vocabulary is part of the type. Determining
+    the point type of a set of tags then reduces to subset tests on integers, i.e. (type_mask & tags_mask) == type_mask.
+    The type hierarchy (which may have multiple parents per type) is likewise stored as a bitset of ancestors per type.
+
+    Tags are derived from the type names the same way as PointNode.load_tags, i.e. 'air-temp-sensor' -> {air, temp, sensor}.
+    Results are memoized per distinct tag set, as points of a site typically share a small number of tag sets.
+    """
+
+    def __init__(self, root_type: str, types: List[str], parents: List[List[int]]):
+        """
+        :param root_type: the name of the root point type, i.e. 'point'
+        :param types: the names of all point types, with the root type at position 0
+        :param parents: for each type in 'types', the positions of its direct parent types
+        """
+        self.root_type = root_type
+        self.types = types
+        self.parents = parents
+        self.positions: Dict[str, int] = {t: i for i, t in enumerate(types)}
+        self.tag_ids: Dict[str, int] = {}
+        self.masks: List[int] = []
+        self.sizes: List[int] = []
+        self.ancestors: List[int] = []
+        self._memo: Dict[tuple, int] = {}
+
+        for type_name in types:
+            tags = split_type_into_tags(type_name)
+            for tag in tags:
+                if tag not in self.tag_ids:
+                    self.tag_ids[tag] = len(self.tag_ids)
+            self.masks.append(self.encode(tags))
+            self.sizes.append(len(tags))
+
+        self.ancestors = [None] * len(types)
+        for i in range(len(types)):
+            self._resolve_ancestors(i)
+
+    def _resolve_ancestors(self, i: int) -> int:
+        if self.ancestors[i] is None:
+            ancestors = 0
+            for parent in self.parents[i]:
+                ancestors |= (1 << parent) | self._resolve_ancestors(parent)
+            self.ancestors[i] = ancestors
+        return self.ancestors[i]
+
+    @classmethod
+    def from_ontology(cls, ontology: Graph, namespace: Namespace, root_type: str = 'point') -> 'PointTypeIndex':
+        """
+        Build the index from all (transitive) subclasses of the root type in the given ontology graph.
+
+        :param ontology: the ontology graph, i.e. as returned by tg.load_ontology
+        :param namespace: the namespace in which the root type is defined, i.e. tc.PHIOT_3_9_10
+        :param root_type: the name of the root point type
+        :return: the PointTypeIndex
+        """
+        root_uri = namespace[root_type]
+        # sort to get a deterministic order of types, with the root type always at position 0
+        uris = sorted(set(ontology.transitive_subjects(RDFS.subClassOf, root_uri)) - {root_uri})
+        uris.insert(0, root_uri)
+        positions = {uri: i for i, uri in enumerate(uris)}
+        types = [uri[uri.find('#') + 1:] for uri in uris]
+        parents = [sorted(positions[o] for o in ontology.objects(uri, RDFS.subClassOf) if o in positions) for uri in uris]
+        parents[0] = []
+        return cls(root_type, types, parents)
+
+    def to_dict(self) -> dict:
+        """
+        :return: a JSON serializable representation of the index, see from_dict
+        """
+        return {
+            'root_type': self.root_type,
+            'types': self.types,
+            'parents': self.parents
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'PointTypeIndex':
+        """
+        :param data: a dict as returned by to_dict
+        :return: the PointTypeIndex
+        """
+        return cls(data['root_type'], data['types'], data['parents'])
+
+    def save(self, filename: str):
+        """
+        Save the index as JSON, such that it can be loaded without parsing an ontology.
+
+        :param filename: the filepath/filename in which to save the index
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, filename: str) -> 'PointTypeIndex':
+        """
+        Load an index previously saved with PointTypeIndex.save
+
+        :param filename: the filepath/filename from which to load the index
+        :return: the PointTypeIndex
+        """
+        with open(filename, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def encode(self, tags: Iterable[str]) -> int:
+        """
+        Encode a set of tags as a bitset over the tag vocabulary. Tags not in the vocabulary are ignored, as they
+        cannot contribute to matching a point type.
+
+        :param tags: the tags (as plain strings) to encode
+        :return: the bitset as an int
+        """
+        mask = 0
+        for tag in tags:
+            tag_id = self.tag_ids.get(tag)
+            if tag_id is not None:
+                mask |= 1 << tag_id
+        return mask
+
+    def matches(self, mask: int) -> List[int]:
+        """
+        :param mask: a bitset as returned by encode
+        :return: the positions of all point types whose tags are a subset of the bitset, including the root type
+        """
+        return [i for i, type_mask in enumerate(self.masks) if type_mask & mask == type_mask]
 
-            counter = 0
-            # iterate over the node tags
-            for tag in node.tags:
-                # if the tag is in the input tag set
-                if(tag in input_tags):
-                    # increment the count
-                    counter += 1
-                    # if all tags are there, then the input point is a subtype of this node
-                    if counter == len(node.tags):
-                        # check the next level of nodes
-                        return self.determine_first_class_point_type(node, input_tags)
+    def match(self, mask: int, within: int = 0) -> int:
+        """
+        Determine the position of the most specific point type matching the given bitset, i.e. the matching type with
+        the most tags. Ties are broken by the order of the types (by name). If the most specific type is an immediate
+        subtype of the root type, the root type is returned.
+
+        The original PointTree descended into the first matching subtype at each level instead, in the order rdflib
+        iterated the ontology, which varies between runs (hash randomization). When several subtypes match, i.e. for
+        {steam, sensor, writable} both 'writable-point' and 'steam-point', it could return 'point' or 'steam-sensor'.
+        The type returned here is always one of the types such a descent can end at, and is the same in every run.
+
+        :param mask: a bitset as returned by encode
+        :param within: the position of the point type to start from; only it and its descendants are considered
+        :return: the position of the point type in self.types
+        """
+        key = (mask, within)
+        best = self._memo.get(key)
+        if best is None:
+            best = within
+            best_size = self.sizes[within]
+            for i, type_mask in enumerate(self.masks):
+                if self.sizes[i] > best_size and type_mask & mask == type_mask:
+                    if within == 0 or self.ancestors[i] >> within & 1:
+                        best = i
+                        best_size = self.sizes[i]
+            if 0 in self.parents[best]:
+                best = 0
+            self._memo[key] = best
+        return best
+
+    def maximal_matches(self, tags: Iterable[str]) -> List[str]:
+        """
+        Determine all maximal point types matching a set of tags, i.e. every matching point type that is not an
+        ancestor of another matching point type. For example, {his, air, temp, sensor} results in
+        ['air-temp-sensor', 'his-point'].
+
+        :param tags: the tags (as plain strings) of the point
+        :return: the names of the point types
+        """
+        matched = self.matches(self.encode(tags))
+        matched_ancestors = 0
+        for i in matched:
+            matched_ancestors |= self.ancestors[i]
+        return [self.types[i] for i in matched if not matched_ancestors >> i & 1]
+
+    def classify(self, tags: Iterable[str]) -> str:
+        """
+        Determine the first-class point type for a set of tags.
+
+        :param tags: the tags (as plain strings) of the point
+        :return: the name of the point type, i.e. 'air-temp-sensor'
+        """
+        return self.types[self.match(self.encode(tags))]
+
+    def classify_all(self, tags_by_point: Dict) -> Dict:
+        """
+        Determine the first-class point types for many points in one pass.
 
-                # otherwise the tag is not in the input tag set; go to the next node
+        :param tags_by_point: a dict of {point: tags}
+        :return: a dict of {point: point type name}
+        """
+        return {point: self.classify(tags) for point, tags in tags_by_point.items()}
 
-        # otherwise the point does not match any of the tags; return the root (i.e. the most specific point type matched thus far)
 
-        # (but if the root is one of the immediate children of 'point', then just return 'point' - this is idiosyncratic to the
-        # current implementation of the the PointTree and schema)
-        if root.parent is self.root:
-            return self.root
+def split_type_into_tags(type_name: str) -> List[str]:
+    """
+    Split a point type name on hyphens into its tags, ignoring empty strings and 'point'.
 
-        return root
+    :param type_name: the name of the point type, i.e. 'air-temp-sensor'
+    :return: the tags, i.e. ['air', 'temp', 'sensor']
+    """
+    return [tag for tag in type_name.split('-') if tag not in ('', 'point')]
+
+
+def get_point_type_index(version: str = tc.V3_9_10, ontology: Graph = None) -> PointTypeIndex:
+    """
+    Return the PointTypeIndex for the given haystack version. The index is built once per version and cached.
+
+    :param version: a haystack version from tc.SUPPORTED_SCHEMAS
+    :param ontology: an already loaded ontology graph for the version, loaded if not provided
+    :return: the PointTypeIndex
+    """
+    if version not in _point_type_indexes:
+        if ontology is None:
+            ontology = tg.load_ontology(tc.HAYSTACK, version)
+        namespace = Namespace(f"https://project-haystack.org/def/phIoT/{version}#")
+        _point_type_indexes[version] = PointTypeIndex.from_ontology(ontology, namespace)
+    return _point_type_indexes[version]
@@ -1,14 +1,17 @@
 import json
+import logging
 import os
-import re
 
 from rdflib import Namespace, RDF, SH, BNode
 
 from tasty import constants as tc
 from tasty import graphs as tg
+from tasty.shapes_loader import ShapesOverlay, load_frozen_shapes_file
 from tasty.skyspark import point_mapper as pm
 from tasty.skyspark import helpers
 
+logger = logging.getLogger(__name__)
+
 PHCUSTOM = Namespace("https://project-haystack.org/def/custom#")
 # POINT = Namespace("https://skyfoundry.com/def/point/3.0.27#")
 # BACNET = Namespace("https://skyfoundry.com/def/bacnet/3.0.27#")
@@ -30,6 +33,9 @@ ph_versioned_ns_dict = {
     }
 }
 
+# cache of valid tags, keyed by (schema, version), see SkysparkGraphProcessor.get_valid_tags
+_valid_tags = {}
+
 
 class SkysparkGraphProcessor:
     """
@@ -53,7 +59,8 @@ class SkysparkGraphProcessor:
     def clean_raw_skyspark_turtle(self, file_in, file_out):
         """
         Takes in a raw SkySpark turtle file, performs some cleanup processes on it, and saves it to
-        a new file, designated by 'file_out'
+        a new file, designated by 'file_out'. The file is processed line by line, see iter_clean_raw_skyspark_turtle.
+        Use parse_raw_skyspark_turtle to skip the intermediate file.
 
         :param file_in: the filepath/filename of the raw file to process
         :param file_out: the filepath/filename in which to save the cleaned file
@@ -71,139 +78,201 @@ class SkysparkGraphProcessor:
         There are likely more elegant ways to handle these changes. For #3, we can likely generated a haystack version '3.9.9' graph to avoid
         this requirement. For #2 there is likely a way to bind this prefix to the graph prior to parsing the instance data file.
         """
-        # read in the file
-        with open(file_in, 'r') as raw_file:
-            filedata = raw_file.read()
+        with open(file_in, 'r') as raw_file, open(file_out, 'w') as clean_file:
+            clean_file.writelines(self.iter_clean_raw_skyspark_turtle(raw_file))
 
-        # remove date-time fields in the middle of the definition
-        filedata = re.sub(r'\n.*\^{2}xsd:dateTime.*;', '', filedata)
-        # remove date-time fields at the end of the definition
-        filedata = re.sub(r';\n.*\^{2}xsd:dateTime.*.', '.', filedata)
+    def iter_clean_raw_skyspark_turtle(self, lines):
+        """
+        Performs the cleanup processes described in clean_raw_skyspark_turtle on a stream of lines of a raw SkySpark
+        turtle file in a single pass, holding back at most one line at a time.
 
-        # add urn namespace to graph
-        filedata = re.sub('@prefix', '@prefix _: <' + self.input_namespace_uri + '> .\n@prefix', filedata, count=1)
+        :param lines: the lines of the raw file, i.e. an open file
+        :return: a generator of the cleaned lines
+        """
+        pending = None
+        prefix_added = False
+        for line in lines:
+            if not prefix_added and line.startswith('@prefix'):
+                # add urn namespace to graph
+                yield f"@prefix _: <{self.input_namespace_uri}> .\n"
+                prefix_added = True
+
+            if '^^xsd:dateTime' in line:
+                stripped = line.rstrip()
+                # remove date-time fields in the middle of the definition
+                if stripped.endswith(';'):
+                    continue
+                # remove date-time fields at the end of the definition, ending the definition on the previous line
+                if pending is not None and pending.rstrip().endswith(';'):
+                    pending = pending.rstrip()[:-1] + '.\n'
+                    continue
+
+            if pending is not None:
+                yield pending
+            # change the project haystack namespaces to v10
+            pending = line.replace('/3.9.9', '/3.9.10')
+
+        if pending is not None:
+            yield pending
+
+    def parse_raw_skyspark_turtle(self, file_in, graph=None, batch_size=1000):
+        """
+        Cleans a raw SkySpark turtle file (see clean_raw_skyspark_turtle) and parses it directly into a graph, without
+        writing an intermediate file. The file is streamed and parsed in batches of statements, so memory is bounded by
+        the graph itself.
 
-        # change the project haystack namespaces to v10
-        filedata = re.sub('/3.9.9', '/3.9.10', filedata)
+        :param file_in: the filepath/filename of the raw file to process
+        :param graph: the rdf graph to parse into. If not provided, a new graph is created for the schema and version
+        :param batch_size: the number of turtle statements to parse at a time
+        :return: the graph
+        """
+        if graph is None:
+            graph = tg.get_versioned_graph(self.schema, self.version)
+        with open(file_in, 'r') as raw_file:
+            tg.parse_turtle_stream(self.iter_clean_raw_skyspark_turtle(raw_file), graph, batch_size)
+        return graph
 
-        # save to clean file
-        with open(file_out, 'w') as clean_file:
-            clean_file.write(filedata)
+    def raw_skyspark_turtle_to_ntriples(self, file_in, file_out, batch_size=1000):
+        """
+        Cleans a raw SkySpark turtle file (see clean_raw_skyspark_turtle) and writes it as N-Triples, streaming both
+        the input and output files.
+
+        :param file_in: the filepath/filename of the raw file to process
+        :param file_out: the filepath/filename in which to save the N-Triples
+        :param batch_size: the number of turtle statements to convert at a time
+        :return: the number of triples written
+        """
+        with open(file_in, 'r') as raw_file, open(file_out, 'w') as nt_file:
+            return tg.turtle_stream_to_ntriples(self.iter_clean_raw_skyspark_turtle(raw_file), nt_file, batch_size)
 
     def get_valid_tags(self):
         """
         Generates a list of valid tags based on the given schema and the .json files in the associated source shape
-        directory. This list of valid tags can then be used to remove extraneous tags from the data graph to aid in validation
+        directory. This list of valid tags can then be used to remove extraneous tags from the data graph to aid in validation.
+        The tags are only generated once per (schema, version) and cached, see get_valid_tag_set.
 
         :return: a dict containing two lists - 'plain' is a list of the tags as plain strings, 'namespaced' is a list of the tags
         as UIRs with the proper namespaces.
         :rtype: a dict with the structure { 'plain': [...], 'namespaced': [...] }
         """
+        valid_tags, valid_tags_ns, _ = self._load_valid_tags()
+        return {
+            'plain': list(valid_tags),
+            'namespaced': list(valid_tags_ns)
+        }
+
+    def get_valid_tag_set(self):
+        """
+        :return: the namespaced valid tags (see get_valid_tags) as a frozenset, for constant time membership tests
+        :rtype: frozenset
+        """
+        return self._load_valid_tags()[2]
+
+    def _load_valid_tags(self):
+        key = (self.schema, self.version)
+        if key in _valid_tags:
+            return _valid_tags[key]
 
         # get the source shapes directory based on the given schema and create a list of all the json files in that directory
         source_shapes_schema_dir = os.path.join(source_shapes_dir, self.schema.lower())
         files = [os.path.join(source_shapes_schema_dir, f) for f in
                  os.listdir(source_shapes_schema_dir) if f.endswith('.json')]
 
-        valid_tags = []
-        valid_tags_ns = []
+        valid_tags = set()
 
         # go through schema files and extract valid tags
         for file in files:
             # open file and read in json to python dict
             with open(file, 'r') as f:
                 filedata = json.loads(f.read())
-                # for each shape
+                # for each shape, add tags and custom tags
                 for shape in filedata['shapes']:
-                    # add tags if not already added to the tags list
-                    if 'tags' in shape:
-                        for tag in shape['tags']:
-                            if tag not in valid_tags:
-                                valid_tags.append(tag)
-                    # add custom tags if not already added to the tags list
-                    if 'tags-custom' in shape:
-                        for tag in shape['tags-custom']:
-                            if tag not in valid_tags:
-                                valid_tags.append(tag)
-
-        print("...generated tag list")
-        print("...adding namespaces")
+                    valid_tags.update(shape.get('tags', []))
+                    valid_tags.update(shape.get('tags-custom', []))
+
+        logger.debug("Generated tag list of %d tags, adding namespaces", len(valid_tags))
         # sort tags list
-        valid_tags = sorted(valid_tags)
+        valid_tags = tuple(sorted(valid_tags))
 
         # add namespaces to all valid tags
+        subjects = set(self.ontology_graph.subjects())
+        valid_tags_ns = []
         for tag in valid_tags:
-            tag_ns = tg.get_namespaced_term(self.ontology_graph, tag)
+            tag_ns = tg.get_namespaced_term(self.ontology_graph, tag, subjects)
             # take care of custom tags
             if tag_ns is False:
                 tag_ns = PHCUSTOM[tag]
             valid_tags_ns.append(tag_ns)
 
-        tags_dict = {
-            'plain': valid_tags,
-            'namespaced': valid_tags_ns
-        }
+        _valid_tags[key] = (valid_tags, tuple(valid_tags_ns), frozenset(valid_tags_ns))
+        return _valid_tags[key]
 
-        return tags_dict
-
-    def remove_invalid_tags(self, data_graph):
+    def remove_invalid_tags(self, data_graph, inplace=True):
         """
-        This method retrieves the list of valid tags, then checks the tags of each point in the given rdf grpah against this list.
-        If the tags are not in the list of valid tags, they are removed from the graph
+        This method retrieves the set of valid tags, then checks the tags of each point in the given rdf graph against this set.
+        The invalid tags of all points are collected in a single pass over the graph and, if 'inplace', removed afterwards.
 
         :param data_graph: the rdf (instance data) graph to process
+        :param inplace: whether to remove the invalid tags from the graph. If False, the graph is not modified.
+        :return: the (point, ph:hasTag, tag) triples with invalid tags, i.e. the triples that are (or would be) removed
         """
 
-        # get the list of valid tags
-        valid_tags = self.get_valid_tags()
-        valid_tags_ns = valid_tags['namespaced']
+        # get the set of valid tags
+        valid_tags_ns = self.get_valid_tag_set()
+        has_tag = ph_versioned_ns_dict[self.version]['ph']["hasTag"]
 
-        # Iterate over all points in the graph (anything with an "equipRef" tag)
-        for s1, p1, o1 in data_graph.triples((None, ph_versioned_ns_dict[self.version]['phiot']["equipRef"], None)):
-            print(f"...processing node: \t{s1}")
-            # iterate over each tag
-            for s, p, o in data_graph.triples((s1, ph_versioned_ns_dict[self.version]['ph']["hasTag"], None)):
-                # if the tag is not in the list of valid tags, remove it
-                if o not in valid_tags_ns:
-                    data_graph.remove((s, p, o))
+        # all points in the graph (anything with an "equipRef" tag)
+        points = set(data_graph.subjects(ph_versioned_ns_dict[self.version]['phiot']["equipRef"], None))
 
-    def add_first_class_point_types(self, data_graph):
-        """
-        This method adds the first-class-point-type to each point in the given rdf graph.
+        # collect the tags of the points which are not in the set of valid tags
+        invalid = [(s, has_tag, o) for s, o in data_graph.subject_objects(has_tag) if s in points and o not in valid_tags_ns]
+        logger.info("Found %d invalid tags on %d points", len(invalid), len(points))
 
-        :param data_graph: the rdf (instance data) graph to process
-        """
+        if inplace:
+            for triple in invalid:
+                data_graph.remove(triple)
 
-        # load the point tree
-        file = os.path.join(os.path.dirname(__file__), '../schemas/haystack/defs_3_9_10.ttl')
-        pt = pm.PointTree(file, 'point')
-        root = pt.get_root()
+        return invalid
 
-        # Get all 'points' that have a 'equipRef' tag
-        for s, p, o in data_graph.triples((None, ph_versioned_ns_dict[self.version]['phiot']["equipRef"], None)):
-            print(f"Point: \t{s}")
-            print(f"Tags: ", end="")
-
-            # get the tags for this point
-            tags = []
-            for s1, p1, o1 in data_graph.triples((s, ph_versioned_ns_dict[self.version]['ph']["hasTag"], None)):
-                tag = o1[o1.find('#') + 1:]
-                print(f"\t{tag}")
-                tags.append(tag)
-
-            # now determine first class point type
-            fc_point = pt.determine_first_class_point_type(root, tags)
-            print(f"\t...First Class Entity Type: {fc_point.type}\n")
+    def add_first_class_point_types(self, data_graph, add_types=True):
+        """
+        This method determines the first-class-point-type of each point in the given rdf graph. All points are classified
+        in a single pass using the (cached) PointTypeIndex, then the types are added to the graph in bulk.
 
+        :param data_graph: the rdf (instance data) graph to process
+        :param add_types: whether to add the first-class-point-types as classes to the points (and remove the tags
+            associated with the first-class-point-type). If False, the graph is not modified.
+        :return: a dict of {point: first-class-point-type} with both as URIs
+        """
+        ph = ph_versioned_ns_dict[self.version]['ph']
+        phiot = ph_versioned_ns_dict[self.version]['phiot']
+        phscience = ph_versioned_ns_dict[self.version]['phscience']
+        index = pm.get_point_type_index(self.version, self.ontology_graph)
+
+        # Get all 'points' that have a 'equipRef' tag, and their tags, in one pass over each predicate
+        tags_by_point = {s: set() for s in data_graph.subjects(phiot["equipRef"], None)}
+        for s, o in data_graph.subject_objects(ph["hasTag"]):
+            if s in tags_by_point:
+                tags_by_point[s].add(o[o.find('#') + 1:])
+
+        # now determine first class point types
+        point_types = index.classify_all(tags_by_point)
+        logger.info("Determined first class point types for %d points", len(point_types))
+
+        if add_types:
             # add first class point type as class to the point
-            data_graph.add((s, RDF.type, ph_versioned_ns_dict[self.version]['phiot'][fc_point.type]))
+            data_graph.addN((s, RDF.type, phiot[point_type], data_graph) for s, point_type in point_types.items())
+
             # remove the tags associated with first class point
-            for tag in fc_point.tags:
-                # using all three namespaces because i do not know which is correct
-                # TODO: develop method for determining proper namespace
-                data_graph.remove((s, ph_versioned_ns_dict[self.version]['ph']["hasTag"], ph_versioned_ns_dict[self.version]['phiot'][tag]))
-                data_graph.remove((s, ph_versioned_ns_dict[self.version]['ph']["hasTag"], ph_versioned_ns_dict[self.version]['phscience'][tag]))
-                data_graph.remove((s, ph_versioned_ns_dict[self.version]['ph']["hasTag"], ph_versioned_ns_dict[self.version]['ph'][tag]))
+            for s, point_type in point_types.items():
+                for tag in pm.split_type_into_tags(point_type):
+                    # using all three namespaces because i do not know which is correct
+                    # TODO: develop method for determining proper namespace
+                    data_graph.remove((s, ph["hasTag"], phiot[tag]))
+                    data_graph.remove((s, ph["hasTag"], phscience[tag]))
+                    data_graph.remove((s, ph["hasTag"], ph[tag]))
+
+        return {s: phiot[point_type] for s, point_type in point_types.items()}
 
     def add_target_nodes(self, shapes_graph, target_node, shape_name):
         """
@@ -220,14 +289,19 @@ class SkysparkGraphProcessor:
         for s, p, o in shapes_graph.triples((shape_name, SH.node, None)):
             shapes_graph.add((o, SH.targetNode, target_node))
 
-    def get_data_graph(self, data_graph_filename):
+    def get_data_graph(self, data_graph_filename, raw=False):
         """
         This method generates and returns a cleaned and processed data graph given a file input that contains the instance data.
         The data graph can then be used with the pySHACL validate method.
 
         :param data_graph_filename: the filepath/filename of the raw instance data file from which to generate the data graph
+        :param raw: whether the file is a raw SkySpark turtle file, which is then cleaned while parsing (see
+            parse_raw_skyspark_turtle) instead of requiring clean_raw_skyspark_turtle to be run first
         """
-        data_graph = helpers.parse_file_to_graph(data_graph_filename, self.schema, self.version)
+        if raw:
+            data_graph = self.parse_raw_skyspark_turtle(data_graph_filename)
+        else:
+            data_graph = helpers.parse_file_to_graph(data_graph_filename, self.schema, self.version)
         self.remove_invalid_tags(data_graph)
         self.add_first_class_point_types(data_graph)
         return data_graph
@@ -238,11 +312,14 @@ class SkysparkGraphProcessor:
         'target_node' as a target node to the given 'shape_name' in the SHACL definition. The shapes graph can then be used with
         the pySHACL validate method.
 
+        The shapes file is only parsed once, and the target nodes are added to an overlay of the shared shapes graph
+        (see ShapesOverlay), so the shapes graph can be requested for every equipment without re-parsing it.
+
         :param shapes_graph_filename: the filepath/filename of the SHACL shapes definitions from which to generate the shapes graph
         :param target_node: the the sample equipment (as a URI) to be validated
         :param shape_name: the SHACL equipment shape (as a URI) against which to validate the sample equipment
         """
-        shapes_graph = helpers.parse_file_to_graph(shapes_graph_filename, self.schema, self.version)
+        shapes_graph = ShapesOverlay(load_frozen_shapes_file(shapes_graph_filename))
         self.add_target_nodes(shapes_graph, target_node, shape_name)
         return shapes_graph
 
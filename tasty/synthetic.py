@@ -0,0 +1,215 @@
+import logging
+import random
+from typing import Dict, List, TextIO, Tuple, Union
+
+from rdflib import Namespace, RDF, URIRef
+
+import tasty.constants as tc
+import tasty.exceptions as te
+import tasty.graphs as tg
+from tasty.entities import CompositeShape, HaystackRefDefs, ShapesWrapper, SimpleShape
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AHU_SHAPES = ['NREL-AHU-VAV-MZ-Mixed-HW-CHW-Shape']
+DEFAULT_VAV_SHAPES = ['NREL-VAV-SD-HW-Reheat-Shape', 'NREL-VAV-SD-Elec-Reheat-Shape', 'NREL-VAV-SD-Cooling-Only-Shape']
+DEFAULT_METER_SHAPES = ['NREL-Natural-Gas-Meter-Shape']
+
+# (name of the point shape, type, tags) of a point
+PointTemplate = Tuple[str, URIRef, List[URIRef]]
+
+
+class SyntheticSiteGenerator:
+    """
+    Generate synthetic sites for scale testing from the composite (equipment) shapes, as bound by a ShapesWrapper.
+    Each equipment gets the points of the simple shapes its composite shape requires (and optionally, the optional
+    ones), named as SimpleShape.apply names them, i.e. urn:sample/AHU-01-SupplyFanRunCommandShape. Defects are
+    introduced in a controlled way: a point misses one of its tags with probability missing_tag_rate, and has one
+    extra tag (taken from the other point shapes) with probability extra_tag_rate.
+
+    The point templates of each composite shape are resolved once, and entities are written as N-Triples as soon as
+    they are generated, so sites of millions of triples can be generated without building a graph.
+    """
+
+    def __init__(self, schema: str = tc.HAYSTACK, version: str = tc.V3_9_10, missing_tag_rate: float = 0.0,
+                 extra_tag_rate: float = 0.0, optional_points: bool = True, seed: int = None):
+        """
+        :param schema: the schema of the shapes, only Haystack is supported
+        :param version: the version of the schema
+        :param missing_tag_rate: the probability for a point to miss one of its tags
+        :param extra_tag_rate: the probability for a point to have one extra tag
+        :param optional_points: whether to add the optional points of the composite shapes
+        :param seed: seed of the random generator, for reproducible sites
+        """
+        if schema != tc.HAYSTACK:
+            raise te.TastyError(f"Synthetic sites can only be generated for {tc.HAYSTACK}")
+        self.schema = schema
+        self.version = version
+        self.missing_tag_rate = missing_tag_rate
+        self.extra_tag_rate = extra_tag_rate
+        self.optional_points = optional_points
+        self.random = random.Random(seed)
+
+        self.shapes = ShapesWrapper(schema, version)
+        self.shapes.bind()
+        self.shapes.bind_composite()
+        refs = HaystackRefDefs(version)
+        refs.bind()
+        self.equip_ref = refs.equipRef._type_uri
+        self.site_ref = refs.siteRef._type_uri
+        self.air_ref = refs.airRef._type_uri
+        self.has_tag = Namespace(f"https://project-haystack.org/def/ph/{version}#").hasTag
+        self.site_type = self._get_namespaced_term('site')
+
+        self._templates: Dict[str, List[PointTemplate]] = {}
+        self._simple_templates: Dict[str, PointTemplate] = {}
+        self._tag_vocabulary: List[URIRef] = []
+
+    def get_composite_shape(self, name: str) -> CompositeShape:
+        """
+        :param name: the name of a composite shape, i.e. 'NREL-VAV-SD-HW-Reheat-Shape'
+        :return: the composite shape bound by the ShapesWrapper
+        """
+        shape = getattr(self.shapes, name.replace('-', '_'), None)
+        if not isinstance(shape, CompositeShape):
+            raise te.TastyError(f"No composite shape found for: {name}")
+        return shape
+
+    def get_point_templates(self, name: str) -> List[PointTemplate]:
+        """
+        Resolve the points an equipment needs to conform to a composite shape, following its shape mixins.
+
+        :param name: the name of a composite shape
+        :return: the templates of the points, in the order of the shapes
+        """
+        if name not in self._templates:
+            shape = self.get_composite_shape(name)
+            templates = {}
+            for simple_shape in self._flatten(shape, set()):
+                if simple_shape.name not in templates:
+                    templates[simple_shape.name] = self._get_simple_template(simple_shape)
+            self._templates[name] = list(templates.values())
+        return self._templates[name]
+
+    def _flatten(self, shape: Union[SimpleShape, CompositeShape], seen: set) -> List[SimpleShape]:
+        if isinstance(shape, SimpleShape):
+            return [shape]
+        if shape.name in seen:
+            return []
+        seen.add(shape.name)
+        shapes = list(shape.required_shapes or [])
+        if self.optional_points:
+            shapes.extend(shape.optional_shapes or [])
+        shapes.extend(shape.shape_mixins or [])
+        return [simple for s in shapes for simple in self._flatten(s, seen)]
+
+    def _get_simple_template(self, shape: SimpleShape) -> PointTemplate:
+        if shape.name not in self._simple_templates:
+            # resolve the tags as EntityType.add_tags does, without querying the ontology for each shape
+            tags = set()
+            for tag in (shape.tags or []) + (shape.tags_custom or []):
+                tags.add(self._get_namespaced_term(tag) or tc.PH_CUSTOM[tag])
+            tags = sorted(tags)
+            self._simple_templates[shape.name] = (shape.name, URIRef(shape.type), tags)
+            self._tag_vocabulary = sorted(set(self._tag_vocabulary).union(tags))
+        return self._simple_templates[shape.name]
+
+    def _get_namespaced_term(self, term: str) -> Union[URIRef, bool]:
+        return tg.get_namespaced_term(self.shapes.sg.ontology, term, self.shapes.subjects)
+
+    def write_site(self, output: TextIO, namespace: Union[str, Namespace] = 'urn:sample/', site_id: str = 'Site-01',
+                   num_ahus: int = 1, num_vavs: int = 10, num_meters: int = 1, points_per_equip: int = None,
+                   ahu_shapes: List[str] = None, vav_shapes: List[str] = None,
+                   meter_shapes: List[str] = None) -> Dict[str, int]:
+        """
+        Write a site as N-Triples. Every equipment references the site with a siteRef, and VAVs are supplied by the
+        AHUs in turn (airRef). The equipment of each kind cycle through their composite shapes.
+
+        :param output: the file object to write the N-Triples to
+        :param namespace: the namespace of the entities
+        :param site_id: the id of the site
+        :param num_ahus: the number of AHUs
+        :param num_vavs: the number of VAVs
+        :param num_meters: the number of meters
+        :param points_per_equip: the maximum number of points of each equipment, all points of its shape if None
+        :param ahu_shapes: the composite shapes of the AHUs, see DEFAULT_AHU_SHAPES
+        :param vav_shapes: the composite shapes of the VAVs, see DEFAULT_VAV_SHAPES
+        :param meter_shapes: the composite shapes of the meters, see DEFAULT_METER_SHAPES
+        :return: counts of the generated 'equips', 'points', 'triples', 'missing_tags' and 'extra_tags'
+        """
+        namespace = Namespace(str(namespace))
+        stats = {'equips': 0, 'points': 0, 'triples': 0, 'missing_tags': 0, 'extra_tags': 0}
+        site = namespace[site_id]
+        stats['triples'] += self._write(output, [(site, RDF.type, self.site_type)])
+
+        equipment = [
+            ('AHU', num_ahus, ahu_shapes or DEFAULT_AHU_SHAPES),
+            ('VAV', num_vavs, vav_shapes or DEFAULT_VAV_SHAPES),
+            ('Meter', num_meters, meter_shapes or DEFAULT_METER_SHAPES),
+        ]
+        ahus = []
+        for kind, count, shape_names in equipment:
+            width = len(str(count))
+            for i in range(count):
+                shape_name = shape_names[i % len(shape_names)]
+                equip = namespace[f"{kind}-{i + 1:0{width}d}"]
+                triples = [
+                    (equip, RDF.type, URIRef(self.get_composite_shape(shape_name).type)),
+                    (equip, self.site_ref, site),
+                ]
+                if kind == 'AHU':
+                    ahus.append(equip)
+                elif kind == 'VAV' and ahus:
+                    triples.append((equip, self.air_ref, ahus[i % len(ahus)]))
+                templates = self.get_point_templates(shape_name)[:points_per_equip]
+                for template in templates:
+                    triples.extend(self._point_triples(namespace, equip, template, stats))
+                stats['equips'] += 1
+                stats['points'] += len(templates)
+                stats['triples'] += self._write(output, triples)
+        return stats
+
+    def _point_triples(self, namespace: Namespace, equip: URIRef, template: PointTemplate,
+                       stats: Dict[str, int]) -> List[Tuple]:
+        name, point_type, template_tags = template
+        point = namespace[f"{equip[len(namespace):]}-{name}"]
+        tags = list(template_tags)
+        if tags and self.random.random() < self.missing_tag_rate:
+            tags.pop(self.random.randrange(len(tags)))
+            stats['missing_tags'] += 1
+        if self.random.random() < self.extra_tag_rate:
+            # the missing tag is not added back as an extra tag
+            extra = [tag for tag in self._tag_vocabulary if tag not in template_tags]
+            if extra:
+                tags.append(self.random.choice(extra))
+                stats['extra_tags'] += 1
+        triples = [(point, RDF.type, point_type), (point, self.equip_ref, equip)]
+        triples.extend((point, self.has_tag, tag) for tag in tags)
+        return triples
+
+    @staticmethod
+    def _write(output: TextIO, triples: List[Tuple]) -> int:
+        output.writelines(f"{s.n3()} {p.n3()} {o.n3()} .\n" for s, p, o in triples)
+        return len(triples)
+
+
+def generate_site(filename: str, schema: str = tc.HAYSTACK, version: str = tc.V3_9_10, missing_tag_rate: float = 0.0,
+                  extra_tag_rate: float = 0.0, seed: int = None, **kwargs) -> Dict[str, int]:
+    """
+    Write a synthetic site to an N-Triples file, see SyntheticSiteGenerator.
+
+    :param filename: the N-Triples file to write
+    :param schema: the schema of the shapes
+    :param version: the version of the schema
+    :param missing_tag_rate: the probability for a point to miss one of its tags
+    :param extra_tag_rate: the probability for a point to have one extra tag
+    :param seed: seed of the random generator
+    :param kwargs: passed to SyntheticSiteGenerator.write_site, i.e. num_ahus, num_vavs
+    :return: see SyntheticSiteGenerator.write_site
+    """
+    generator = SyntheticSiteGenerator(schema, version, missing_tag_rate, extra_tag_rate, seed=seed)
+    with open(filename, 'w', encoding='utf-8') as f:
+        stats = generator.write_site(f, **kwargs)
+    logger.info("Generated %d equips and %d points (%d triples), written to %s", stats['equips'], stats['points'],
+                stats['triples'], filename)
+    return stats
@@ -1,3 +1,4 @@
+import logging
 import os
 from itertools import permutations
 from copy import deepcopy
@@ -10,11 +11,13 @@ import json
 import jsonschema
 from jsonschema import validate
 from rdflib import Graph, Namespace, RDF, OWL, RDFS, SKOS, SH, XMLNS, XSD
-import time
 
 import tasty.graphs as tg
 import tasty.constants as tc
 import tasty.exceptions as te
+from tasty.profiling import span
+
+logger = logging.getLogger(__name__)
 
 
 # TODO: consider renaming - maybe this isn't as similar to a Template as the others
@@ -35,7 +38,7 @@ class EntityTemplate:
         """
         equivalent = cls.get_equivalent(entity_classes, schema_name, schema_version, typing_properties, properties)
         if equivalent:
-            print(f"{__name__}.{__class__.__name__} Equivalent EntityTemplate already exists and was returned.")
+            logger.debug("Equivalent EntityTemplate already exists and was returned.")
             return equivalent
         else:
             return super().__new__(cls)
@@ -51,7 +54,8 @@ class EntityTemplate:
         self.is_valid = False
         self.validate_data()
         if self.is_valid:
-            print(f"{__name__}.{__class__.__name__} created and is valid: {self.schema_name}, {self.schema_version}, {self.get_simple_classes()}")
+            logger.debug("EntityTemplate created and is valid: %s, %s, %s", self.schema_name, self.schema_version,
+                         self.get_simple_classes())
             self.register_template(self)
 
     @classmethod
@@ -284,8 +288,8 @@ class BaseTemplate:
             self._description = self._template.get('description', '')  # str
             self._telemetry_points = self._template.get('telemetry_point_types', {})  # dict (yaml object)
         else:
-            print(
-                "[tasty.templates.BaseTemplate] Template is not valid. Template basics not populated, nor is template registered to instances.")
+            logger.warning("Template is not valid. Template basics not populated, nor is template registered to "
+                           "instances.")
 
 
 class EquipmentTemplate(BaseTemplate):
@@ -369,8 +373,8 @@ class EquipmentTemplate(BaseTemplate):
                                                                                      self._schema_name,
                                                                                      self._schema_version)
                 if len(available_pgts) == 0:
-                    print(
-                        f"[tasty.templates.EquipmentTemplate] No PointGroupTemplate found for {self._schema_name}, {self._schema_version}, {point_type_or_symbol}. Make sure PGTs have been loaded")
+                    logger.warning("No PointGroupTemplate found for %s, %s, %s. Make sure PGTs have been loaded",
+                                   self._schema_name, self._schema_version, point_type_or_symbol)
                 elif len(available_pgts) > 1:
                     te.TastyError(
                         f"""Multiple PointGroupTemplates with: symbol ({point_type_or_symbol}),
@@ -380,7 +384,7 @@ class EquipmentTemplate(BaseTemplate):
                     )
                 else:
                     pgt = available_pgts[0]
-                    print(f"[tasty.templates.EquipmentTemplate] Found PointGroupTemplate with id: {pgt._id}")
+                    logger.debug("Found PointGroupTemplate with id: %s", pgt._id)
                     self.point_group_templates.add(pgt)
             elif isinstance(data, dict):
                 et = resolve_to_entity_template(ont, point_type_or_symbol, data, self._schema_name,
@@ -389,7 +393,7 @@ class EquipmentTemplate(BaseTemplate):
                     self.telemetry_point_entity_templates.add(et)
         total_to_resolve = len(self.telemetry_point_entity_templates) + len(self.point_group_templates)
         if total_to_resolve == len(self._telemetry_points):
-            print(f"[tasty.templates.EquipmentTemplate] Fully Resolved")
+            logger.debug("EquipmentTemplate %s fully resolved", self._id)
             self.fully_resolved = True
 
     def get_all_points_as_entity_templates(self) -> Set[EntityTemplate]:
@@ -508,7 +512,7 @@ class PointGroupTemplate(BaseTemplate):
             with open(file_path, 'w+') as f:
                 yaml.dump(self._template, f)
         else:
-            print("[tasty.templates.PointGroupTemplate] Template is not valid. Will not be written to disk.")
+            logger.warning("PointGroupTemplate is not valid. Will not be written to disk.")
 
 
 def validate_template_against_schema(instance: dict, schema: dict) -> Tuple[bool, str]:
@@ -577,8 +581,8 @@ def resolve_to_entity_template(ont, typing_metadata, properties, schema_name, ve
     if schema_name == 'Haystack':
         structured_terms = hget_entity_classes(ont, ns_terms)
         if len(structured_terms['properties']) > 0:
-            print(
-                f"[tasty.templates.resolve_to_entity_template] The following properties were found but will not be used: {structured_terms['properties']}.")
+            logger.debug("The following properties were found but will not be used: %s.",
+                         structured_terms['properties'])
         et = EntityTemplate(structured_terms['classes'], schema_name, version, structured_terms['markers'], ns_properties)
     elif schema_name == 'Brick':
         et = EntityTemplate(ns_terms, schema_name, version, set(), ns_properties)
@@ -662,18 +666,16 @@ def hget_entity_classes(ontology, candidates):
     classes = set()
     only_terms = set([t for ns, t in candidates])
     added_candidates = set()
-    st = time.time()
-    for n in range(1, len(candidates) + 1):
-        perm = list(permutations(only_terms, n))
-        for p in perm:
-            new_candidate = '-'.join(p)
-            for ns in namespaces:
-                if ns[new_candidate] in current_subclasses:
-                    classes.add((ns, new_candidate))
-                    for each_term_used in p:
-                        added_candidates.add(each_term_used)
-    total_time = time.time() - st
-    print(f"[tasty.templates.hget_entity_classes] Permutation time: {total_time:.2f} seconds")
+    with span('hget_entity_classes.permutations', candidates=len(candidates)):
+        for n in range(1, len(candidates) + 1):
+            perm = list(permutations(only_terms, n))
+            for p in perm:
+                new_candidate = '-'.join(p)
+                for ns in namespaces:
+                    if ns[new_candidate] in current_subclasses:
+                        classes.add((ns, new_candidate))
+                        for each_term_used in p:
+                            added_candidates.add(each_term_used)
     # This logic figures out which terms were not used in
     # the classes and separates those out.
     not_classes = only_terms - added_candidates
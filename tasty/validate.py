@@ -1,92 +1,144 @@
+import logging
 import os
+from typing import Dict, List, Tuple, Union
 
-import rdflib
-from rdflib import Graph, SH
-from rdflib.util import guess_format
-from pyshacl import validate
+import numpy as np
 import pandas as pd
+from rdflib import Graph, Namespace, SH, URIRef
+from rdflib.util import guess_format
 
 import tasty.constants as tc
 import tasty.graphs as tg
+from tasty.profiling import span
 from tasty.shapes_loader import ShapesLoader
+from tasty.validation_engines import PyshaclEngine, get_engine
+from tasty.validation_report import ValidationReport
+
+logger = logging.getLogger(__name__)
 
 tasty_dir = os.path.dirname(__file__)
 
 
-def pretty_print_errors(results_graph: Graph) -> None:
+def pretty_print_errors(results_graph: Union[Graph, ValidationReport]) -> None:
     """
-    Print out errors (sh:Violation) vs. warnings (sh:Warning) given a results graph.
-    Grabs the focus node (i.e. what the error fired on) and the shape
-    that was fired.
+    Log the number of errors (sh:Violation) vs. warnings (sh:Warning) given a results graph, and at DEBUG level
+    each of them: the focus node (i.e. what the error fired on) and the shape that was fired, i.e. the missing
+    qualified value shape or else the source shape.
 
-    :param results_graph: graph used to generate the output
+    :param results_graph: graph used to generate the output, or a ValidationReport built from it
     :return:
     """
-    q_warn = '''SELECT ?fn ?bad_shape WHERE {
-        ?n a sh:ValidationReport .
-        ?n sh:result ?vr .
-        ?vr sh:focusNode ?fn .
-        ?vr sh:resultSeverity sh:Warning .
-        ?vr sh:sourceShape ?shape .
-        ?shape sh:qualifiedValueShape ?bad_shape .
-    }'''
-    q_error = '''SELECT ?fn ?bad_shape WHERE {
-        ?n a sh:ValidationReport .
-        ?n sh:result ?vr .
-        ?vr sh:focusNode ?fn .
-        ?vr sh:resultSeverity sh:Violation .
-        ?vr sh:sourceShape ?shape .
-        ?shape sh:qualifiedValueShape ?bad_shape .
-    }'''
-    warnings = results_graph.query(q_warn)
-    errors = results_graph.query(q_error)
-    print("-" * 100)
-    print(f"Warnings: {len(warnings)}")
-    for warning in warnings:
-        print(f"Warning on entity: {warning[0]}, triggered by shape: {warning[1]}")
-    print("-" * 100)
-    print(f"Errors: {len(errors)}")
-    for error in errors:
-        print(f"Error on entity: {error[0]}, triggered by shape: {error[1]}")
-    print("-" * 100)
-
-
-def validate_from_csv(data_graph: str, input_file: str) -> None:
+    report = results_graph
+    if not isinstance(report, ValidationReport):
+        report = ValidationReport.from_results_graph(results_graph)
+    warnings = report.by_severity('Warning')
+    errors = report.by_severity('Violation')
+    logger.info("Warnings: %d", len(warnings))
+    if logger.isEnabledFor(logging.DEBUG):
+        for fn, shape in zip(warnings['focus_node'], warnings['missing_shape'].fillna(warnings['source_shape'])):
+            logger.debug("Warning on entity: %s, triggered by shape: %s", fn, shape)
+    logger.info("Errors: %d", len(errors))
+    if logger.isEnabledFor(logging.DEBUG):
+        for fn, shape in zip(errors['focus_node'], errors['missing_shape'].fillna(errors['source_shape'])):
+            logger.debug("Error on entity: %s, triggered by shape: %s", fn, shape)
+
+
+def get_shape_namespaces(shapes_graph: Graph) -> Dict[str, Namespace]:
+    """
+    :param shapes_graph: the shapes graph
+    :return: {prefix: namespace} to resolve shape names such as 'nrel:NREL-VAV-SD-HW-Reheat-Shape' with. Prefixes of
+        shape libraries other than core, i.e. 'nrel', are resolved with the bindings of the shapes graph
+    """
+    namespaces = {prefix: Namespace(namespace) for prefix, namespace in shapes_graph.namespaces()}
+    namespaces.update(tc.namespace_map)
+    return namespaces
+
+
+def add_targets_from_csv(shapes_graph: Graph, data_graph: Graph, input_file: str) -> List[Tuple]:
+    """
+    Given a csv as generated by generate_input_file, add an sh:targetNode triple to the shapes graph
+    for each cell marked with an 'X'. The marked cells are found in one vectorized pass over the csv,
+    and entities that are not a subject in the data graph are skipped (and reported).
+
+    :param shapes_graph: the shapes graph to add the sh:targetNode triples to, i.e. a ShapesOverlay
+    :param data_graph: the data graph the entity ids should exist in
+    :param input_file: path to the input csv file
+    :return: the added (shape, sh:targetNode, entity) triples
+    """
+    data = pd.read_csv(input_file, index_col='entity-id', dtype=str, na_filter=False)
+    shape_columns = [col for col in data.columns if ':' in col]
+    rows, cols = np.nonzero(data[shape_columns].to_numpy() == 'X')
+
+    namespaces = get_shape_namespaces(shapes_graph)
+    shapes = {}
+    for col in np.unique(cols):
+        str_ns, shape_name = shape_columns[col].split(':')
+        shapes[col] = namespaces[str_ns][shape_name]
+
+    subjects = set(data_graph.subjects())
+    entities = {row: URIRef(data.index[row]) for row in np.unique(rows)}
+    target_node = SH.targetNode
+    targets = []
+    missing = set()
+    for row, col in zip(rows, cols):
+        entity = entities[row]
+        if entity in subjects:
+            targets.append((shapes[col], target_node, entity))
+        else:
+            missing.add(entity)
+
+    shapes_graph.addN((s, p, o, shapes_graph) for s, p, o in targets)
+    if missing:
+        logger.warning("%d entities of the input file do not exist in the data graph", len(missing))
+        if logger.isEnabledFor(logging.DEBUG):
+            for entity in sorted(missing):
+                logger.debug("Entity does not exist: %s", entity)
+    num_entities = len(set(entity for _, _, entity in targets))
+    logger.info("Targeted %d entities with %d shapes (%d targets)", num_entities, len(shapes), len(targets))
+    return targets
+
+
+def validate_from_csv(data_graph: str, input_file: str, engine: str = PyshaclEngine.name) -> None:
     """
     Given a csv as generated by generate_input_file, add the marked entities as target nodes
     for the specific shapes and run through a SHACL validator. Merges all ttl files from
-    tasty/generated_shapes into a single graph for simplicity.
+    tasty/generated_shapes into a single graph for simplicity. Instead of passing the ontology to the
+    validator, the data graph is expanded with the superclasses of its types (see tg.load_closure).
 
     :param data_graph: path to a data graph to load
     :param input_file: path to the input csv file
+    :param engine: the name of the validation engine to use, see tasty.validation_engines.ENGINES
     :return:
     """
-    sl = ShapesLoader(tc.HAYSTACK)
-    shapes_graph = sl.load_all_shapes()
-    data_graph = Graph().parse(data_graph, format=guess_format(data_graph))
-    data = pd.read_csv(input_file, index_col='entity-id', true_values='X').fillna(value=False)
-    for entity_id, vals in data.iterrows():
-        for shape_name, val in vals.iteritems():
-            if val is True:
-                if rdflib.term.URIRef(entity_id) not in data_graph.subjects():
-                    print(f"Entity does not exist: {entity_id}")
-                else:
-                    str_ns, shape_name = shape_name.split(':')
-                    ns = tc.namespace_map[str_ns]
-                    print(f"Targeting entity {entity_id} with shape {shape_name}")
-                    shapes_graph.add((ns[shape_name], SH.targetNode, rdflib.term.URIRef(entity_id)))
+    validation_engine = get_engine(engine)
+    with span('load_shapes') as s:
+        sl = ShapesLoader(tc.HAYSTACK)
+        shapes_graph = sl.load_shapes_with_targets()
+        s.set(triples=len(shapes_graph))
+    with span('load_data_graph', file=os.path.basename(data_graph)) as s:
+        data_graph = Graph().parse(data_graph, format=guess_format(data_graph))
+        s.set(triples=len(data_graph))
+    with span('add_targets') as s:
+        s.set(targets=len(add_targets_from_csv(shapes_graph, data_graph, input_file)))
 
     shapes_graph_output_file = 'shapes.ttl'
-    shapes_graph.serialize(shapes_graph_output_file, format='turtle')
-    ont_graph = tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+    with span('serialize', file=shapes_graph_output_file):
+        shapes_graph.serialize(shapes_graph_output_file, format='turtle')
+    tg.load_closure(tc.HAYSTACK, tc.V3_9_10).expand(data_graph)
 
-    conforms, results_graph, results = validate(data_graph, shacl_graph=shapes_graph, ont_graph=ont_graph)
+    with span('shacl_evaluation', engine=validation_engine.name) as s:
+        conforms, results_graph, results = validation_engine.validate(data_graph, shapes_graph)
+        s.set(triples=len(data_graph), results=len(set(results_graph.subjects(SH.resultSeverity, None))))
     output_file_name = f"results.ttl"
 
-    results_graph.serialize(output_file_name, format='turtle')
+    with span('serialize', file=output_file_name):
+        results_graph.serialize(output_file_name, format='turtle')
+        report = ValidationReport.from_results_graph(results_graph)
+        report_file_name = f"results.json"
+        report.to_json(report_file_name)
     if not conforms:
-        pretty_print_errors(results_graph)
+        pretty_print_errors(report)
 
-    print(f"Validation report saved at: {output_file_name}")
-    print(f"Copy of shapes graph saved at: {shapes_graph_output_file}")
-    print("-" * 100)
+    logger.info("Validation report saved at: %s", output_file_name)
+    logger.info("Structured validation report saved at: %s", report_file_name)
+    logger.info("Copy of shapes graph saved at: %s", shapes_graph_output_file)
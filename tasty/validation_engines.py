@@ -0,0 +1,416 @@
+import logging
+import weakref
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from rdflib import BNode, Graph, Literal, RDF, SH, URIRef
+
+import tasty.constants as tc
+import tasty.exceptions as te
+from tasty.graphs import OntologyClosure
+from tasty.profiling import Progress
+
+logger = logging.getLogger(__name__)
+
+Node = Union[URIRef, BNode, Literal]
+
+# the constraint parameters the NativeEngine is able to evaluate, anything else is rejected
+NATIVE_PARAMETERS = {
+    SH['class'], SH.hasValue, SH.node, SH.property, SH.path, SH.minCount, SH.maxCount, SH.qualifiedValueShape,
+    SH.qualifiedMinCount, SH.qualifiedMaxCount, SH.qualifiedValueShapesDisjoint, SH.severity, SH.message,
+    SH.deactivated, SH.name, SH.description, SH.targetNode, SH.targetClass, SH.targetSubjectsOf, SH.targetObjectsOf,
+    SH.sparql
+}
+TARGET_PARAMETERS = {SH.targetNode, SH.targetClass, SH.targetSubjectsOf, SH.targetObjectsOf}
+
+# attributes of the SH namespace are URIRefs created on each access, the hot ones are created once
+CLASS_COMPONENT = SH.ClassConstraintComponent
+HAS_VALUE_COMPONENT = SH.HasValueConstraintComponent
+MAX_COUNT_COMPONENT = SH.MaxCountConstraintComponent
+MIN_COUNT_COMPONENT = SH.MinCountConstraintComponent
+NODE_COMPONENT = SH.NodeConstraintComponent
+QUALIFIED_MAX_COUNT_COMPONENT = SH.QualifiedMaxCountConstraintComponent
+QUALIFIED_MIN_COUNT_COMPONENT = SH.QualifiedMinCountConstraintComponent
+SPARQL_COMPONENT = SH.SPARQLConstraintComponent
+
+
+class ValidationEngine:
+    """
+    Base class for the engines validating a data graph against a shapes graph. Each engine returns the same
+    (conforms, results_graph, results_text) tuple as pyshacl.validate, with the results graph using the SHACL
+    report vocabulary, so it can be used with ValidationReport and SkysparkGraphProcessor.determine_missing_points.
+    """
+    name = None
+
+    def validate(self, data_graph: Graph, shapes_graph: Graph, ont_graph: Graph = None) -> Tuple[bool, Graph, str]:
+        """
+        :param data_graph: the data graph to validate
+        :param shapes_graph: the shapes graph (with targets) to validate against
+        :param ont_graph: the ontology of the data graph
+        :return: (conforms, results_graph, results_text)
+        """
+        raise NotImplementedError
+
+
+class PyshaclEngine(ValidationEngine):
+    """Validates with pySHACL, supporting all of SHACL"""
+    name = 'pyshacl'
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: additional arguments for pyshacl.validate, i.e. inference='rdfs'
+        """
+        self.kwargs = kwargs
+
+    def validate(self, data_graph: Graph, shapes_graph: Graph, ont_graph: Graph = None) -> Tuple[bool, Graph, str]:
+        # pyshacl is slow to import, and not needed by the native engine
+        from pyshacl import validate
+
+        return validate(data_graph, shacl_graph=shapes_graph, ont_graph=ont_graph, **self.kwargs)
+
+
+class NativeEngine(ValidationEngine):
+    """
+    Validates the subset of SHACL used by the shapes tasty generates (see ShapesGenerator) directly against the
+    rdflib graphs, without copying the data graph or mixing the ontology into it:
+        - targets: sh:targetNode, sh:targetClass, sh:targetSubjectsOf and sh:targetObjectsOf
+        - node shapes with sh:class, sh:hasValue, sh:node and sh:property
+        - property shapes with a predicate or sh:inversePath sh:path, and sh:minCount, sh:maxCount, sh:class,
+          sh:hasValue, sh:node and sh:qualifiedValueShape / sh:qualifiedMinCount / sh:qualifiedMaxCount /
+          sh:qualifiedValueShapesDisjoint
+        - sh:sparql constraints generated for tag sets (see ShapesGenerator.add_tag_set_constraint), which are
+          evaluated from their tasty:tagSet and tasty:tagPath rather than their query
+    The rdfs:subClassOf closure of the ontology is computed once per engine, and the conformance of each
+    (node, shape) pair is computed once per validation. The compiled shapes are shared by the validations against
+    a ShapesOverlay only adding targets to the same base graph (see ShapesLoader.load_shapes_with_targets).
+    Shapes using any other constraint raise a TastyError.
+    """
+    name = 'native'
+
+    def __init__(self, ont_graph: Graph = None):
+        """
+        :param ont_graph: the ontology to compute the class closure from. If not provided, the ontology passed to
+            validate is used
+        """
+        self._closure = OntologyClosure({}, {})
+        self._ont_graph = None
+        # base shapes graph: compiled shapes, see get_compiled
+        self._shared_compiled: 'weakref.WeakKeyDictionary[Graph, Dict[Node, dict]]' = weakref.WeakKeyDictionary()
+        if ont_graph is not None:
+            self._compute_closure(ont_graph)
+
+    def _compute_closure(self, ont_graph: Graph) -> None:
+        self._closure = OntologyClosure.from_ontology(ont_graph)
+        self._ont_graph = ont_graph
+
+    def get_superclasses(self, cls: URIRef) -> Set[URIRef]:
+        """
+        :param cls: a class
+        :return: the class and all of its (transitive) superclasses in the ontology
+        """
+        return self._closure.get_superclasses(cls)
+
+    def get_compiled(self, shapes_graph: Graph) -> Dict[Node, dict]:
+        """
+        :param shapes_graph: the shapes graph of a validation
+        :return: the cache of the compiled shapes, shared with previous validations if the shapes graph is a
+            ShapesOverlay whose overlay only holds targets, since targets are not part of the compiled shapes
+        """
+        base_graphs = getattr(shapes_graph, 'base_graphs', None)
+        overlay = getattr(shapes_graph, 'overlay', None)
+        if base_graphs is None or len(base_graphs) != 1 or not TARGET_PARAMETERS.issuperset(overlay.predicates()):
+            return {}
+        compiled = self._shared_compiled.get(base_graphs[0])
+        if compiled is None:
+            compiled = self._shared_compiled.setdefault(base_graphs[0], {})
+        return compiled
+
+    def validate(self, data_graph: Graph, shapes_graph: Graph, ont_graph: Graph = None) -> Tuple[bool, Graph, str]:
+        if ont_graph is not None and ont_graph is not self._ont_graph:
+            self._compute_closure(ont_graph)
+        run = _NativeRun(self, data_graph, shapes_graph, self.get_compiled(shapes_graph))
+        return run.validate()
+
+
+class _NativeRun:
+    """The state of a single NativeEngine validation"""
+
+    def __init__(self, engine: NativeEngine, data_graph: Graph, shapes_graph: Graph,
+                 compiled: Dict[Node, dict] = None):
+        self.engine = engine
+        self.data = data_graph
+        self.shapes = shapes_graph
+        self._compiled: Dict[Node, dict] = compiled if compiled is not None else {}
+        self._conforms: Dict[Tuple[Node, Node], bool] = {}
+        self._types: Dict[Node, Set[URIRef]] = {}
+        self._values: Dict[Tuple[Node, URIRef, bool], Set[Node]] = {}
+
+    # -- Shapes
+
+    def compile(self, shape: Node) -> dict:
+        """Read the constraints of a shape from the shapes graph, once per shape"""
+        compiled = self._compiled.get(shape)
+        if compiled is not None:
+            return compiled
+        params: Dict[URIRef, List[Node]] = {}
+        for p, o in self.shapes.predicate_objects(shape):
+            if p == RDF.type:
+                continue
+            if p not in NATIVE_PARAMETERS:
+                raise te.TastyError(f"The native engine does not support {p} (on shape {shape}), use pyshacl instead")
+            params.setdefault(p, []).append(o)
+
+        def one(p, default=None):
+            return params[p][0] if p in params else default
+
+        compiled = {
+            'deactivated': bool(one(SH.deactivated, Literal(False)).toPython()),
+            'severity': one(SH.severity, SH.Violation),
+            'message': params.get(SH.message, []),
+            'classes': params.get(SH['class'], []),
+            'has_values': params.get(SH.hasValue, []),
+            'nodes': params.get(SH.node, []),
+            'properties': params.get(SH.property, []),
+            'tag_sets': [self._compile_tag_set(sparql, shape) for sparql in params.get(SH.sparql, [])],
+            'path': None,
+        }
+        path = one(SH.path)
+        if path is not None:
+            compiled['path'] = self._compile_path(path, shape)
+            compiled['min_count'] = _to_int(one(SH.minCount))
+            compiled['max_count'] = _to_int(one(SH.maxCount))
+            compiled['qualified_shape'] = one(SH.qualifiedValueShape)
+            compiled['qualified_min_count'] = _to_int(one(SH.qualifiedMinCount))
+            compiled['qualified_max_count'] = _to_int(one(SH.qualifiedMaxCount))
+            compiled['disjoint'] = bool(one(SH.qualifiedValueShapesDisjoint, Literal(False)).toPython())
+            compiled['siblings'] = self.siblings(shape, compiled['qualified_shape']) if compiled['disjoint'] else ()
+        self._compiled[shape] = compiled
+        return compiled
+
+    def _compile_tag_set(self, sparql: Node, shape: Node) -> dict:
+        path = self.shapes.value(sparql, tc.TASTY.tagPath)
+        if path is None:
+            raise te.TastyError(f"The native engine only supports SPARQL constraints of tag sets (on shape {shape}), "
+                                f"use pyshacl instead")
+        return {
+            'node': sparql,
+            'path': path,
+            'tags': set(self.shapes.objects(sparql, tc.TASTY.tagSet)),
+            'message': list(self.shapes.objects(sparql, SH.message)),
+            'deactivated': bool(self.shapes.value(sparql, SH.deactivated, default=Literal(False)).toPython()),
+        }
+
+    def _compile_path(self, path: Node, shape: Node) -> Tuple[URIRef, bool]:
+        if isinstance(path, URIRef):
+            return path, False
+        inverse = self.shapes.value(path, SH.inversePath)
+        if isinstance(inverse, URIRef):
+            return inverse, True
+        raise te.TastyError(f"The native engine only supports predicate and inverse paths (on shape {shape})")
+
+    def siblings(self, property_shape: Node, qualified_shape: Node) -> Set[Node]:
+        """The sibling shapes of a qualified value shape, see sh:qualifiedValueShapesDisjoint"""
+        siblings = set()
+        for parent in self.shapes.subjects(SH.property, property_shape):
+            for sibling_property in self.shapes.objects(parent, SH.property):
+                for sibling in self.shapes.objects(sibling_property, SH.qualifiedValueShape):
+                    if sibling != qualified_shape:
+                        siblings.add(sibling)
+        return siblings
+
+    # -- Data
+
+    def types(self, node: Node) -> Set[URIRef]:
+        """All classes a node is a SHACL instance of"""
+        types = self._types.get(node)
+        if types is None:
+            types = set()
+            for t in self.data.objects(node, RDF.type):
+                types |= self.engine.get_superclasses(t)
+            self._types[node] = types
+        return types
+
+    def values(self, node: Node, path: Tuple[URIRef, bool]) -> Set[Node]:
+        key = (node, path[0], path[1])
+        values = self._values.get(key)
+        if values is None:
+            if path[1]:
+                values = set(self.data.subjects(path[0], node))
+            else:
+                values = set(self.data.objects(node, path[0]))
+            self._values[key] = values
+        return values
+
+    def focus_nodes(self, shape: Node) -> Set[Node]:
+        focus = set(self.shapes.objects(shape, SH.targetNode))
+        for cls in self.shapes.objects(shape, SH.targetClass):
+            for s, t in self.data.subject_objects(RDF.type):
+                if cls in self.engine.get_superclasses(t):
+                    focus.add(s)
+        for p in self.shapes.objects(shape, SH.targetSubjectsOf):
+            focus.update(self.data.subjects(p, None))
+        for p in self.shapes.objects(shape, SH.targetObjectsOf):
+            focus.update(self.data.objects(None, p))
+        return focus
+
+    # -- Evaluation
+
+    def conforms(self, node: Node, shape: Node) -> bool:
+        """Whether a node conforms to a shape, without reporting results"""
+        key = (node, shape)
+        result = self._conforms.get(key)
+        if result is None:
+            # guard against recursive shapes
+            self._conforms[key] = True
+            result = not any(True for _ in self.evaluate(node, shape))
+            self._conforms[key] = result
+        return result
+
+    def evaluate(self, focus: Node, shape: Node) -> Iterable[dict]:
+        """Yield a result (as a dict) for each constraint of the shape the focus node does not satisfy"""
+        compiled = self.compile(shape)
+        if compiled['deactivated']:
+            return
+        path = compiled['path']
+        value_nodes = self.values(focus, path) if path is not None else {focus}
+
+        def result(component, value=None, message=None):
+            return {'focus': focus, 'shape': shape, 'component': component, 'path': path, 'value': value,
+                    'severity': compiled['severity'], 'message': compiled['message'] or [Literal(message)]}
+
+        for cls in compiled['classes']:
+            for value in value_nodes:
+                if cls not in self.types(value):
+                    yield result(CLASS_COMPONENT, value, f"Value does not have class {cls}")
+        for has_value in compiled['has_values']:
+            if has_value not in value_nodes:
+                yield result(HAS_VALUE_COMPONENT, message=f"Value {has_value} not present")
+        for node_shape in compiled['nodes']:
+            for value in value_nodes:
+                if not self.conforms(value, node_shape):
+                    yield result(NODE_COMPONENT, value, f"Value does not conform to Shape {node_shape}")
+        for property_shape in compiled['properties']:
+            for value in value_nodes:
+                yield from self.evaluate(value, property_shape)
+        for tag_set in compiled['tag_sets']:
+            if tag_set['deactivated']:
+                continue
+            for value in value_nodes:
+                for tag in tag_set['tags'] - self.values(value, (tag_set['path'], False)):
+                    tag_result = result(SPARQL_COMPONENT, tag)
+                    tag_result.update({
+                        'focus': value,
+                        'constraint': tag_set['node'],
+                        'result_path': tag_set['path'],
+                        'message': [Literal(str(m).replace('{?value}', str(tag))) for m in tag_set['message']] or
+                                   [Literal(f"Missing tag {tag}")],
+                    })
+                    yield tag_result
+        if path is None:
+            return
+
+        count = len(value_nodes)
+        if compiled['min_count'] is not None and count < compiled['min_count']:
+            yield result(MIN_COUNT_COMPONENT, message=f"Less than {compiled['min_count']} values")
+        if compiled['max_count'] is not None and count > compiled['max_count']:
+            yield result(MAX_COUNT_COMPONENT, message=f"More than {compiled['max_count']} values")
+
+        qualified_shape = compiled['qualified_shape']
+        if qualified_shape is not None:
+            siblings = compiled['siblings']
+            conforming = sum(1 for value in value_nodes if self.conforms(value, qualified_shape) and
+                             not any(self.conforms(value, sibling) for sibling in siblings))
+            min_count, max_count = compiled['qualified_min_count'], compiled['qualified_max_count']
+            if min_count is not None and conforming < min_count:
+                yield result(QUALIFIED_MIN_COUNT_COMPONENT,
+                             message=f"Focus node does not conform to shape {qualified_shape} at least {min_count} times")
+            if max_count is not None and conforming > max_count:
+                yield result(QUALIFIED_MAX_COUNT_COMPONENT,
+                             message=f"Focus node conforms to shape {qualified_shape} more than {max_count} times")
+
+    def validate(self) -> Tuple[bool, Graph, str]:
+        results = []
+        target_shapes = set(self.shapes.subjects(SH.targetNode, None)) | set(self.shapes.subjects(SH.targetClass, None))
+        target_shapes |= set(self.shapes.subjects(SH.targetSubjectsOf, None))
+        target_shapes |= set(self.shapes.subjects(SH.targetObjectsOf, None))
+        progress = Progress(logger, 'Validated target shapes', total=len(target_shapes))
+        for shape in target_shapes:
+            for focus in self.focus_nodes(shape):
+                results.extend(self.evaluate(focus, shape))
+            progress.update()
+        progress.done()
+        conforms = len(results) == 0
+        results_graph = self.build_results_graph(results, conforms)
+        return conforms, results_graph, self.build_results_text(results, conforms)
+
+    # -- Report
+
+    def build_results_graph(self, results: List[dict], conforms: bool) -> Graph:
+        g = Graph()
+        g.bind('sh', SH)
+        for prefix, namespace in self.shapes.namespaces():
+            g.bind(prefix, namespace, override=False)
+        report = BNode()
+        g.add((report, RDF.type, SH.ValidationReport))
+        g.add((report, SH.conforms, Literal(conforms)))
+        copied = set()
+        for r in results:
+            node = BNode()
+            g.add((report, SH.result, node))
+            g.add((node, RDF.type, SH.ValidationResult))
+            g.add((node, SH.focusNode, r['focus']))
+            g.add((node, SH.resultSeverity, r['severity']))
+            g.add((node, SH.sourceConstraintComponent, r['component']))
+            g.add((node, SH.sourceShape, r['shape']))
+            for message in r['message']:
+                g.add((node, SH.resultMessage, message))
+            if r['value'] is not None:
+                g.add((node, SH.value, r['value']))
+            if r.get('constraint') is not None:
+                g.add((node, SH.sourceConstraint, r['constraint']))
+                self._copy_node(g, r['constraint'], copied)
+            if r.get('result_path') is not None:
+                g.add((node, SH.resultPath, r['result_path']))
+            elif r['path'] is not None:
+                path = self.shapes.value(r['shape'], SH.path)
+                g.add((node, SH.resultPath, path))
+                self._copy_node(g, path, copied)
+            self._copy_node(g, r['shape'], copied)
+        return g
+
+    def _copy_node(self, g: Graph, node: Node, copied: Set[Node]) -> None:
+        """Copy the (blank node closure of the) triples of a shape into the results graph, as pySHACL does"""
+        if not isinstance(node, BNode) or node in copied:
+            return
+        copied.add(node)
+        for p, o in self.shapes.predicate_objects(node):
+            g.add((node, p, o))
+            self._copy_node(g, o, copied)
+
+    @staticmethod
+    def build_results_text(results: List[dict], conforms: bool) -> str:
+        lines = ["Validation Report", f"Conforms: {conforms}", f"Results ({len(results)}):"]
+        for r in results:
+            lines.append(f"{r['component'].split('#')[-1]}: {r['focus']} ({r['severity'].split('#')[-1]}) "
+                         f"{' '.join(str(m) for m in r['message'])}")
+        return '\n'.join(lines) + '\n'
+
+
+ENGINES = {
+    PyshaclEngine.name: PyshaclEngine,
+    NativeEngine.name: NativeEngine,
+}
+
+
+def get_engine(name: str, **kwargs) -> ValidationEngine:
+    """
+    :param name: the name of the engine, one of ENGINES
+    :param kwargs: arguments for the engine
+    :return: a new engine
+    """
+    if name not in ENGINES:
+        raise te.TastyError(f"Validation engine must be one of {list(ENGINES)}, not {name}")
+    return ENGINES[name](**kwargs)
+
+
+def _to_int(literal: Literal) -> Union[int, None]:
+    return int(literal.toPython()) if literal is not None else None
@@ -0,0 +1,141 @@
+import json
+from typing import Dict, Union
+
+import pandas as pd
+from rdflib import BNode, Graph, SH, URIRef
+
+import tasty.exceptions as te
+import tasty.graphs as tg
+
+COLUMNS = ['focus_node', 'source_shape', 'path', 'severity', 'missing_shape', 'message']
+SEVERITIES = ['Violation', 'Warning', 'Info']
+
+
+class ValidationReport:
+    """
+    A tabular view of a SHACL validation results graph, with one row per sh:ValidationResult:
+        | focus_node | source_shape | path | severity | missing_shape | message |
+    where 'missing_shape' is the sh:qualifiedValueShape of the source shape (if it has one), i.e. the
+    shape a focus node failed to have the required number of related entities for.
+    All values are strings (or None), severities are the local names 'Violation', 'Warning' or 'Info'.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    @classmethod
+    def from_results_graph(cls, results_graph: Graph) -> 'ValidationReport':
+        """
+        Build the report from a results graph (as returned by pyshacl.validate), in a single pass over its triples.
+
+        :param results_graph: the results graph
+        :return: the report
+        """
+        results = []
+        attributes: Dict[Union[URIRef, BNode], dict] = {}
+        predicates = {SH.focusNode, SH.sourceShape, SH.resultPath, SH.resultSeverity, SH.resultMessage,
+                      SH.qualifiedValueShape, SH.inversePath}
+        for s, p, o in results_graph:
+            if p == SH.result:
+                results.append(o)
+            elif p in predicates:
+                attrs = attributes.setdefault(s, {})
+                if p == SH.resultMessage and p in attrs:
+                    attrs[p] = f"{attrs[p]}\n{o}"
+                else:
+                    attrs[p] = o
+
+        def to_str(node):
+            if node is None:
+                return None
+            inverse = attributes.get(node, {}).get(SH.inversePath) if isinstance(node, BNode) else None
+            if inverse is not None:
+                return f"^{inverse}"
+            return str(node)
+
+        rows = []
+        for result in results:
+            attrs = attributes.get(result, {})
+            source_shape = attrs.get(SH.sourceShape)
+            severity = attrs.get(SH.resultSeverity)
+            rows.append((
+                to_str(attrs.get(SH.focusNode)),
+                to_str(source_shape),
+                to_str(attrs.get(SH.resultPath)),
+                tg.get_local_name(severity) if severity is not None else None,
+                to_str(attributes.get(source_shape, {}).get(SH.qualifiedValueShape)),
+                to_str(attrs.get(SH.resultMessage)),
+            ))
+        df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+        return cls(df.sort_values(['severity', 'focus_node'], kind='mergesort', ignore_index=True))
+
+    def __len__(self):
+        return len(self.df)
+
+    def by_severity(self, severity: str) -> pd.DataFrame:
+        """
+        :param severity: one of SEVERITIES
+        :return: the rows with the severity
+        """
+        return self.df[self.df['severity'] == severity]
+
+    def counts(self) -> Dict[str, int]:
+        """
+        :return: the number of results per severity, i.e. {'Violation': 2, 'Warning': 0, 'Info': 0}
+        """
+        counts = self.df['severity'].value_counts()
+        return {severity: int(counts.get(severity, 0)) for severity in SEVERITIES}
+
+    def rollup(self, data_graph: Graph = None, equip_ref: URIRef = None) -> pd.DataFrame:
+        """
+        Summarize the results per equipment. If a data graph is given, results on points are attributed to the
+        equipment they reference with 'equip_ref', otherwise each focus node is its own equipment.
+
+        :param data_graph: the data graph that was validated
+        :param equip_ref: the equipRef predicate of the data graph, i.e. tc.PHIOT_3_9_10.equipRef
+        :return: a DataFrame indexed by equipment, with a count column per severity and a 'total' column
+        """
+        equipment = self.df['focus_node']
+        if data_graph is not None and equip_ref is not None:
+            refs = {str(s): str(o) for s, o in data_graph.subject_objects(equip_ref)}
+            equipment = equipment.map(lambda node: refs.get(node, node))
+        rollup = pd.crosstab(equipment.rename('equipment'), self.df['severity'])
+        rollup = rollup.reindex(columns=SEVERITIES, fill_value=0)
+        rollup.columns.name = None
+        rollup['total'] = rollup.sum(axis=1)
+        return rollup
+
+    def to_dict(self) -> dict:
+        """
+        :return: the counts per severity and a list of results, as JSON serializable types
+        """
+        return {
+            'counts': self.counts(),
+            'results': json.loads(self.df.to_json(orient='records'))
+        }
+
+    def to_json(self, filename: str) -> None:
+        """
+        Write the report as JSON, with the counts per severity and a list of results.
+
+        :param filename: the path of the file to write
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_csv(self, filename: str) -> None:
+        """
+        :param filename: the path of the file to write
+        """
+        self.df.to_csv(filename, index=False)
+
+    def to_parquet(self, filename: str) -> None:
+        """
+        Write the report as Parquet. Requires pyarrow or fastparquet to be installed.
+
+        :param filename: the path of the file to write
+        """
+        try:
+            self.df.to_parquet(filename, index=False)
+        except ImportError as e:
+            raise te.TastyError(f"Writing parquet requires pyarrow or fastparquet: {e}")
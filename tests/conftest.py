@@ -10,6 +10,7 @@ import tasty.templates as tt
 import tasty.graphs as tg
 import tasty.constants as tc
 from tasty.generated_shapes import generated_dir
+from tasty.shapes_loader import ShapesOverlay, load_frozen_shapes_file
 
 
 def populate_point_group_template_from_file(file_path):
@@ -207,13 +208,12 @@ def get_haystack_test_shapes():
 def get_haystack_all_generated_shapes():
     """
     This version uses the haystack 3.9.10 implementation, i.e. with exploded point
-    types.
+    types. The generated shapes are parsed once and shared between tests, each test
+    gets its own overlay for the triples it adds.
     :return:
     """
-    g = tg.get_versioned_graph(tc.HAYSTACK, tc.V3_9_10)
     f = os.path.join(generated_dir, 'haystack_all.ttl')
-    g.parse(f, format='turtle')
-    return g
+    return ShapesOverlay(load_frozen_shapes_file(f))
 
 
 @pytest.fixture
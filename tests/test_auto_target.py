@@ -0,0 +1,91 @@
+import csv
+import os
+
+import pytest
+from rdflib import Graph, Namespace, RDF
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty.auto_target import ShapeSignatureIndex, auto_target_input_file
+from tasty.shapes_loader import ShapesLoader
+from tasty.validate import add_targets_from_csv
+
+SAMPLE = Namespace('urn:sample/')
+SHAPES_DIR = os.path.join(os.path.dirname(__file__), '../tasty/source_shapes/haystack')
+SHAPE_FILES = [os.path.join(SHAPES_DIR, 'core.json'), os.path.join(SHAPES_DIR, 'nrel.json')]
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'files/data/haystack_nrel_vav_hw_reheat.ttl')
+
+
+@pytest.fixture(scope='module')
+def index():
+    return ShapeSignatureIndex.from_shape_files(SHAPE_FILES)
+
+
+class TestShapeSignatureIndex:
+    def test_match(self, index):
+        # -- Setup
+        data_graph = Graph().parse(DATA_FILE, format='turtle')
+        points = set(data_graph.subjects(tc.PHIOT_3_9_10.equipRef, None))
+
+        # -- Act
+        matched = index.match(data_graph)
+
+        # -- Assert
+        # the points of the example data are named after the (core or nrel) shape they conform to
+        assert points <= set(matched)
+        for point in points:
+            shape_name = str(point).split('NREL-VAV-HW-Reheat-01-')[1]
+            assert shape_name in [column.split(':')[1] for column in matched[point]]
+
+    def test_exact_only(self, index):
+        # -- Setup
+        data_graph = Graph()
+        point = SAMPLE['point-1']
+        data_graph.add((point, RDF.type, tc.PHIOT_3_9_10.point))
+        for tag in [tc.PHIOT_3_9_10.cmd, tc.PHIOT_3_9_10.cooling, tc.PH_CUSTOM.request, tc.PHIOT_3_9_10.his]:
+            data_graph.add((point, tc.PH_3_9_10.hasTag, tag))
+
+        # -- Act
+        exact = index.match(data_graph)
+        partial = index.match(data_graph, exact_only=False)
+
+        # -- Assert
+        assert point not in exact
+        assert 'nrel:CoolingRequestsShape' in partial[point]
+
+
+class TestAutoTargetInputFile:
+    def test_marked_input_file(self, tmp_path):
+        # -- Setup
+        output_file = os.path.join(tmp_path, 'input-file.csv')
+        data_graph = Graph().parse(DATA_FILE, format='turtle')
+
+        # -- Act
+        matched = auto_target_input_file(SHAPE_FILES, DATA_FILE, output_file)
+
+        # -- Assert
+        with open(output_file, newline='') as f:
+            header, *rows = list(csv.reader(f))
+        assert header[:2] == ['entity-id', 'entity-name']
+        assert len(rows) == len(set(data_graph.subjects(RDF.type, None)))
+        num_marks = sum(row.count('X') for row in rows)
+        assert num_marks == sum(len(columns) for columns in matched.values())
+        shapes_graph = ShapesLoader(tc.HAYSTACK).load_shapes_with_targets()
+        targets = add_targets_from_csv(shapes_graph, data_graph, output_file)
+        assert len(targets) == num_marks
+
+    def test_filter_types(self, tmp_path):
+        # -- Setup
+        output_file = os.path.join(tmp_path, 'input-file.csv')
+
+        # -- Act - the composite shapes only target equipment
+        auto_target_input_file(SHAPE_FILES, DATA_FILE, output_file, composite=True, filter_types=True)
+
+        # -- Assert
+        with open(output_file, newline='') as f:
+            header, *rows = list(csv.reader(f))
+        assert [row[0] for row in rows] == [str(SAMPLE['NREL-VAV-HW-Reheat-01'])]
+
+    def test_requires_data_graph(self, tmp_path):
+        with pytest.raises(te.TastyError):
+            auto_target_input_file(SHAPE_FILES, None, os.path.join(tmp_path, 'out.csv'))
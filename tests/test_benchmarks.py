@@ -0,0 +1,53 @@
+import io
+
+from rdflib import Graph
+
+from tasty import constants as tc
+from benchmarks.data import replicate_graphs, NREL_DATA_FILES
+from benchmarks.run import compare, measure
+
+
+class TestReplicateGraphs:
+    def test_replicate_graphs(self):
+        # -- Setup
+        output = io.StringIO()
+
+        # -- Act
+        written = replicate_graphs(NREL_DATA_FILES, 200, output)
+
+        # -- Assert
+        g = Graph().parse(data=output.getvalue(), format='nt')
+        points = set(g.subjects(tc.PHIOT_3_9_10.equipRef, None))
+        assert written >= 200
+        assert len(points) == written
+        # every replica's points refer to the equipment of the same replica
+        for point in points:
+            equip = g.value(point, tc.PHIOT_3_9_10.equipRef)
+            assert str(equip).split('-')[-1] == str(point).split('-')[-1]
+
+
+class TestMeasure:
+    def test_measure(self):
+        # -- Setup
+        calls = []
+
+        # -- Act
+        result = measure(lambda: calls.append([0] * 10000), repeat=2)
+
+        # -- Assert
+        assert len(calls) == 3
+        assert result['time'] >= 0
+        assert result['peak_memory'] > 0
+
+    def test_compare(self):
+        # -- Setup
+        baseline = {'a': {'time': 1.0, 'peak_memory': 100}, 'b': {'time': 1.0}}
+        results = {'a': {'time': 1.1, 'peak_memory': 150}, 'b': {'time': 2.0}, 'c': {'time': 5.0}}
+
+        # -- Act
+        regressions = compare(results, baseline, time_threshold=0.25, memory_threshold=0.1)
+
+        # -- Assert
+        assert len(regressions) == 2
+        assert regressions[0].startswith('a peak_memory')
+        assert regressions[1].startswith('b time')
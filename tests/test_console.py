@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ['rdflib', 'pyshacl', 'pandas', 'numpy', 'yaml', 'frozendict', 'jsonschema']
+
+# run in a new interpreter, since the modules are already imported by the other tests
+SCRIPT = """
+import sys
+sys.argv = {argv!r}
+from tasty.console import main
+try:
+    main()
+except SystemExit:
+    pass
+print('imported:', [m for m in {modules!r} if m in sys.modules])
+"""
+
+
+class TestImportTime:
+    @pytest.mark.parametrize('argv', [
+        ['tasty', '--help'],
+        ['tasty', 'validate', '--help'],
+        ['tasty', 'generate-shapes', '--help'],
+        ['tasty', 'serve', '--help'],
+    ])
+    def test_no_heavy_imports(self, argv):
+        # -- Act
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(argv=argv, modules=HEAVY_MODULES)],
+                                check=True, capture_output=True, text=True).stdout
+
+        # -- Assert
+        assert output.splitlines()[-1] == 'imported: []'
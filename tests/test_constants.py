@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty.shapes_generator import ShapesGenerator
+
+
+class TestNamespaceContext:
+    def test_scoped_versions(self):
+        # -- Setup
+        default = tc.get_namespace_context()
+
+        # -- Act
+        with tc.namespace_context(haystack_version=tc.V3_9_9) as outer:
+            with tc.namespace_context(brick_version=tc.V1_2) as inner:
+                scoped = tc.get_namespace_context()
+                ph_default = tc.PH_DEFAULT
+
+        # -- Assert
+        assert outer.ph == tc.PH_3_9_9
+        assert scoped is inner
+        assert (inner.haystack_version, inner.brick_version) == (tc.V3_9_9, tc.V1_2)
+        assert ph_default == tc.PH_3_9_9
+        assert tc.get_namespace_context() is default
+
+    def test_threads(self):
+        # -- Setup
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def run(version):
+            with tc.namespace_context(haystack_version=version):
+                # both threads are inside their scope at once
+                barrier.wait()
+                seen[version] = tc.PH_DEFAULT.hasTag
+
+        threads = [threading.Thread(target=run, args=(v,)) for v in [tc.V3_9_9, tc.V3_9_10]]
+
+        # -- Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # -- Assert
+        assert seen == {tc.V3_9_9: tc.PH_3_9_9.hasTag, tc.V3_9_10: tc.PH_3_9_10.hasTag}
+
+    def test_unsupported_version(self):
+        with pytest.raises(te.TastyError):
+            tc.create_namespace_context(haystack_version='1.0')
+
+    def test_shapes_generator(self):
+        # -- Setup
+        default = tc.get_namespace_context()
+
+        # -- Act
+        sg_3_9_9 = ShapesGenerator(tc.HAYSTACK, tc.V3_9_9)
+        sg_3_9_10 = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10)
+        sg_3_9_9.add_tag_set_constraint(tc.PH_SHAPES_CORE.Test, [tc.PHIOT_3_9_9.air])
+
+        # -- Assert
+        assert sg_3_9_9.namespaces.ph == tc.PH_3_9_9
+        assert sg_3_9_10.namespaces.ph == tc.PH_3_9_10
+        assert tc.get_namespace_context() is default
+        assert (None, tc.TASTY.tagPath, tc.PH_3_9_9.hasTag) in sg_3_9_9.shapes_graph
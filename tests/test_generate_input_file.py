@@ -0,0 +1,66 @@
+import csv
+import os
+
+import pytest
+from rdflib import Graph, Literal, Namespace, RDF, RDFS
+
+from tasty import constants as tc
+from tasty.generate_input_file import generate_input_file
+
+SAMPLE = Namespace('urn:sample/')
+CORE_SHAPES = os.path.join(os.path.dirname(__file__), '../tasty/source_shapes/haystack/core.json')
+
+
+@pytest.fixture
+def data_graph():
+    g = Graph()
+    g.add((SAMPLE['vav-1'], RDF.type, tc.PHIOT_3_9_10.vav))
+    g.add((SAMPLE['vav-1'], RDF.type, tc.PHIOT_3_9_10.equip))
+    g.add((SAMPLE['vav-1'], RDFS.label, Literal('VAV 1, north')))
+    g.add((SAMPLE['zat-1'], RDF.type, tc.PHIOT_3_9_10['air-temp-sensor']))
+    g.add((SAMPLE['site-1'], RDF.type, tc.PHIOT_3_9_10.site))
+    return g
+
+
+def read_rows(output_file):
+    with open(output_file, newline='') as f:
+        return list(csv.reader(f))
+
+
+class TestGenerateInputFile:
+    @pytest.mark.parametrize('fmt,ext', [['turtle', 'ttl'], ['nt', 'nt']])
+    def test_one_row_per_entity(self, data_graph, tmp_path, fmt, ext):
+        # -- Setup
+        data_file = os.path.join(tmp_path, f"data.{ext}")
+        data_graph.serialize(data_file, format=fmt)
+        output_file = os.path.join(tmp_path, 'input-file.csv')
+
+        # -- Act
+        generate_input_file([CORE_SHAPES], data_file, output_file, composite=True)
+
+        # -- Assert
+        header, *rows = read_rows(output_file)
+        assert header[:3] == ['entity-id', 'entity-name', 'phShapes:G36-Base-VAV-Shape']
+        assert sorted(row[:2] for row in rows) == [
+            [str(SAMPLE['site-1']), ''],
+            [str(SAMPLE['vav-1']), 'VAV 1, north'],
+            [str(SAMPLE['zat-1']), ''],
+        ]
+        assert all(len(row) == len(header) for row in rows)
+
+    @pytest.mark.parametrize('composite,expected', [
+        [True, ['vav-1']],
+        [False, ['vav-1', 'zat-1']],
+    ])
+    def test_filter_types(self, data_graph, tmp_path, composite, expected):
+        # -- Setup
+        data_file = os.path.join(tmp_path, 'data.nt')
+        data_graph.serialize(data_file, format='nt')
+        output_file = os.path.join(tmp_path, 'input-file.csv')
+
+        # -- Act
+        generate_input_file([CORE_SHAPES], data_file, output_file, composite, filter_types=True)
+
+        # -- Assert
+        header, *rows = read_rows(output_file)
+        assert sorted(row[0] for row in rows) == [str(SAMPLE[e]) for e in expected]
@@ -1,7 +1,11 @@
+import io
+import json
+import os
 from unittest import TestCase
 import pytest
 
-from rdflib import Graph
+from rdflib import BNode, Graph, Literal, Namespace, RDF, URIRef
+from rdflib.compare import isomorphic
 
 import tasty.graphs as tg
 import tasty.constants as tc
@@ -103,3 +107,122 @@ class TestLoadOntology:
         g = tg.load_ontology(schema, version)
 
         assert isinstance(g, Graph)
+
+
+class TestIterTurtleBatches:
+    def test_batches_are_self_contained(self):
+        # -- Setup
+        lines = [
+            '@prefix ex: <urn:ex#> .\n',
+            'ex:a ex:p ex:b .\n',
+            'ex:c ex:p """multi\n',
+            'line ."""\n',
+            '    .\n',
+            'ex:d ex:p ex:e ;\n',
+            '    ex:q ex:f .\n',
+        ]
+
+        # -- Act
+        batches = list(tg.iter_turtle_batches(lines, batch_size=2))
+
+        # -- Assert
+        assert len(batches) == 2
+        assert all(batch.startswith('@prefix ex: <urn:ex#> .') for batch in batches)
+        g = Graph()
+        tg.parse_turtle_stream(lines, g, batch_size=1)
+        assert len(g) == 4
+        assert ('ex', URIRef('urn:ex#')) in set(g.namespaces())
+
+    def test_shared_blank_node(self):
+        # -- Setup - three subjects referencing the same blank node, which rdflib writes with a _: label
+        ex = Namespace('urn:ex#')
+        original = Graph()
+        shared = BNode()
+        for name in ['a', 'b', 'c']:
+            original.add((ex[name], ex.p, shared))
+        original.add((shared, ex.q, Literal('shared')))
+        lines = original.serialize(format='turtle').decode('utf-8').splitlines(keepends=True)
+
+        # -- Act
+        g = tg.parse_turtle_stream(lines, Graph(), batch_size=1)
+        output = io.StringIO()
+        tg.turtle_stream_to_ntriples(lines, output, batch_size=1)
+
+        # -- Assert
+        assert isomorphic(g, original)
+        assert len(set(g.objects(None, ex.p))) == 1
+        assert isomorphic(Graph().parse(data=output.getvalue(), format='nt'), original)
+        batch_nodes = set(o for batch in tg.iter_turtle_graphs(lines, batch_size=1) for o in batch.objects(None, ex.p))
+        assert len(batch_nodes) == 1
+
+
+class TestGraphToHayson:
+    def test_graph_to_hayson_string(self):
+        # -- Setup
+        g = tg.get_versioned_graph(tc.HAYSTACK, tc.V3_9_10)
+        sample = Namespace('urn:sample/')
+        g.add((sample['AHU-01'], RDF.type, tc.PHIOT_3_9_10.ahu))
+        g.add((sample['AHU-01'], tc.PH_3_9_10.hasTag, tc.PHIOT_3_9_10.equip))
+        g.add((sample['Point-01'], RDF.type, tc.PHIOT_3_9_10['air-temp-sensor']))
+        g.add((sample['Point-01'], tc.PHIOT_3_9_10.equipRef, sample['AHU-01']))
+        g.add((sample['Point-01'], Namespace('urn:custom#').meterRef, sample['MTR-01']))
+
+        # -- Act
+        hayson = json.loads(tg.graph_to_hayson_string(g))
+
+        # -- Assert
+        rows = {row['dis']: row for row in hayson['rows']}
+        assert len(hayson['rows']) == 2
+        assert rows['urn:sample/AHU-01']['ahu'] == ':m'
+        assert rows['urn:sample/AHU-01']['equip'] == ':m'
+        point = rows['urn:sample/Point-01']
+        assert {point['air'], point['temp'], point['sensor']} == {':m'}
+        assert point['equipRef'] == 'urn:sample/AHU-01'
+        assert point['meterRef'] == 'urn:sample/MTR-01'
+        cols = {col['name'] for col in hayson['cols']}
+        assert cols == {'id', 'dis', 'ahu', 'equip', 'air', 'temp', 'sensor', 'equipRef', 'meterRef'}
+
+    def test_write_hayson(self):
+        # -- Setup
+        g = Graph().parse(os.path.join(os.path.dirname(__file__), 'files/data/haystack_nrel_vav_cooling_only_data.ttl'),
+                          format='turtle')
+        output = io.StringIO()
+
+        # -- Act
+        count = tg.write_hayson(g, output)
+
+        # -- Assert
+        hayson = json.loads(output.getvalue())
+        assert count == len(set(g.subjects())) == len(hayson['rows'])
+
+
+class TestLoadClosure:
+    def test_haystack_closure(self):
+        # -- Act
+        closure = tg.load_closure(tc.HAYSTACK, tc.V3_9_10)
+
+        # -- Assert
+        assert closure is tg.load_closure(tc.HAYSTACK, tc.V3_9_10)
+        assert {tc.PHIOT_3_9_10.ahu, tc.PHIOT_3_9_10.airHandlingEquip, tc.PHIOT_3_9_10.equip} <= \
+            closure.get_superclasses(tc.PHIOT_3_9_10.ahu)
+        assert closure.get_tags(tc.PHIOT_3_9_10.ahu) == {tc.PHIOT_3_9_10.ahu, tc.PHIOT_3_9_10.equip}
+        assert closure.get_tags(tc.PHIOT_3_9_10['hot-water-temp-sp']) == {
+            tc.PHIOT_3_9_10.hot, tc.PHSCIENCE_3_9_10.water, tc.PHSCIENCE_3_9_10.temp, tc.PHIOT_3_9_10.sp,
+            tc.PHIOT_3_9_10.point}
+
+    def test_expand(self):
+        # -- Setup
+        closure = tg.load_closure(tc.HAYSTACK, tc.V3_9_10)
+        sample = Namespace('urn:sample/')
+        g = Graph()
+        g.add((sample['AHU-01'], RDF.type, tc.PHIOT_3_9_10.ahu))
+
+        # -- Act
+        added = closure.expand(g)
+        added_again = closure.expand(g, tags=True)
+
+        # -- Assert
+        assert added == len(closure.get_superclasses(tc.PHIOT_3_9_10.ahu)) - 1
+        assert (sample['AHU-01'], RDF.type, tc.PHIOT_3_9_10.equip) in g
+        assert added_again == 2
+        assert set(g.objects(sample['AHU-01'], tc.PH_3_9_10.hasTag)) == {tc.PHIOT_3_9_10.ahu, tc.PHIOT_3_9_10.equip}
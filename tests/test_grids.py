@@ -0,0 +1,135 @@
+import io
+import json
+
+import pytest
+from rdflib import Namespace, RDF, RDFS, Literal
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty import graphs as tg
+from tasty import grids
+
+SAMPLE = Namespace('urn:/_#')
+
+ZINC_GRID = '''ver:"3.0"
+id,dis,site,equip,ahu,point,air,temp,sensor,discharge,his,equipRef,siteRef,curVal,unit,tz
+@site-1 "Site",,M,,,,,,,,,,,,,"Denver"
+@ahu-1 "AHU 1",,,M,M,,,,,,,,@site-1 "Site",,,
+@dat-1 "AHU 1 DAT",,,,,M,M,M,M,M,M,@ahu-1 "AHU 1",@site-1,72.5°F,"°F",
+'''
+
+HAYSON_GRID = {
+    'meta': {'ver': '3.0'},
+    'cols': [{'name': 'id'}, {'name': 'dis'}],
+    'rows': [
+        {'id': 'r:site-1 Site', 'dis': 's:Site', 'site': 'm:', 'tz': 'Denver'},
+        {'id': {'_kind': 'ref', 'val': 'ahu-1', 'dis': 'AHU 1'}, 'equip': {'_kind': 'marker'}, 'ahu': 'm:',
+         'siteRef': 'r:site-1'},
+        {'id': 'r:dat-1', 'point': 'm:', 'air': 'm:', 'temp': 'm:', 'sensor': 'm:', 'discharge': 'm:',
+         'equipRef': 'r:ahu-1', 'curVal': 'n:72.5 °F'},
+    ]
+}
+
+
+@pytest.fixture(scope='module')
+def grid_importer():
+    return grids.GridImporter(str(SAMPLE), tc.HAYSTACK, tc.V3_9_10)
+
+
+class TestIterZincRows:
+    def test_values(self):
+        # -- Setup
+        lines = [
+            'ver:"3.0" projName:"test"\n',
+            'id,dis,m,n,b,s,d,l\n',
+            '@a-1 "A \\"1\\"",,M,-1.5e2kW,T,"x,y",2021-01-01,[1, "a", @b]\n',
+        ]
+
+        # -- Act
+        rows = list(grids.iter_zinc_rows(lines))
+
+        # -- Assert
+        assert rows == [{
+            'id': grids.Ref('a-1', 'A "1"'),
+            'm': grids.MARKER,
+            'n': -150.0,
+            'b': True,
+            's': 'x,y',
+            'd': '2021-01-01',
+            'l': [1.0, 'a', grids.Ref('b')],
+        }]
+
+    def test_requires_version(self):
+        with pytest.raises(te.TastyError):
+            list(grids.iter_zinc_rows(['id,dis\n']))
+
+
+class TestIterHaysonFileRows:
+    def test_small_chunks(self):
+        # -- Setup
+        fp = io.StringIO(json.dumps(HAYSON_GRID))
+
+        # -- Act
+        rows = list(grids.iter_hayson_file_rows(fp, chunk_size=7))
+
+        # -- Assert
+        assert len(rows) == 3
+        assert rows[0]['id'] == grids.Ref('site-1', 'Site')
+        assert rows[1]['id'] == grids.Ref('ahu-1', 'AHU 1')
+        assert rows[1]['equip'] is grids.MARKER
+        assert rows[2]['curVal'] == 72.5
+
+
+class TestGridImporter:
+    @pytest.mark.parametrize('import_grid', [
+        lambda importer: importer.import_zinc(io.StringIO(ZINC_GRID)),
+        lambda importer: importer.import_hayson(io.StringIO(json.dumps(HAYSON_GRID))),
+    ])
+    def test_import(self, grid_importer, import_grid):
+        # -- Act
+        graph = import_grid(grid_importer)
+
+        # -- Assert
+        ph = tc.PH_3_9_10
+        phiot = tc.PHIOT_3_9_10
+        assert (SAMPLE['site-1'], RDF.type, phiot['site']) in graph
+        assert (SAMPLE['ahu-1'], RDF.type, phiot['ahu']) in graph
+        assert (SAMPLE['ahu-1'], ph.hasTag, phiot['ahu']) in graph
+        assert (SAMPLE['ahu-1'], phiot.siteRef, SAMPLE['site-1']) in graph
+        assert (SAMPLE['dat-1'], RDF.type, phiot['discharge-air-temp-sensor']) in graph
+        assert (SAMPLE['dat-1'], ph.hasTag, tc.PHSCIENCE_3_9_10['temp']) in graph
+        assert (SAMPLE['dat-1'], phiot.equipRef, SAMPLE['ahu-1']) in graph
+        assert (SAMPLE['dat-1'], phiot.curVal, Literal(72.5)) in graph
+
+    def test_label(self, grid_importer):
+        # -- Act
+        graph = grid_importer.import_hayson(io.StringIO(json.dumps(HAYSON_GRID)))
+
+        # -- Assert - 'dis' is preferred over the display name of the id
+        assert graph.value(SAMPLE['site-1'], RDFS.label) == Literal('Site')
+        assert graph.value(SAMPLE['ahu-1'], RDFS.label) == Literal('AHU 1')
+        assert graph.value(SAMPLE['dat-1'], RDFS.label) is None
+
+    def test_hayson_round_trip(self, grid_importer):
+        # -- Setup
+        graph = grid_importer.import_zinc(io.StringIO(ZINC_GRID))
+        output = io.StringIO()
+        tg.write_hayson(graph, output)
+        output.seek(0)
+
+        # -- Act
+        imported = grid_importer.import_hayson(output)
+
+        # -- Assert
+        ph = tc.PH_3_9_10
+        assert set(imported.objects(predicate=ph.hasTag)) == set(graph.objects(predicate=ph.hasTag))
+        assert set(imported.objects(predicate=tc.PHIOT_3_9_10.equipRef)) == {SAMPLE['ahu-1']}
+
+    def test_unsupported_file(self, grid_importer, tmp_path):
+        # -- Setup
+        f = tmp_path / 'grid.trio'
+        f.write_text('id:@a\n')
+
+        # -- Act / Assert
+        with pytest.raises(te.TastyError):
+            grid_importer.import_file(str(f))
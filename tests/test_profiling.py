@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+
+from tasty import constants as tc
+from tasty import graphs as tg
+from tasty.profiling import Profiler, Progress, span
+
+
+class TestProfiler:
+    def test_spans(self):
+        # -- Act
+        with Profiler() as profiler:
+            with span('outer', file='a.ttl'):
+                with span('inner') as s:
+                    s.set(triples=3)
+                with span('inner'):
+                    pass
+        with span('ignored'):
+            pass
+
+        # -- Assert
+        assert [root.name for root in profiler.roots] == ['outer']
+        outer = profiler.roots[0]
+        assert outer.attributes['file'] == 'a.ttl'
+        assert [child.name for child in outer.children] == ['inner', 'inner']
+        assert outer.children[0].attributes['triples'] == 3
+        assert outer.wall_time >= outer.children[0].wall_time + outer.children[1].wall_time
+        assert outer.cpu_time >= 0
+        assert 'inner' in profiler.format_tree()
+
+    def test_load_ontology(self):
+        # -- Act
+        with Profiler() as profiler:
+            g = tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+
+        # -- Assert
+        assert profiler.roots[0].name == 'load_ontology'
+        assert profiler.roots[0].attributes['triples'] == len(g)
+
+    def test_export(self, tmp_path):
+        # -- Setup
+        with Profiler() as profiler:
+            with span('outer'):
+                with span('inner') as s:
+                    s.set(triples=3)
+        json_file = os.path.join(tmp_path, 'profile.json')
+        chrome_file = os.path.join(tmp_path, 'trace.json')
+
+        # -- Act
+        profiler.export(json_file)
+        profiler.export(chrome_file, format='chrome')
+
+        # -- Assert
+        with open(json_file) as f:
+            tree = json.load(f)
+        assert tree[0]['name'] == 'outer'
+        assert tree[0]['children'][0]['attributes']['triples'] == 3
+        with open(chrome_file) as f:
+            events = json.load(f)['traceEvents']
+        assert [e['name'] for e in events] == ['outer', 'inner']
+        assert all(e['ph'] == 'X' for e in events)
+        assert events[0]['ts'] <= events[1]['ts']
+        assert events[0]['dur'] >= events[1]['dur']
+        assert events[1]['args']['triples'] == 3
+
+
+class TestProgress:
+    def test_progress(self, caplog):
+        # -- Setup
+        logger = logging.getLogger('tasty.test')
+        caplog.set_level(logging.INFO, logger='tasty')
+
+        # -- Act
+        progress = Progress(logger, 'Processed items', total=10, interval=0)
+        for _ in range(10):
+            progress.update()
+        progress.done()
+
+        # -- Assert
+        messages = [r.getMessage() for r in caplog.records]
+        assert len(messages) == 11
+        assert messages[-1].startswith('Processed items: 10/10 in')
+
+    def test_disabled(self, caplog):
+        # -- Setup
+        logger = logging.getLogger('tasty.test')
+        caplog.set_level(logging.WARNING, logger='tasty')
+
+        # -- Act
+        progress = Progress(logger, 'Processed items', interval=0)
+        progress.update(5)
+        progress.done()
+
+        # -- Assert
+        assert progress.count == 5
+        assert caplog.records == []
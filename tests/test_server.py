@@ -0,0 +1,147 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from tasty import exceptions as te
+from tasty.server import MAX_BODY_SIZE, ValidationHTTPServer, ValidationService, remove_stale_socket
+
+dirname = os.path.dirname(__file__)
+data_file = os.path.join(dirname, 'files/data/haystack_nrel_vav_hw_reheat.ttl')
+VAV = 'urn:sample/NREL-VAV-HW-Reheat-01'
+VAV_SHAPE = 'nrel:NREL-VAV-SD-HW-Reheat-Shape'
+
+
+@pytest.fixture(scope='module')
+def service():
+    return ValidationService()
+
+
+@pytest.fixture(scope='module')
+def server_url(service):
+    server = ValidationHTTPServer(('127.0.0.1', 0), service, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body: bytes):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body)) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def read_data():
+    with open(data_file) as f:
+        return f.read()
+
+
+class TestValidationService:
+    def test_validate(self, service):
+        # -- Act
+        response = service.validate({'data': read_data(), 'targets': [{'entity': VAV, 'shape': VAV_SHAPE}]})
+
+        # -- Assert
+        assert response['conforms']
+        assert response['counts']['Violation'] == 0
+        assert response['time'] > 0
+
+    def test_validate_missing_points(self, service):
+        # -- Setup
+        # an equipment without any point
+        data = f"<{VAV}> a <https://project-haystack.org/def/phIoT/3.9.10#vav> ."
+
+        # -- Act
+        response = service.validate({'data': data, 'targets': [{'entity': VAV, 'shape': VAV_SHAPE}]})
+
+        # -- Assert
+        assert not response['conforms']
+        assert response['counts']['Violation'] > 0
+
+    def test_unknown_shape(self, service):
+        with pytest.raises(te.TastyError):
+            service.resolve_shape('unknown:Shape')
+
+
+class TestValidationServer:
+    def test_validate(self, server_url):
+        # -- Setup
+        body = json.dumps({'data': read_data(), 'targets': [{'entity': VAV, 'shape': VAV_SHAPE}]}).encode()
+
+        # -- Act
+        status, response = post(f"{server_url}/validate", body)
+
+        # -- Assert
+        assert status == 200
+        assert response['conforms']
+
+    def test_health(self, server_url):
+        # -- Act
+        with urllib.request.urlopen(f"{server_url}/health") as response:
+            health = json.load(response)
+
+        # -- Assert
+        assert health['status'] == 'ok'
+        assert health['workers'] == 2
+
+    def test_bad_requests(self, server_url):
+        # -- Act
+        invalid_json = post(f"{server_url}/validate", b'{')
+        missing_data = post(f"{server_url}/validate", json.dumps({'targets': []}).encode())
+        unknown_engine = post(f"{server_url}/validate", json.dumps({'data': '', 'engine': 'other'}).encode())
+        unknown_path = post(f"{server_url}/other", b'{}')
+
+        # -- Assert
+        assert [r[0] for r in [invalid_json, missing_data, unknown_engine, unknown_path]] == [400, 400, 400, 404]
+        assert 'error' in invalid_json[1]
+
+    def test_body_too_large(self, server_url):
+        # -- Setup
+        connection = http.client.HTTPConnection(server_url[len('http://'):])
+
+        # -- Act - the server answers without reading the body
+        connection.putrequest('POST', '/validate')
+        connection.putheader('Content-Length', str(MAX_BODY_SIZE + 1))
+        connection.endheaders()
+        response = connection.getresponse()
+
+        # -- Assert
+        assert response.status == 413
+        assert 'error' in json.load(response)
+        connection.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not supported')
+class TestRemoveStaleSocket:
+    def test_socket(self, tmp_path):
+        # -- Setup
+        path = os.path.join(tmp_path, 'tasty.sock')
+        s = socket.socket(socket.AF_UNIX)
+        s.bind(path)
+        s.close()
+
+        # -- Act
+        remove_stale_socket(path)
+
+        # -- Assert
+        assert not os.path.exists(path)
+
+    def test_other_file(self, tmp_path):
+        # -- Setup
+        path = os.path.join(tmp_path, 'data.ttl')
+        with open(path, 'w') as f:
+            f.write('data')
+
+        # -- Act / Assert
+        with pytest.raises(te.TastyError):
+            remove_stale_socket(path)
+        assert os.path.isfile(path)
@@ -0,0 +1,74 @@
+from rdflib import BNode, Graph, RDF, SH, URIRef
+
+import tasty.constants as tc
+import tasty.graphs as tg
+from tasty.shapes_generator import ShapesGenerator
+from tasty.validation_engines import get_engine
+from tasty.validation_report import ValidationReport
+
+
+class TestInternConstraints:
+    def test_intern_constraints(self):
+        # -- Setup
+        sg = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10)
+        source_shapes = sg.source_shapes_by_file['core.json']
+        sg_interned = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10, intern_constraints=True)
+
+        # -- Act
+        shapes_graph = sg.main(source_shapes)
+        interned_graph = sg_interned.main(source_shapes)
+
+        # -- Assert
+        assert len(interned_graph) < len(shapes_graph)
+        air_tag = tc.PH_SHAPES_CORE['phScience-air-tag']
+        assert (air_tag, RDF.type, SH.PropertyShape) in interned_graph
+        assert len(list(interned_graph.subjects(SH.hasValue, tc.PHSCIENCE_3_9_10.air))) == 1
+        assert len(list(shapes_graph.subjects(SH.hasValue, tc.PHSCIENCE_3_9_10.air))) > 1
+
+        # the same shapes require the same tags
+        shape = tc.PH_SHAPES_CORE['zone-air-temp-sensor-shape']
+        tags = {interned_graph.value(interned_graph.value(prop, SH.qualifiedValueShape), SH.hasValue)
+                for prop in interned_graph.objects(shape, SH.property)}
+        expected_tags = {shapes_graph.value(shapes_graph.value(prop, SH.qualifiedValueShape), SH.hasValue)
+                         for prop in shapes_graph.objects(shape, SH.property)}
+        assert tags == expected_tags
+        assert tc.PHIOT_3_9_10.zone in tags
+        assert not any(isinstance(prop, BNode) and interned_graph.value(prop, SH.qualifiedValueShape)
+                       for prop in interned_graph.objects(shape, SH.property))
+
+
+class TestCompileTagSets:
+    def test_compile_tag_sets(self):
+        # -- Setup
+        sg = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10)
+        sg_compiled = ShapesGenerator(tc.HAYSTACK, tc.V3_9_10, compile_tag_sets=True)
+        source_shapes = sg.source_shapes_by_file['core.json']
+        shape = tc.PH_SHAPES_CORE['zone-air-co2-sensor-shape']
+        point = URIRef('urn:sample/Point-01')
+        data_graph = Graph()
+        data_graph.add((point, RDF.type, tc.PHIOT_3_9_10.point))
+        for tag in [tc.PHIOT_3_9_10.zone, tc.PHSCIENCE_3_9_10.air, tc.PHIOT_3_9_10.point]:
+            data_graph.add((point, tc.PH_3_9_10.hasTag, tag))
+        ont_graph = tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+        results = {}
+
+        # -- Act
+        for name, generator in [('orig', sg), ('compiled', sg_compiled)]:
+            shapes_graph = generator.main(source_shapes)
+            shapes_graph.add((shape, SH.targetNode, point))
+            for engine in ['pyshacl', 'native']:
+                results[(name, engine)] = get_engine(engine).validate(data_graph, shapes_graph, ont_graph)
+
+        # -- Assert
+        assert len(list(shapes_graph.objects(shape, SH.sparql))) == 1
+        summaries = {}
+        for key, (conforms, results_graph, _) in results.items():
+            assert not conforms
+            df = ValidationReport.from_results_graph(results_graph).df
+            summaries[key] = sorted(zip(df['focus_node'], df['path'], df['severity']))
+        assert len(set(map(tuple, summaries.values()))) == 1
+        # one result for each of the missing co2 and sensor tags, and one for the tag count
+        assert len(summaries[('compiled', 'native')]) == 3
+        values = set(results[('compiled', 'native')][1].objects(None, SH.value))
+        assert values == set(results[('compiled', 'pyshacl')][1].objects(None, SH.value)) == {
+            tc.PHSCIENCE_3_9_10.co2, tc.PHIOT_3_9_10.sensor}
@@ -0,0 +1,145 @@
+import os
+import pickle
+import shutil
+
+import pytest
+from rdflib import Graph, Namespace, OWL, RDF, SH
+from pyshacl import validate
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty import graphs as tg
+from tasty import shapes_loader as sl_module
+from tasty.shapes_loader import ShapesLoader
+from tasty.validation_engines import PyshaclEngine
+
+SAMPLE = Namespace('urn:sample/')
+SHAPE = tc.PH_SHAPES_NREL['NREL-VAV-SD-HW-Reheat-Shape']
+VAV = SAMPLE['NREL-VAV-HW-Reheat-01']
+
+
+class TestShapesOverlay:
+    def test_frozen_shapes_are_shared(self):
+        # -- Setup
+        sl = ShapesLoader(tc.HAYSTACK)
+
+        # -- Act
+        first = sl.load_shapes_with_targets()
+        second = sl.load_shapes_with_targets()
+        first.add_target(SHAPE, VAV)
+
+        # -- Assert
+        assert first.base_graphs[0] is second.base_graphs[0] is sl.load_frozen_shapes()
+        assert (SHAPE, SH.targetNode, VAV) in first
+        assert (SHAPE, SH.targetNode, VAV) not in second
+        assert (SHAPE, SH.targetNode, VAV) not in first.base_graphs[0]
+        assert len(first) == len(first.base_graphs[0]) + 1
+
+    def test_validate(self, get_haystack_nrel_vav_hw_reheat_data):
+        # -- Setup
+        sl = ShapesLoader(tc.HAYSTACK)
+        base = sl.load_frozen_shapes()
+        num_triples = len(base)
+        shapes_graph = sl.load_shapes_with_targets()
+        shapes_graph.add_target(SHAPE, VAV)
+        data_graph = get_haystack_nrel_vav_hw_reheat_data
+        data_graph.remove((SAMPLE['NREL-VAV-HW-Reheat-01-HeatingWaterValveCommandShape'], tc.PH_3_9_10.hasTag,
+                           tc.PHIOT_3_9_10.hot))
+
+        # -- Act
+        conforms, results_graph, results = validate(data_graph, shacl_graph=shapes_graph,
+                                                    ont_graph=tg.load_ontology(tc.HAYSTACK, tc.V3_9_10))
+
+        # -- Assert
+        assert not conforms
+        assert (None, SH.focusNode, VAV) in results_graph
+        assert len(base) == num_triples
+
+
+class TestShapesLibraries:
+    def test_get_libraries(self):
+        # -- Act
+        libraries = ShapesLoader(tc.HAYSTACK).get_libraries()
+
+        # -- Assert
+        assert libraries == ['core', 'nrel', 'oap', 'openstudio']
+
+    def test_load_libraries_with_dependencies(self):
+        # -- Setup
+        sl = ShapesLoader(tc.HAYSTACK)
+
+        # -- Act
+        shapes_graph = sl.load_libraries(['nrel'])
+
+        # -- Assert - nrel shapes reference core shapes
+        assert sl.get_library_dependencies('nrel') == ['core']
+        assert shapes_graph.base_graphs == [sl.load_library('nrel'), sl.load_library('core')]
+        assert (SHAPE, None, None) in shapes_graph
+        assert (tc.PH_SHAPES_CORE['damper-cmd-shape'], None, None) in shapes_graph
+        assert len(shapes_graph) == len(sl.load_library('nrel')) + len(sl.load_library('core'))
+
+    def test_binary_cache(self, tmp_path, monkeypatch):
+        # -- Setup
+        f = os.path.join(tmp_path, 'haystack_core.ttl')
+        shutil.copy(ShapesLoader(tc.HAYSTACK).get_library_file('core'), f)
+        parsed = sl_module.load_frozen_shapes_file(f)
+        monkeypatch.setattr(sl_module, '_frozen_shapes', {})
+
+        # -- Act
+        cached = sl_module.load_frozen_shapes_file(f)
+
+        # -- Assert
+        assert os.path.isfile(os.path.join(tmp_path, '.cache', 'haystack_core.ttl.pickle'))
+        assert cached is not parsed
+        assert set(cached) == set(parsed)
+
+    @pytest.mark.parametrize('stale', ['outdated header', 'missing module'])
+    def test_stale_binary_cache(self, tmp_path, monkeypatch, stale):
+        # -- Setup
+        f = os.path.join(tmp_path, 'haystack_core.ttl')
+        shutil.copy(ShapesLoader(tc.HAYSTACK).get_library_file('core'), f)
+        cache_file = os.path.join(tmp_path, '.cache', 'haystack_core.ttl.pickle')
+        os.makedirs(os.path.dirname(cache_file))
+        with open(cache_file, 'wb') as cache:
+            if stale == 'outdated header':
+                # the format of the cache before it had a header
+                pickle.dump((os.path.getmtime(f), Graph()), cache)
+            else:
+                # i.e. a graph pickled with another version of rdflib, which fails with a ModuleNotFoundError
+                pickle.dump((sl_module.CACHE_FORMAT, os.path.getmtime(f)), cache)
+                cache.write(b'cnot_a_module\nGraph\n.')
+
+        # -- Act
+        shapes = sl_module.load_frozen_shapes_file(f)
+
+        # -- Assert
+        assert len(shapes) > 0
+        monkeypatch.setattr(sl_module, '_frozen_shapes', {})
+        assert set(sl_module.load_frozen_shapes_file(f)) == set(shapes)
+
+
+class TestShapesBundle:
+    def test_mixed_site(self, get_haystack_nrel_vav_hw_reheat_data):
+        # -- Setup - a Haystack VAV and a Brick AHU in the same data graph
+        data_graph = get_haystack_nrel_vav_hw_reheat_data
+        data_graph.add((SAMPLE['AHU-1'], RDF.type, tc.BRICK_1_1.AHU))
+        bundle = ShapesLoader().load_bundle()
+        bundle.shapes_graph.add_target(SHAPE, VAV)
+
+        # -- Act
+        conforms, results_graph, results = bundle.validate(data_graph)
+
+        # -- Assert
+        assert conforms
+        assert bundle.versions == {tc.HAYSTACK: tc.V3_9_10, tc.BRICK: tc.V1_1}
+        assert (tc.BRICK_1_1.AHU, RDF.type, OWL.Class) in bundle.ont_graph
+        assert (tc.PHIOT_3_9_10.ahu, RDF.type, OWL.Class) in bundle.ont_graph
+        assert ShapesLoader().load_bundle().ont_graph is bundle.ont_graph
+
+    def test_engine_with_kwargs(self):
+        # -- Setup
+        bundle = ShapesLoader().load_bundle()
+
+        # -- Act / Assert - the arguments are only used for the default engine
+        with pytest.raises(te.TastyError):
+            bundle.validate(Graph(), PyshaclEngine(), inference='none')
@@ -0,0 +1,249 @@
+import os
+
+import pytest
+from rdflib import Graph, Namespace, RDF
+from rdflib.compare import isomorphic
+
+from tasty import constants as tc
+from tasty.skyspark import point_mapper as pm
+from tasty.skyspark import process_graphs as pg
+
+SKYSPARK = Namespace('urn:/_#')
+RAW_FILE = os.path.join(os.path.dirname(__file__), 'files/data/sample_skyspark_vav_raw.ttl')
+
+
+@pytest.fixture(scope='module')
+def skyspark_graph_processor():
+    return pg.SkysparkGraphProcessor(str(SKYSPARK), tc.HAYSTACK, tc.V3_9_10)
+
+
+@pytest.fixture
+def skyspark_clean_data_graph(skyspark_graph_processor, tmp_path):
+    clean_file = os.path.join(tmp_path, 'sample_skyspark_vav_clean.ttl')
+    skyspark_graph_processor.clean_raw_skyspark_turtle(RAW_FILE, clean_file)
+    data_graph = pg.helpers.parse_file_to_graph(clean_file, tc.HAYSTACK, tc.V3_9_10)
+    skyspark_graph_processor.remove_invalid_tags(data_graph)
+    return data_graph
+
+
+class TestPointTypeIndex:
+    @pytest.mark.parametrize('tags,expected', [
+        [['air', 'temp', 'sensor', 'zone', 'his'], 'air-temp-sensor'],
+        [['discharge', 'air', 'temp', 'sensor'], 'discharge-air-temp-sensor'],
+        [['air', 'temp', 'sp', 'zone'], 'air-temp-sp'],
+        [['his', 'zone'], 'point'],
+        [[], 'point'],
+    ])
+    def test_classify(self, tags, expected):
+        # -- Setup
+        index = pm.get_point_type_index(tc.V3_9_10)
+
+        # -- Act
+        point_type = index.classify(tags)
+
+        # -- Assert
+        assert point_type == expected
+
+    def test_descent_parity(self, skyspark_clean_data_graph):
+        # -- Setup
+        tree = pm.PointTree(os.path.join(tc.SCHEMAS_DIR, 'haystack', 'defs_3_9_10.ttl'), 'point')
+        index = pm.get_point_type_index(tc.V3_9_10)
+        points = set(skyspark_clean_data_graph.subjects(tc.PHIOT_3_9_10.equipRef, None))
+        tags_by_point = {point: set() for point in points}
+        for s, o in skyspark_clean_data_graph.subject_objects(tc.PH_3_9_10.hasTag):
+            if s in tags_by_point:
+                tags_by_point[s].add(o[o.find('#') + 1:])
+        tags_by_point['ambiguous'] = {'steam', 'sensor', 'writable'}
+
+        def descend(node, tags, parent):
+            # the types the original PointTree descent into the first matching child can end at, in any child order
+            children = [c for c in node.children if c.tags and set(c.tags) <= tags]
+            if not children:
+                return {tree.root.type if parent is tree.root else node.type}
+            return set().union(*(descend(child, tags, node) for child in children))
+
+        # -- Act
+        point_types = index.classify_all(tags_by_point)
+
+        # -- Assert
+        assert len(points) > 0
+        for point, tags in tags_by_point.items():
+            assert point_types[point] in descend(tree.root, tags, None)
+        assert point_types['ambiguous'] == 'steam-sensor'
+
+    def test_index_is_cached(self):
+        assert pm.get_point_type_index(tc.V3_9_10) is pm.get_point_type_index(tc.V3_9_10)
+
+    def test_classify_all(self):
+        # -- Setup
+        index = pm.get_point_type_index(tc.V3_9_10)
+        tags_by_point = {
+            'p1': {'air', 'temp', 'sensor'},
+            'p2': {'air', 'flow', 'sp'},
+        }
+
+        # -- Act
+        point_types = index.classify_all(tags_by_point)
+
+        # -- Assert
+        assert point_types == {'p1': 'air-temp-sensor', 'p2': 'air-flow-sp'}
+
+
+class TestPointTree:
+    @pytest.fixture(scope='class')
+    def point_tree(self):
+        return pm.PointTree(os.path.join(tc.SCHEMAS_DIR, 'haystack', 'defs_3_9_10.ttl'), 'point')
+
+    @pytest.mark.parametrize('tags,expected', [
+        [['air', 'temp', 'sensor', 'zone', 'his'], 'air-temp-sensor'],
+        [['his', 'zone'], 'point'],
+    ])
+    def test_determine_first_class_point_type(self, point_tree, tags, expected):
+        # -- Act
+        node = point_tree.determine_first_class_point_type(point_tree.get_root(), tags)
+
+        # -- Assert
+        assert node.type == expected
+
+    def test_determine_maximal_point_types(self, point_tree):
+        # -- Act
+        nodes = point_tree.determine_maximal_point_types(['his', 'air', 'temp', 'sensor'])
+
+        # -- Assert
+        assert sorted(node.type for node in nodes) == ['air-temp-sensor', 'his-point']
+
+    def test_save_and_load(self, point_tree, tmp_path):
+        # -- Setup
+        f = os.path.join(tmp_path, 'point_tree.json')
+
+        # -- Act
+        point_tree.save(f)
+        loaded = pm.PointTree.load(f)
+
+        # -- Assert
+        assert loaded.index.types == point_tree.index.types
+        assert loaded.index.parents == point_tree.index.parents
+        node = loaded.determine_first_class_point_type(loaded.get_root(), ['discharge', 'air', 'temp', 'sensor'])
+        assert node.type == 'discharge-air-temp-sensor'
+
+    def test_multiple_parents(self):
+        # -- Setup - 'air-temp-sp' is a subtype of both 'air-sp' and 'temp-sp'
+        index = pm.PointTypeIndex('point', ['point', 'air-sp', 'temp-sp', 'air-temp-sp'], [[], [0], [0], [1, 2]])
+
+        # -- Act
+        tree = pm.PointTree.from_index(index)
+
+        # -- Assert
+        node = tree.nodes['air-temp-sp']
+        assert sorted(parent.type for parent in node.parents) == ['air-sp', 'temp-sp']
+        assert index.maximal_matches(['air', 'temp', 'sp']) == ['air-temp-sp']
+        assert index.maximal_matches(['air', 'sp']) == ['air-sp']
+
+
+class TestAddFirstClassPointTypes:
+    def test_adds_types(self, skyspark_graph_processor, skyspark_clean_data_graph):
+        # -- Setup
+        data_graph = skyspark_clean_data_graph
+        point = SKYSPARK['211c90ab-701fa511']
+
+        # -- Act
+        point_types = skyspark_graph_processor.add_first_class_point_types(data_graph)
+
+        # -- Assert
+        assert point_types[point] == tc.PHIOT_3_9_10['air-temp-sensor']
+        assert (point, RDF.type, tc.PHIOT_3_9_10['air-temp-sensor']) in data_graph
+        assert (point, tc.PH_3_9_10.hasTag, tc.PHSCIENCE_3_9_10['temp']) not in data_graph
+
+    def test_does_not_modify_graph(self, skyspark_graph_processor, skyspark_clean_data_graph):
+        # -- Setup
+        data_graph = skyspark_clean_data_graph
+        num_triples = len(data_graph)
+
+        # -- Act
+        point_types = skyspark_graph_processor.add_first_class_point_types(data_graph, add_types=False)
+
+        # -- Assert
+        assert len(point_types) > 0
+        assert len(data_graph) == num_triples
+
+
+class TestRemoveInvalidTags:
+    def test_valid_tags_are_cached(self, skyspark_graph_processor):
+        # -- Act
+        valid_tags = skyspark_graph_processor.get_valid_tag_set()
+
+        # -- Assert
+        assert isinstance(valid_tags, frozenset)
+        assert valid_tags is skyspark_graph_processor.get_valid_tag_set()
+        assert set(skyspark_graph_processor.get_valid_tags()['namespaced']) == valid_tags
+
+    def test_remove_invalid_tags(self, skyspark_graph_processor, tmp_path):
+        # -- Setup
+        clean_file = os.path.join(tmp_path, 'sample_skyspark_vav_clean.ttl')
+        skyspark_graph_processor.clean_raw_skyspark_turtle(RAW_FILE, clean_file)
+        data_graph = pg.helpers.parse_file_to_graph(clean_file, tc.HAYSTACK, tc.V3_9_10)
+        num_triples = len(data_graph)
+
+        # -- Act
+        diff = skyspark_graph_processor.remove_invalid_tags(data_graph, inplace=False)
+
+        # -- Assert diff only, graph not modified
+        assert len(diff) > 0
+        assert len(data_graph) == num_triples
+        assert (SKYSPARK['211c90ab-701fa511'], tc.PH_3_9_10.hasTag, tc.PHIOT_3_9_10['his']) in diff
+
+        # -- Act
+        removed = skyspark_graph_processor.remove_invalid_tags(data_graph)
+
+        # -- Assert
+        assert set(removed) == set(diff)
+        assert len(data_graph) == num_triples - len(diff)
+        assert skyspark_graph_processor.remove_invalid_tags(data_graph) == []
+
+
+class TestCleanRawSkysparkTurtle:
+    def test_iter_clean_raw_skyspark_turtle(self, skyspark_graph_processor):
+        # -- Setup
+        lines = [
+            '@prefix ph: <https://project-haystack.org/def/ph/3.9.9#> .\n',
+            '\n',
+            '_:a ph:hasTag ph:foo ;\n',
+            '    his:hisEnd 2021-07-27T11:06:06-06:00^^xsd:dateTime ;\n',
+            '    ph:dis "a" ;\n',
+            '    _:mod 2021-03-04T22:32:40.67Z^^xsd:dateTime .\n',
+        ]
+
+        # -- Act
+        cleaned = list(skyspark_graph_processor.iter_clean_raw_skyspark_turtle(lines))
+
+        # -- Assert
+        assert cleaned == [
+            f"@prefix _: <{SKYSPARK}> .\n",
+            '@prefix ph: <https://project-haystack.org/def/ph/3.9.10#> .\n',
+            '\n',
+            '_:a ph:hasTag ph:foo ;\n',
+            '    ph:dis "a" .\n',
+        ]
+
+    def test_parse_raw_skyspark_turtle(self, skyspark_graph_processor, tmp_path):
+        # -- Setup
+        clean_file = os.path.join(tmp_path, 'sample_skyspark_vav_clean.ttl')
+        skyspark_graph_processor.clean_raw_skyspark_turtle(RAW_FILE, clean_file)
+        expected = pg.helpers.parse_file_to_graph(clean_file, tc.HAYSTACK, tc.V3_9_10)
+
+        # -- Act
+        data_graph = skyspark_graph_processor.parse_raw_skyspark_turtle(RAW_FILE, batch_size=2)
+
+        # -- Assert
+        assert isomorphic(data_graph, expected)
+
+    def test_raw_skyspark_turtle_to_ntriples(self, skyspark_graph_processor, tmp_path):
+        # -- Setup
+        nt_file = os.path.join(tmp_path, 'sample_skyspark_vav_clean.nt')
+        expected = skyspark_graph_processor.parse_raw_skyspark_turtle(RAW_FILE)
+
+        # -- Act
+        skyspark_graph_processor.raw_skyspark_turtle_to_ntriples(RAW_FILE, nt_file, batch_size=3)
+
+        # -- Assert
+        assert isomorphic(Graph().parse(nt_file, format='nt'), expected)
@@ -0,0 +1,128 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+from rdflib import Namespace
+
+from tasty import constants as tc
+from tasty.skyspark.client import SkysparkClient
+from tasty.skyspark.process_graphs import SkysparkGraphProcessor
+
+SKYSPARK = Namespace('urn:/_#')
+
+RAW_TURTLE = '''@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+@prefix ph: <https://project-haystack.org/def/ph/3.9.9#> .
+@prefix phIoT: <https://project-haystack.org/def/phIoT/3.9.9#> .
+@prefix his: <https://skyfoundry.com/def/his/3.0.27.1#> .
+
+'''
+
+EQUIP_TURTLE = '''_:{name} a phIoT:vav ;
+    ph:hasTag phIoT:equip ;
+    _:mod 2021-03-04T22:32:40.67Z^^xsd:dateTime .
+
+_:{name}-point ph:hasTag phIoT:point ;
+    his:hisEnd 2021-07-27T11:06:06-06:00^^xsd:dateTime ;
+    phIoT:equipRef _:{name} .
+
+'''
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SkysparkStandIn(BaseHTTPRequestHandler):
+    """
+    A stand-in for the SkySpark 'read' endpoint, which returns raw turtle for each navName in the filter.
+    The first 'failures' requests are answered with a 503.
+    """
+    requests = []
+    failures = 0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)['filter'][0]
+        type(self).requests.append(query)
+        if type(self).failures > 0:
+            type(self).failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        nav_names = sorted(set(re.findall(r'navName=="([^"]+)"', query)))
+        body = RAW_TURTLE + ''.join(EQUIP_TURTLE.format(name=name) for name in nav_names)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/turtle; charset=utf-8')
+        self.send_header('Content-Length', str(len(body.encode('utf-8'))))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def skyspark_server():
+    SkysparkStandIn.requests = []
+    SkysparkStandIn.failures = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SkysparkStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/read"
+    server.shutdown()
+    server.server_close()
+
+
+class TestSkysparkClient:
+    def test_make_get_request(self, skyspark_server):
+        # -- Setup
+        client = SkysparkClient(skyspark_server)
+
+        # -- Act
+        response = client.make_get_request(client.generate_axon_query_for_equip('VAV-1'), 'turtle')
+
+        # -- Assert
+        assert response.status_code == 200
+        assert '_:VAV-1 a phIoT:vav' in response.text
+
+    def test_retries_with_backoff(self, skyspark_server):
+        # -- Setup
+        SkysparkStandIn.failures = 2
+        client = SkysparkClient(skyspark_server, max_retries=3, backoff_factor=0.01)
+
+        # -- Act
+        response = client.make_get_request(client.generate_axon_query_for_equip('VAV-1'), 'turtle')
+
+        # -- Assert
+        assert response.status_code == 200
+        assert len(SkysparkStandIn.requests) == 3
+
+    def test_fetch_equipment_is_paginated(self, skyspark_server):
+        # -- Setup
+        nav_names = [f"VAV-{i}" for i in range(25)]
+        client = SkysparkClient(skyspark_server, page_size=10, max_workers=4)
+
+        # -- Act
+        pages = client.fetch_equipment(nav_names)
+
+        # -- Assert
+        assert len(SkysparkStandIn.requests) == 3
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert all(f"_:{name} a phIoT:vav" in body for page, body in pages.items() for name in page)
+
+    def test_fetch_equipment_graph(self, skyspark_server):
+        # -- Setup
+        nav_names = [f"VAV-{i}" for i in range(12)]
+        sgp = SkysparkGraphProcessor(str(SKYSPARK), tc.HAYSTACK, tc.V3_9_10)
+
+        # -- Act
+        with SkysparkClient(skyspark_server, page_size=5) as client:
+            graph = client.fetch_equipment_graph(nav_names, clean_lines=sgp.iter_clean_raw_skyspark_turtle)
+
+        # -- Assert
+        assert len(SkysparkStandIn.requests) == 3
+        for name in nav_names:
+            assert (SKYSPARK[f"{name}-point"], tc.PHIOT_3_9_10.equipRef, SKYSPARK[name]) in graph
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+from rdflib import Graph, Namespace, SH
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty import graphs as tg
+from tasty.shapes_loader import ShapesLoader
+from tasty.synthetic import SyntheticSiteGenerator
+from tasty.validation_engines import get_engine
+
+SAMPLE = Namespace('urn:sample/')
+HAS_TAG = tc.PH_3_9_10.hasTag
+EQUIP_REF = tc.PHIOT_3_9_10.equipRef
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return SyntheticSiteGenerator(seed=1)
+
+
+def write_site(generator, **kwargs):
+    output = io.StringIO()
+    stats = generator.write_site(output, **kwargs)
+    return stats, Graph().parse(data=output.getvalue(), format='nt')
+
+
+class TestSyntheticSiteGenerator:
+    def test_write_site(self, generator):
+        # -- Act
+        stats, g = write_site(generator, num_ahus=1, num_vavs=3, num_meters=1)
+
+        # -- Assert
+        assert stats['equips'] == 5
+        assert stats['triples'] == len(g)
+        assert stats['missing_tags'] == stats['extra_tags'] == 0
+        assert len(set(g.subjects(EQUIP_REF, None))) == stats['points']
+        assert len(set(g.subjects(tc.PHIOT_3_9_10.airRef, SAMPLE['AHU-1']))) == 3
+        # the VAVs cycle through the default VAV shapes
+        for vav, shape in [('VAV-1', 'NREL-VAV-SD-HW-Reheat-Shape'), ('VAV-3', 'NREL-VAV-SD-Cooling-Only-Shape')]:
+            points = set(g.subjects(EQUIP_REF, SAMPLE[vav]))
+            assert len(points) == len(generator.get_point_templates(shape))
+
+    def test_points_per_equip(self, generator):
+        # -- Act
+        stats, g = write_site(generator, num_ahus=2, num_vavs=2, num_meters=0, points_per_equip=3)
+
+        # -- Assert
+        assert stats['points'] == 12
+        assert len(set(g.subjects(EQUIP_REF, None))) == 12
+
+    def test_tag_rates(self):
+        # -- Setup
+        clean = SyntheticSiteGenerator(seed=1)
+        defective = SyntheticSiteGenerator(missing_tag_rate=1.0, extra_tag_rate=1.0, seed=1)
+
+        # -- Act
+        _, clean_graph = write_site(clean, num_ahus=0, num_vavs=1, num_meters=0)
+        stats, g = write_site(defective, num_ahus=0, num_vavs=1, num_meters=0)
+
+        # -- Assert
+        # points of shapes only requiring a type have no tag to miss
+        templates = defective.get_point_templates('NREL-VAV-SD-HW-Reheat-Shape')
+        assert stats['missing_tags'] == len([tags for _, _, tags in templates if tags])
+        assert stats['extra_tags'] == stats['points']
+        for point in g.subjects(EQUIP_REF, None):
+            tags = set(g.objects(point, HAS_TAG))
+            clean_tags = set(clean_graph.objects(point, HAS_TAG))
+            assert len(clean_tags - tags) == min(len(clean_tags), 1)
+            assert len(tags - clean_tags) == 1
+
+    def test_conforms(self, generator):
+        # -- Setup
+        _, g = write_site(generator, num_ahus=0, num_vavs=3, num_meters=1)
+        shapes_graph = ShapesLoader(tc.HAYSTACK).load_shapes_with_targets()
+        shapes = ['NREL-VAV-SD-HW-Reheat-Shape', 'NREL-VAV-SD-Elec-Reheat-Shape', 'NREL-VAV-SD-Cooling-Only-Shape',
+                  'NREL-Natural-Gas-Meter-Shape']
+        equips = ['VAV-1', 'VAV-2', 'VAV-3', 'Meter-1']
+        for shape, equip in zip(shapes, equips):
+            shapes_graph.add((tc.PH_SHAPES_NREL[shape], SH.targetNode, SAMPLE[equip]))
+        tg.load_closure(tc.HAYSTACK, tc.V3_9_10).expand(g)
+
+        # -- Act
+        conforms, _, _ = get_engine('native').validate(g, shapes_graph)
+
+        # -- Assert
+        assert conforms
+
+    def test_unknown_shape(self, generator):
+        with pytest.raises(te.TastyError):
+            generator.get_composite_shape('FreezeStatSensorShape')
+
+    def test_brick(self):
+        with pytest.raises(te.TastyError):
+            SyntheticSiteGenerator(tc.BRICK, tc.V1_1)
@@ -0,0 +1,34 @@
+import os
+
+from rdflib import Graph, Namespace, RDF, SH
+
+from tasty import constants as tc
+from tasty.validate import add_targets_from_csv
+
+SAMPLE = Namespace('urn:sample/')
+
+
+class TestAddTargetsFromCsv:
+    def test_add_targets(self, tmp_path):
+        # -- Setup
+        data_graph = Graph()
+        data_graph.add((SAMPLE['vav-1'], RDF.type, tc.PHIOT_3_9_10.vav))
+        data_graph.add((SAMPLE['ahu-1'], RDF.type, tc.PHIOT_3_9_10.ahu))
+        input_file = os.path.join(tmp_path, 'input-file.csv')
+        with open(input_file, 'w') as f:
+            f.write('entity-id,entity-name,phShapes:A,phShapes:B\n')
+            f.write(f"{SAMPLE['vav-1']},X,X,\n")
+            f.write(f"{SAMPLE['ahu-1']},ahu,X,X\n")
+            f.write(f"{SAMPLE['missing']},,,X\n")
+        shapes_graph = Graph()
+
+        # -- Act
+        targets = add_targets_from_csv(shapes_graph, data_graph, input_file)
+
+        # -- Assert
+        assert len(targets) == 3
+        assert set(shapes_graph.subject_objects(SH.targetNode)) == {
+            (tc.PH_SHAPES_CORE.A, SAMPLE['vav-1']),
+            (tc.PH_SHAPES_CORE.A, SAMPLE['ahu-1']),
+            (tc.PH_SHAPES_CORE.B, SAMPLE['ahu-1']),
+        }
@@ -0,0 +1,105 @@
+from collections import Counter
+
+import pytest
+from rdflib import Graph, Namespace, SH
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty import graphs as tg
+from tasty.shapes_loader import ShapesLoader
+from tasty.validation_engines import NativeEngine, get_engine
+from tasty.validation_report import ValidationReport
+
+SAMPLE = Namespace('urn:sample/')
+SHAPE = tc.PH_SHAPES_NREL['NREL-VAV-SD-HW-Reheat-Shape']
+VAV = SAMPLE['NREL-VAV-HW-Reheat-01']
+
+
+def summarize(results_graph):
+    df = ValidationReport.from_results_graph(results_graph).df
+    return Counter(zip(df['focus_node'], df['missing_shape'].fillna(''), df['severity']))
+
+
+class TestNativeEngine:
+    @pytest.fixture(scope='class')
+    def ont_graph(self):
+        return tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+
+    @pytest.mark.parametrize('remove_tags', [
+        [],
+        [('NREL-VAV-HW-Reheat-01-HeatingWaterValveCommandShape', tc.PHIOT_3_9_10.hot)],
+        [('NREL-VAV-HW-Reheat-01-DischargeAirFlowShape', tc.PHIOT_3_9_10.air),
+         ('NREL-VAV-HW-Reheat-01-CoolingRequestsShape', tc.PHIOT_3_9_10.cmd)],
+    ])
+    def test_same_results_as_pyshacl(self, get_haystack_nrel_vav_hw_reheat_data, ont_graph, remove_tags):
+        # -- Setup
+        data_graph = get_haystack_nrel_vav_hw_reheat_data
+        for point, tag in remove_tags:
+            data_graph.remove((SAMPLE[point], tc.PH_3_9_10.hasTag, tag))
+        sl = ShapesLoader(tc.HAYSTACK)
+        results = {}
+
+        # -- Act
+        for name in ['pyshacl', 'native']:
+            shapes_graph = sl.load_shapes_with_targets()
+            shapes_graph.add_target(SHAPE, VAV)
+            results[name] = get_engine(name).validate(data_graph, shapes_graph, ont_graph)
+
+        # -- Assert
+        assert results['native'][0] == results['pyshacl'][0] == (len(remove_tags) == 0)
+        assert summarize(results['native'][1]) == summarize(results['pyshacl'][1])
+
+    def test_expanded_data_graph_without_ontology(self, get_haystack_nrel_vav_hw_reheat_data, ont_graph):
+        # -- Setup
+        data_graph = get_haystack_nrel_vav_hw_reheat_data
+        data_graph.remove((SAMPLE['NREL-VAV-HW-Reheat-01-HeatingWaterValveCommandShape'], tc.PH_3_9_10.hasTag,
+                           tc.PHIOT_3_9_10.hot))
+        shapes_graph = ShapesLoader(tc.HAYSTACK).load_shapes_with_targets()
+        shapes_graph.add_target(SHAPE, VAV)
+        expected = get_engine('pyshacl').validate(data_graph, shapes_graph, ont_graph)
+
+        # -- Act
+        tg.load_closure(tc.HAYSTACK, tc.V3_9_10).expand(data_graph)
+        results = {name: get_engine(name).validate(data_graph, shapes_graph) for name in ['pyshacl', 'native']}
+
+        # -- Assert
+        for conforms, results_graph, _ in results.values():
+            assert conforms == expected[0]
+            assert summarize(results_graph) == summarize(expected[1])
+
+    def test_shared_compiled_shapes(self, get_haystack_nrel_vav_hw_reheat_data, ont_graph):
+        # -- Setup
+        data_graph = get_haystack_nrel_vav_hw_reheat_data
+        engine = NativeEngine(ont_graph)
+        sl = ShapesLoader(tc.HAYSTACK)
+        first, second, other = [sl.load_shapes_with_targets() for _ in range(3)]
+        for shapes_graph in [first, second, other]:
+            shapes_graph.add_target(SHAPE, VAV)
+        other.add((SHAPE, SH.name, tc.PH_SHAPES_NREL.Other))
+
+        # -- Act
+        first_conforms, _, _ = engine.validate(data_graph, first)
+        data_graph.remove((SAMPLE['NREL-VAV-HW-Reheat-01-HeatingWaterValveCommandShape'], tc.PH_3_9_10.hasTag,
+                           tc.PHIOT_3_9_10.hot))
+        second_conforms, _, _ = engine.validate(data_graph, second)
+
+        # -- Assert
+        assert first_conforms and not second_conforms
+        assert SHAPE in engine.get_compiled(second)
+        assert engine.get_compiled(first) is engine.get_compiled(second)
+        # shapes not only adding targets are compiled again
+        assert engine.get_compiled(other) == {}
+
+    def test_unsupported_constraint(self, ont_graph):
+        # -- Setup
+        shapes_graph = Graph()
+        shapes_graph.add((SHAPE, SH.targetNode, VAV))
+        shapes_graph.add((SHAPE, SH.datatype, tc.PH_3_9_10.hasTag))
+
+        # -- Act / Assert
+        with pytest.raises(te.TastyError):
+            get_engine('native').validate(Graph(), shapes_graph, ont_graph)
+
+    def test_unknown_engine(self):
+        with pytest.raises(te.TastyError):
+            get_engine('foo')
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+from rdflib import Namespace, SH
+from pyshacl import validate
+
+from tasty import constants as tc
+from tasty import exceptions as te
+from tasty import graphs as tg
+from tasty.validation_report import ValidationReport, COLUMNS
+
+NAMESPACE = Namespace('urn:sample/')
+SHAPE = tc.PH_SHAPES_NREL['NREL-VAV-SD-HW-Reheat-Shape']
+VAV = NAMESPACE['NREL-VAV-HW-Reheat-01']
+
+
+@pytest.fixture
+def validation_report(get_haystack_nrel_vav_hw_reheat_data, get_haystack_all_generated_shapes):
+    data_graph = get_haystack_nrel_vav_hw_reheat_data
+    shapes_graph = get_haystack_all_generated_shapes
+    ont_graph = tg.load_ontology(tc.HAYSTACK, tc.V3_9_10)
+    shapes_graph.add((SHAPE, SH.targetNode, VAV))
+    valve = NAMESPACE['NREL-VAV-HW-Reheat-01-HeatingWaterValveCommandShape']
+    data_graph.remove((valve, tc.PH_3_9_10.hasTag, tc.PHIOT_3_9_10.hot))
+    conforms, results_graph, results = validate(data_graph, shacl_graph=shapes_graph, ont_graph=ont_graph)
+    return data_graph, results_graph, ValidationReport.from_results_graph(results_graph)
+
+
+class TestValidationReport:
+    def test_from_results_graph(self, validation_report):
+        # -- Setup
+        data_graph, results_graph, report = validation_report
+
+        # -- Assert - one row per result
+        assert list(report.df.columns) == COLUMNS
+        assert len(report) == len(list(results_graph.objects(predicate=SH.result)))
+        violations = report.by_severity('Violation')
+        assert str(VAV) in set(violations['focus_node'])
+        # -- Assert - results without a qualified value shape are kept
+        assert str(SHAPE) in set(violations['source_shape'])
+        assert report.counts()['Violation'] == len(violations)
+
+    def test_rollup(self, validation_report):
+        # -- Setup
+        data_graph, results_graph, report = validation_report
+
+        # -- Act
+        rollup = report.rollup(data_graph, tc.PHIOT_3_9_10.equipRef)
+
+        # -- Assert
+        assert list(rollup.columns) == ['Violation', 'Warning', 'Info', 'total']
+        assert rollup.loc[str(VAV), 'total'] == len(report)
+
+    def test_writers(self, validation_report, tmp_path):
+        # -- Setup
+        data_graph, results_graph, report = validation_report
+        json_file = os.path.join(tmp_path, 'results.json')
+        csv_file = os.path.join(tmp_path, 'results.csv')
+
+        # -- Act
+        report.to_json(json_file)
+        report.to_csv(csv_file)
+
+        # -- Assert
+        with open(json_file) as f:
+            data = json.load(f)
+        assert data['counts'] == report.counts()
+        assert len(data['results']) == len(report)
+        with open(csv_file) as f:
+            assert f.readline().strip() == ','.join(COLUMNS)
+
+    def test_parquet(self, validation_report, tmp_path):
+        # -- Setup
+        data_graph, results_graph, report = validation_report
+        parquet_file = os.path.join(tmp_path, 'results.parquet')
+
+        # -- Act / Assert
+        try:
+            import pyarrow
+        except ImportError:
+            with pytest.raises(te.TastyError):
+                report.to_parquet(parquet_file)
+        else:
+            report.to_parquet(parquet_file)
+            assert os.path.isfile(parquet_file)